@@ -1,24 +1,42 @@
 from flask import Flask
+from jinja2 import FileSystemBytecodeCache
 from flask_sqlalchemy import SQLAlchemy
-from flask_migrate import Migrate
 from flask_login import LoginManager
 from flask_mail import Mail
 from flask_wtf.csrf import CSRFProtect
 from flask_limiter import Limiter
 from flask_limiter.util import get_remote_address
+from app.cache import ContentVersions, PageCache, FragmentCache, UserCache
+from app.assets import StaticAssets
+from app.compression import Compression
+from app.export import StaticExport
+from app.stats import DashboardStats
+from app.analytics import ReservationAnalytics
+from app.live import LiveEvents
+from app.sync import CatalogSync
+from app.serialization import FastJSONProvider
+from app.ratelimit import SQLiteStorage  # registers the sqlite:// rate limit storage
 from config import config
 import os
 
 # Initialize extensions
 db = SQLAlchemy()
-migrate = Migrate()
 login_manager = LoginManager()
 mail = Mail()
 csrf = CSRFProtect()
-limiter = Limiter(
-    key_func=get_remote_address,
-    default_limits=["200 per day", "50 per hour"]
-)
+# Default limits, storage and strategy come from the RATELIMIT_* settings
+limiter = Limiter(key_func=get_remote_address)
+content_versions = ContentVersions()
+page_cache = PageCache(content_versions)
+fragment_cache = FragmentCache(content_versions)
+user_cache = UserCache(content_versions)
+assets = StaticAssets()
+compression = Compression()
+static_export = StaticExport(content_versions)
+dashboard_stats = DashboardStats(db)
+analytics = ReservationAnalytics(db)
+live_events = LiveEvents()
+catalog_sync = CatalogSync(db)
 
 
 def create_app(config_name=None):
@@ -29,14 +47,32 @@ def create_app(config_name=None):
     
     app = Flask(__name__)
     app.config.from_object(config[config_name])
+    app.json = FastJSONProvider(app)
     
     # Initialize extensions with app
     db.init_app(app)
-    migrate.init_app(app, db)
+    register_migrations(app)
     login_manager.init_app(app)
     mail.init_app(app)
+    register_upload_limits(app)
     csrf.init_app(app)
+    app.config.setdefault('RATELIMIT_STORAGE_URI', app.config['RATELIMIT_STORAGE_URL'])
     limiter.init_app(app)
+    content_versions.init_app(app)
+    fragment_cache.init_app(app)
+    user_cache.init_app(app)
+    assets.init_app(app)
+    compression.init_app(app)
+    static_export.init_app(app)
+    dashboard_stats.init_app(app)
+    analytics.init_app(app)
+    live_events.init_app(app)
+    catalog_sync.init_app(app)
+    
+    # Share compiled templates between workers and restarts
+    if app.config['TEMPLATE_CACHE_FOLDER']:
+        os.makedirs(app.config['TEMPLATE_CACHE_FOLDER'], exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(app.config['TEMPLATE_CACHE_FOLDER'])
     
     # Configure login manager
     login_manager.login_view = 'admin.login'
@@ -51,8 +87,10 @@ def create_app(config_name=None):
     from app.routes.main import main_bp
     from app.routes.admin import admin_bp
     from app.routes.api import api_bp
+    from app.routes.images import images_bp
     
     app.register_blueprint(main_bp)
+    app.register_blueprint(images_bp)
     app.register_blueprint(admin_bp, url_prefix='/admin')
     app.register_blueprint(api_bp, url_prefix='/api')
     
@@ -64,13 +102,50 @@ def create_app(config_name=None):
     
     # Register template filters
     register_template_filters(app)
-    # Auto-create tables (for Render free plan)
-    with app.app_context():
-        db.create_all()
+    
+    # Register CLI commands
+    from app.commands import register_commands
+    register_commands(app)
 
     return app
 
 
+def register_migrations(app):
+    """
+    Enable `flask db ...` commands
+    
+    Flask-Migrate pulls in Alembic, which roughly doubles import time, so it
+    is only loaded when the app is created by the flask CLI rather than by
+    gunicorn. Tables are created by `flask db upgrade` or `flask init-db`.
+    """
+    if os.environ.get('FLASK_RUN_FROM_CLI') != 'true':
+        return
+    
+    from flask_migrate import Migrate
+    
+    Migrate(app, db)
+
+
+def register_upload_limits(app):
+    """
+    Let signed-in admins send bulk uploads bigger than MAX_CONTENT_LENGTH
+
+    CSRFProtect reads request.form in its own before_request hook, so the
+    limit has to be raised by a hook registered ahead of csrf.init_app();
+    setting it in the view is too late.
+    """
+    from flask import request
+    from flask_login import current_user
+    
+    BULK_UPLOAD_ENDPOINTS = ('admin.bulk_add_gallery_images', 'admin.stage_gallery_archive')
+    
+    @app.before_request
+    def raise_bulk_upload_limit():
+        # A photo shoot is far bigger than the per-request limit for single uploads
+        if request.endpoint in BULK_UPLOAD_ENDPOINTS and current_user.is_authenticated:
+            request.max_content_length = app.config['BULK_UPLOAD_MAX_LENGTH']
+
+
 def register_error_handlers(app):
     """Register error handlers"""
     
@@ -108,6 +183,9 @@ def register_context_processors(app):
 
 def register_template_filters(app):
     """Register custom template filters"""
+    from app.utils import responsive_image
+    
+    app.add_template_global(responsive_image)
     
     @app.template_filter('currency')
     def currency_filter(value):
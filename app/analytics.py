@@ -0,0 +1,242 @@
+from collections import Counter, defaultdict
+from datetime import datetime, time, timedelta
+from sqlalchemy import event, select, update, func, text
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session, attributes
+from app.stats import stored_value
+
+# (name, lowest lead time in days) for the lead time distribution
+LEAD_BUCKETS = [('lead_same_day', 0), ('lead_1_2', 1), ('lead_3_7', 3), ('lead_8_30', 8), ('lead_31_plus', 31)]
+METRICS = ['bookings', 'covers', 'cancellations'] + [name for name, _ in LEAD_BUCKETS]
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+# Columns _contribution() reads, in its argument order
+TRACKED = ('date', 'time', 'party_size', 'status', 'created_at')
+
+
+class ReservationAnalytics:
+    """
+    Per-day, per-time-slot reservation totals in the reservation_rollups table
+
+    Each row holds bookings, covers (guests of bookings that weren't
+    cancelled), cancellations and the lead time distribution for one day and
+    ANALYTICS_SLOT_MINUTES-long slot. Flushes add the difference a reservation
+    change makes to its slots in the same transaction, and ``flask analytics
+    rollup`` (nightly) recounts the days whose reservations changed since the
+    previous run, repairing anything written outside the ORM. Reports read
+    only the rollups, so a year is a few thousand rows whatever the size of
+    the reservations table. Changing ANALYTICS_SLOT_MINUTES needs
+    ``flask analytics rollup --full``.
+    """
+
+    def __init__(self, db, app=None):
+        self.db = db
+        self.slot_minutes = 30
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.slot_minutes = app.config['ANALYTICS_SLOT_MINUTES']
+        if not event.contains(Session, 'before_flush', self._collect_deltas):
+            event.listen(Session, 'before_flush', self._collect_deltas)
+            event.listen(Session, 'after_flush', self._apply_deltas)
+            event.listen(Session, 'after_rollback', self._discard_deltas)
+
+    # Reports
+
+    def report(self, start, end, bucket=None):
+        """
+        Totals between start and end (inclusive) for charts
+
+        Args:
+            bucket: 'day', 'week' or 'month'; picked from the range length
+                when None so long ranges stay around a hundred points
+
+        Returns:
+            dict: the series per bucket, weekday and slot breakdowns, the lead
+            time distribution and overall totals, all JSON-serializable
+        """
+        from app.models import ReservationRollup as R
+
+        if bucket is None:
+            length = (end - start).days + 1
+            bucket = 'day' if length <= 92 else 'week' if length <= 732 else 'month'
+
+        days = self.db.session.query(R.day, *[func.sum(getattr(R, metric)) for metric in METRICS])\
+            .filter(R.day.between(start, end)).group_by(R.day).all()
+        slots = self.db.session.query(R.slot, func.sum(R.bookings), func.sum(R.covers))\
+            .filter(R.day.between(start, end)).group_by(R.slot).order_by(R.slot).all()
+
+        totals = Counter()
+        periods = defaultdict(Counter)
+        weekdays = defaultdict(Counter)
+        for day, *values in days:
+            counts = dict(zip(METRICS, (value or 0 for value in values)))
+            totals.update(counts)
+            periods[self._period(day, bucket)].update(counts)
+            weekdays[day.weekday()].update(counts)
+
+        series = []
+        period = self._period(start, bucket)
+        while period <= end:
+            series.append({'period': period.isoformat(), **{metric: periods[period][metric] for metric in METRICS}})
+            period = self._next_period(period, bucket)
+
+        # Averages divide by every occurrence of the weekday in the range, busy or not
+        occurrences = Counter((start + timedelta(days=n)).weekday() for n in range((end - start).days + 1))
+        return {
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            'bucket': bucket,
+            'totals': {metric: totals[metric] for metric in METRICS},
+            'series': series,
+            'weekdays': [{
+                'weekday': WEEKDAYS[n],
+                'bookings': weekdays[n]['bookings'],
+                'covers': weekdays[n]['covers'],
+                'average_covers': round(weekdays[n]['covers'] / occurrences[n], 1) if occurrences[n] else 0,
+            } for n in range(7)],
+            'slots': [{'slot': slot.strftime('%H:%M'), 'bookings': bookings, 'covers': covers}
+                      for slot, bookings, covers in slots],
+            'lead_time': {name: totals[name] for name, _ in LEAD_BUCKETS},
+        }
+
+    def _period(self, day, bucket):
+        if bucket == 'week':
+            return day - timedelta(days=day.weekday())
+        if bucket == 'month':
+            return day.replace(day=1)
+        return day
+
+    def _next_period(self, period, bucket):
+        if bucket == 'week':
+            return period + timedelta(days=7)
+        if bucket == 'month':
+            return (period + timedelta(days=32)).replace(day=1)
+        return period + timedelta(days=1)
+
+    # Maintenance
+
+    def rollup(self, since=None, full=False):
+        """
+        Recount the days whose reservations were created or changed since
+        `since` (default: the start of the previous run), or every day with
+        full=True
+
+        Returns:
+            int: number of days recounted
+        """
+        from app.models import Reservation, ReservationRollup
+
+        started = datetime.utcnow()
+        if full:
+            first, last = self.db.session.query(func.min(Reservation.date), func.max(Reservation.date)).one()
+            self.db.session.execute(ReservationRollup.__table__.delete())
+            self.db.session.commit()
+            if first is None:
+                return 0
+            days = [first + timedelta(days=n) for n in range((last - first).days + 1)]
+        else:
+            if since is None:
+                since = self.db.session.query(func.max(ReservationRollup.recounted_at)).scalar()
+            query = self.db.session.query(Reservation.date).distinct()
+            if since is not None:
+                query = query.filter(Reservation.updated_at >= since)
+            days = sorted(day for day, in query)
+            # Recounts start their own transactions (see recount)
+            self.db.session.rollback()
+
+        # A month per transaction keeps locks short on big backfills
+        for n in range(0, len(days), 31):
+            self.recount(days[n:n + 31], started)
+        return len(days)
+
+    def recount(self, days, recounted_at=None):
+        """Rebuild the rollup rows of the given days from the reservations table"""
+        from app.models import Reservation, ReservationRollup
+
+        session = self.db.session
+        table = ReservationRollup.__table__
+        if session.get_bind().dialect.name == 'postgresql':
+            # Wait for transactions that already applied deltas, hold off new ones until we commit
+            session.execute(text(f'LOCK TABLE {table.name} IN SHARE ROW EXCLUSIVE MODE'))
+        # Writing first takes SQLite's write lock before reading
+        session.execute(table.delete().where(table.c.day.in_(days)))
+
+        rows = session.execute(
+            select(Reservation.date, Reservation.time, Reservation.party_size, Reservation.status,
+                   Reservation.created_at).where(Reservation.date.in_(days))
+        )
+        totals = defaultdict(Counter)
+        for row in rows:
+            key, counts = self._contribution(*row)
+            totals[key].update(counts)
+
+        recounted_at = recounted_at or datetime.utcnow()
+        if totals:
+            session.execute(table.insert(), [
+                {'day': day, 'slot': slot, 'recounted_at': recounted_at,
+                 **{metric: counts[metric] for metric in METRICS}}
+                for (day, slot), counts in totals.items()
+            ])
+        session.commit()
+
+    def _contribution(self, day, at, party_size, status, created_at):
+        """(day, slot) a reservation counts towards and what it adds there"""
+        minutes = (at.hour * 60 + at.minute) // self.slot_minutes * self.slot_minutes
+        slot = time(minutes // 60, minutes % 60)
+        lead = (day - (created_at or datetime.utcnow()).date()).days
+        bucket = next(name for name, lowest in reversed(LEAD_BUCKETS) if lead >= lowest or lowest == 0)
+        cancelled = status == 'cancelled'
+        return (day, slot), {'bookings': 1, 'covers': 0 if cancelled else party_size or 0,
+                             'cancellations': int(cancelled), bucket: 1}
+
+    def _collect_deltas(self, session, flush_context, instances):
+        from app.models import Reservation
+
+        deltas = session.info.setdefault('analytics_deltas', defaultdict(Counter))
+
+        def add(values, sign):
+            key, counts = self._contribution(*values)
+            for metric, value in counts.items():
+                deltas[key][metric] += sign * value
+
+        for obj in session.new:
+            if isinstance(obj, Reservation):
+                add((obj.date, obj.time, obj.party_size, obj.status, obj.created_at), 1)
+
+        for obj in session.deleted:
+            if isinstance(obj, Reservation):
+                add([stored_value(session, obj, name) for name in TRACKED], -1)
+
+        for obj in session.dirty:
+            if isinstance(obj, Reservation) \
+                    and any(attributes.get_history(obj, name).added for name in TRACKED):
+                add([stored_value(session, obj, name) for name in TRACKED], -1)
+                add((obj.date, obj.time, obj.party_size, obj.status, obj.created_at), 1)
+
+    def _apply_deltas(self, session, flush_context):
+        from app.models import ReservationRollup
+
+        deltas = session.info.pop('analytics_deltas', None)
+        if not deltas:
+            return
+
+        table = ReservationRollup.__table__
+        connection = session.connection()
+        dialect = connection.dialect.name
+        for (day, slot), counts in deltas.items():
+            counts = {metric: value for metric, value in counts.items() if value}
+            if not counts:
+                continue
+            increments = {metric: table.c[metric] + value for metric, value in counts.items()}
+            row = {'day': day, 'slot': slot, **{metric: counts.get(metric, 0) for metric in METRICS}}
+
+            if dialect in ('postgresql', 'sqlite'):
+                insert = (postgresql if dialect == 'postgresql' else sqlite).insert(table).values(**row)
+                connection.execute(insert.on_conflict_do_update(index_elements=['day', 'slot'], set_=increments))
+            elif not connection.execute(update(table).where(table.c.day == day, table.c.slot == slot)
+                                        .values(**increments)).rowcount:
+                connection.execute(table.insert().values(**row))
+
+    def _discard_deltas(self, session):
+        session.info.pop('analytics_deltas', None)
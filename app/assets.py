@@ -0,0 +1,127 @@
+import os
+import gzip
+import hashlib
+import mimetypes
+from flask import current_app, request, send_file
+
+try:
+    import brotli
+except ImportError:  # .br variants are skipped without the optional brotli package
+    brotli = None
+
+# Text assets worth precompressing
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.svg', '.json', '.txt', '.html', '.xml', '.map'}
+
+
+class StaticAssets:
+    """
+    Build-free fingerprinting and precompression of files in the static folder
+
+    At startup every static file (apart from ASSET_EXCLUDE folders such as
+    uploads) is hashed, and url_for('static', filename='css/style.css')
+    starts producing css/style.<hash>.css. A copy under that name is written
+    to ASSET_CACHE_FOLDER along with gzip and brotli variants, so a web server
+    (or a CDN pulling from it) can serve fingerprinted URLs from disk.
+    Requests for them that reach the app are served with an immutable
+    one-year Cache-Control, using a compressed variant when the client
+    accepts it. Anything else falls through to Flask's normal static handling.
+    """
+
+    def __init__(self, app=None):
+        self.manifest = {}  # 'css/style.css' -> 'css/style.<hash>.css'
+        self.originals = {}  # 'css/style.<hash>.css' -> 'css/style.css'
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if not app.config['ASSET_FINGERPRINTING'] or not app.has_static_folder:
+            return
+
+        self.manifest = {}
+        self.originals = {}
+        self.build(app)
+
+        app.url_defaults(self._fingerprint_url)
+        app.view_functions['static'] = self.send_static_file
+
+    def build(self, app):
+        """Hash static files and write compressed variants that don't exist yet"""
+        static_folder = app.static_folder
+        cache_folder = app.config['ASSET_CACHE_FOLDER']
+        excluded = tuple(os.path.join(static_folder, folder) for folder in app.config['ASSET_EXCLUDE'])
+
+        for root, dirs, files in os.walk(static_folder):
+            if root.startswith(excluded):
+                dirs[:] = []
+                continue
+
+            for name in files:
+                path = os.path.join(root, name)
+                filename = os.path.relpath(path, static_folder).replace(os.sep, '/')
+                with open(path, 'rb') as f:
+                    content = f.read()
+
+                stem, ext = os.path.splitext(filename)
+                hashed = f'{stem}.{hashlib.sha256(content).hexdigest()[:12]}{ext}'
+                self.manifest[filename] = hashed
+                self.originals[hashed] = filename
+
+                self._write_file(os.path.join(cache_folder, hashed), content)
+                if ext.lower() in COMPRESSIBLE_EXTENSIONS:
+                    self._write_variant(cache_folder, hashed + '.gz', content,
+                                        lambda data: gzip.compress(data, compresslevel=9, mtime=0))
+                    if brotli is not None:
+                        self._write_variant(cache_folder, hashed + '.br', content,
+                                            lambda data: brotli.compress(data, quality=11))
+
+    def _write_variant(self, cache_folder, name, content, compress):
+        path = os.path.join(cache_folder, name)
+        if os.path.exists(path):
+            return
+
+        compressed = compress(content)
+        if len(compressed) >= len(content):
+            return
+
+        self._write_file(path, compressed)
+
+    def _write_file(self, path, content):
+        """Write a file atomically unless it exists (names include the content hash)"""
+        if os.path.exists(path):
+            return
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+
+    def _fingerprint_url(self, endpoint, values):
+        if endpoint == 'static' and values.get('filename') in self.manifest:
+            values['filename'] = self.manifest[values['filename']]
+
+    def send_static_file(self, filename):
+        """Serve a fingerprinted asset (precompressed if possible) or defer to Flask"""
+        original = self.originals.get(filename)
+        if original is None:
+            return current_app.send_static_file(filename)
+
+        mimetype = mimetypes.guess_type(original)[0] or 'application/octet-stream'
+        max_age = current_app.config['ASSET_MAX_AGE']
+        path = os.path.join(current_app.static_folder, original)
+        encoding = None
+
+        accepted = request.accept_encodings
+        cache_folder = current_app.config['ASSET_CACHE_FOLDER']
+        for candidate, suffix in (('br', '.br'), ('gzip', '.gz')):
+            variant = os.path.join(cache_folder, filename + suffix)
+            if accepted[candidate] and os.path.exists(variant):
+                path, encoding = variant, candidate
+                break
+
+        response = send_file(path, mimetype=mimetype, max_age=max_age, conditional=True)
+        response.headers['Cache-Control'] = f'public, max-age={max_age}, immutable'
+        response.vary.add('Accept-Encoding')
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        return response
@@ -0,0 +1,329 @@
+import os
+import time
+import secrets
+import threading
+from collections import OrderedDict, namedtuple
+from functools import wraps
+from itertools import chain
+from flask import current_app, request, session, g, has_app_context, make_response
+from jinja2 import nodes
+from jinja2.ext import Extension
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app.serialization import prefers_msgpack
+
+
+class ContentVersions:
+    """
+    Version tokens for areas of content ('menu', 'events', 'users', ...)
+
+    Models declare the area they belong to with a ``__content_area__``
+    attribute. Whenever a commit touches such a model, the area gets a new
+    random token, so caches keyed on versions notice the change. Tokens live
+    in small files under CONTENT_VERSION_FOLDER, which all workers on a host
+    share.
+    """
+
+    def __init__(self, app=None):
+        self.folder = None
+        self._listeners = []
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.folder = app.config['CONTENT_VERSION_FOLDER']
+        os.makedirs(self.folder, exist_ok=True)
+
+        if not event.contains(Session, 'before_flush', self._collect_changes):
+            event.listen(Session, 'before_flush', self._collect_changes)
+            event.listen(Session, 'after_commit', self._bump_changes)
+            event.listen(Session, 'after_rollback', self._discard_changes)
+
+    def get(self, area):
+        """Get the current version token of an area"""
+        versions = g.setdefault('_content_versions', {})
+        if area not in versions:
+            try:
+                with open(os.path.join(self.folder, area)) as f:
+                    versions[area] = f.read()
+            except FileNotFoundError:
+                versions[area] = ''
+        return versions[area]
+
+    def get_many(self, areas):
+        """Get version tokens for several areas as a tuple"""
+        return tuple(self.get(area) for area in areas)
+
+    def bump(self, *areas):
+        """Give areas new version tokens, invalidating anything cached against them"""
+        for area in areas:
+            path = os.path.join(self.folder, area)
+            tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(tmp_path, 'w') as f:
+                f.write(secrets.token_hex(8))
+            os.replace(tmp_path, path)
+
+        if has_app_context():
+            g.pop('_content_versions', None)
+
+        for callback in self._listeners:
+            callback(areas)
+
+    def on_change(self, callback):
+        """Call callback(areas) whenever areas get new version tokens"""
+        if callback not in self._listeners:
+            self._listeners.append(callback)
+
+    def _collect_changes(self, session, flush_context, instances):
+        areas = session.info.setdefault('changed_content_areas', set())
+        for obj in chain(session.new, session.dirty, session.deleted):
+            area = getattr(obj, '__content_area__', None)
+            if area:
+                areas.add(area)
+
+    def _bump_changes(self, session):
+        areas = session.info.pop('changed_content_areas', None)
+        if areas:
+            self.bump(*sorted(areas))
+
+    def _discard_changes(self, session):
+        session.info.pop('changed_content_areas', None)
+
+
+CachedPage = namedtuple('CachedPage', ['body', 'status', 'mimetype', 'versions', 'created'])
+
+
+class PageCache:
+    """
+    Per-worker LRU cache of full pages for anonymous visitors
+
+    Entries are keyed on path plus whitelisted query args (and on the format
+    API views negotiate, see api_response()) and remember the content
+    versions they were rendered against. An entry goes stale when a
+    version changes or it is older than PAGE_CACHE_TTL; then exactly one
+    request re-renders it while concurrent requests keep getting the stale
+    copy (stale-while-revalidate).
+    """
+
+    def __init__(self, versions):
+        self.versions = versions
+        self._entries = OrderedDict()
+        self._refreshing = set()
+        self._lock = threading.Lock()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def cached(self, *areas, query_args=()):
+        """
+        Cache a public view's rendered page
+
+        Args:
+            *areas: Content areas the page is built from
+            query_args: Request args that change the output (others are ignored)
+        """
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                if not self._cacheable():
+                    return view(*args, **kwargs)
+
+                key = (request.path, prefers_msgpack()) + tuple((name, request.args.get(name))
+                                                                for name in query_args if name in request.args)
+                versions = self.versions.get_many(areas)
+                entry = self._get(key)
+
+                if entry is not None:
+                    age = time.monotonic() - entry.created
+                    if entry.versions == versions and age < current_app.config['PAGE_CACHE_TTL']:
+                        return self._respond(entry, 'HIT')
+                    if not self._begin_refresh(key):
+                        return self._respond(entry, 'STALE')
+                    try:
+                        return self._render(key, versions, view, args, kwargs)
+                    finally:
+                        self._end_refresh(key)
+
+                return self._render(key, versions, view, args, kwargs)
+            wrapper.content_areas = areas
+            return wrapper
+        return decorator
+
+    def _cacheable(self):
+        """Only anonymous GETs without pending flash messages share pages"""
+        if not current_app.config['PAGE_CACHE_ENABLED'] or request.method != 'GET':
+            return False
+        if request.cookies.get(current_app.config.get('REMEMBER_COOKIE_NAME', 'remember_token')):
+            return False
+        return '_user_id' not in session and '_flashes' not in session
+
+    def _render(self, key, versions, view, args, kwargs):
+        response = make_response(view(*args, **kwargs))
+        if response.status_code == 200 and not response.direct_passthrough and not response.is_streamed \
+                and not session.modified and 'Set-Cookie' not in response.headers:
+            self._set(key, CachedPage(response.get_data(), response.status_code, response.mimetype,
+                                      versions, time.monotonic()))
+        response.headers['X-Cache'] = 'MISS'
+        response.cache_compressed = True
+        return response
+
+    def _respond(self, entry, state):
+        response = current_app.response_class(entry.body, status=entry.status, mimetype=entry.mimetype)
+        response.headers['X-Cache'] = state
+        response.cache_compressed = True
+        return response
+
+    def _get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def _set(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > current_app.config['PAGE_CACHE_MAX_ENTRIES']:
+                self._entries.popitem(last=False)
+
+    def _begin_refresh(self, key):
+        with self._lock:
+            if key in self._refreshing:
+                return False
+            self._refreshing.add(key)
+            return True
+
+    def _end_refresh(self, key):
+        with self._lock:
+            self._refreshing.discard(key)
+
+
+class LRUCache:
+    """
+    Thread-safe bounded in-memory cache with get/set, evicting least recently used
+
+    This is the default fragment cache backend. Anything with the same
+    get(key) -> value or None / set(key, value) interface (e.g. a cachelib
+    cache) can be passed to FragmentCache instead.
+    """
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._entries.get(key)
+            if value is not None:
+                self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class FragmentCacheExtension(Extension):
+    """
+    ``{% cache key, ... %}...{% endcache %}`` memoizes a block's rendered HTML
+
+    The cache key is the template name and line plus every expression given,
+    so pass content_version(...) for the data the block shows along with any
+    request values (page, search terms) it depends on.
+    """
+    tags = {'cache'}
+
+    def __init__(self, environment):
+        super().__init__(environment)
+        environment.extend(fragment_cache=None)
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        parts = [nodes.Const(f'{parser.name}:{lineno}'), parser.parse_expression()]
+        while parser.stream.skip_if('comma'):
+            parts.append(parser.parse_expression())
+        body = parser.parse_statements(['name:endcache'], drop_needle=True)
+        return nodes.CallBlock(self.call_method('_render_cached', [nodes.List(parts)]),
+                               [], [], body).set_lineno(lineno)
+
+    def _render_cached(self, parts, caller):
+        backend = self.environment.fragment_cache
+        if backend is None:
+            return caller()
+
+        key = '\x1f'.join(str(part) for part in parts)
+        html = backend.get(key)
+        if html is None:
+            html = caller()
+            backend.set(key, html)
+        return html
+
+
+class FragmentCache:
+    """Enable {% cache %} in the app's templates, backed by a pluggable cache"""
+
+    def __init__(self, versions, backend=None):
+        self.versions = versions
+        self.backend = backend
+
+    def init_app(self, app):
+        app.jinja_env.add_extension(FragmentCacheExtension)
+        app.add_template_global(self.versions.get, 'content_version')
+
+        if app.config['FRAGMENT_CACHE_ENABLED']:
+            app.jinja_env.extend(
+                fragment_cache=self.backend or LRUCache(app.config['FRAGMENT_CACHE_MAX_ENTRIES'])
+            )
+
+
+class UserCache:
+    """
+    Per-worker cache of logged-in users for Flask-Login's user_loader
+
+    Entries expire after USER_CACHE_TTL seconds and are dropped as soon as
+    the 'users' content version changes, which any commit touching a User
+    does. An edited or deactivated account therefore takes effect on the next
+    request in every worker sharing CONTENT_VERSION_FOLDER, and everywhere
+    else (other hosts, changes made outside the ORM) within the TTL.
+    """
+
+    AREA = 'users'
+
+    def __init__(self, versions):
+        self.versions = versions
+        self.ttl = 0
+        self._entries = None
+
+    def init_app(self, app):
+        self.ttl = app.config['USER_CACHE_TTL']
+        self._entries = LRUCache(app.config['USER_CACHE_MAX_ENTRIES'])
+
+    def get(self, user_id, loader):
+        """Return the cached value for user_id, calling loader(user_id) on a miss"""
+        if not self.ttl:
+            return loader(user_id)
+
+        version = self.versions.get(self.AREA)
+        entry = self._entries.get(user_id)
+        if entry is not None:
+            value, entry_version, created = entry
+            if entry_version == version and time.monotonic() - created < self.ttl:
+                return value
+
+        value = loader(user_id)
+        self._entries.set(user_id, (value, version, time.monotonic()))
+        return value
+
+    def clear(self):
+        if self._entries is not None:
+            self._entries.clear()
@@ -0,0 +1,193 @@
+import os
+import json
+import click
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from flask import current_app
+from flask.cli import AppGroup, with_appcontext
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateColumn
+from app import db, static_export, dashboard_stats, analytics, catalog_sync
+from app.models import MenuItem, Event, GalleryImage
+from app.utils import placeholder_for_file, release_image
+
+images_cli = AppGroup('images', help='Manage uploaded images.')
+export_cli = AppGroup('export', help='Pre-render public pages.')
+stats_cli = AppGroup('stats', help='Maintain dashboard counters.')
+analytics_cli = AppGroup('analytics', help='Maintain reservation analytics.')
+
+
+def register_commands(app):
+    """Register Flask CLI commands"""
+    app.cli.add_command(init_db)
+    app.cli.add_command(warm_up_command)
+    app.cli.add_command(images_cli)
+    app.cli.add_command(export_cli)
+    app.cli.add_command(stats_cli)
+    app.cli.add_command(analytics_cli)
+
+
+@click.command('init-db')
+@with_appcontext
+def init_db():
+    """Create missing database tables, columns and indexes (for hosts that don't run migrations)"""
+    db.create_all()
+    added = add_missing_columns()
+    for table, column in added:
+        click.echo(f'➕ Added column {table}.{column}')
+    if any(column == 'image_placeholder' for _, column in added):
+        # Decoding every upload is too slow for a start command, so this is left to the operator
+        click.echo('ℹ️  Run `flask images backfill-placeholders` to add placeholders to existing images')
+    # create_all() skips indexes added to tables that already exist
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+    # Rows from before delta sync have no version yet, and no delta would include them
+    for area, count in catalog_sync.stamp_unversioned().items():
+        click.echo(f'🔄 Gave {count} {area} rows a sync version')
+    click.echo('✅ Database tables created')
+
+
+def add_missing_columns():
+    """
+    Add model columns that existing tables lack, with ALTER TABLE ... ADD COLUMN
+
+    create_all() only creates whole tables, so a column added to a model
+    later (e.g. image_renditions) would be missing from databases created
+    before it. Such columns must be nullable or have a server default.
+
+    Returns:
+        list: (table, column) names of the columns added
+    """
+    inspector = inspect(db.engine)
+    added = []
+    with db.engine.begin() as connection:
+        preparer = connection.dialect.identifier_preparer
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                definition = CreateColumn(column).compile(dialect=connection.dialect)
+                connection.execute(text(f'ALTER TABLE {preparer.format_table(table)} ADD COLUMN {definition}'))
+                added.append((table.name, column.name))
+    return added
+
+
+@click.command('warm-up')
+@with_appcontext
+@click.option('--templates-only', is_flag=True, help="Only compile templates, don't render pages.")
+def warm_up_command(templates_only):
+    """Precompile all templates into the shared bytecode cache and render public pages"""
+    from app.warmup import warm_up
+
+    compiled, rendered = warm_up(current_app._get_current_object(), pages=not templates_only)
+    click.echo(f'✅ Compiled {compiled} templates, rendered {rendered} pages')
+
+
+@images_cli.command('backfill-placeholders')
+@click.option('--workers', type=int, default=None, help='Worker processes (defaults to CPU count).')
+@click.option('--force', is_flag=True, help='Recompute placeholders that are already set.')
+def backfill_placeholders(workers, force):
+    """Compute LQIP placeholders for images uploaded before they existed"""
+    records = []
+    for model in (MenuItem, Event, GalleryImage):
+        query = model.query.filter(model.image_url.isnot(None))
+        if not force:
+            query = query.filter(model.image_placeholder.is_(None))
+        records.extend(query.all())
+
+    # Uploads are shared between records, so each file is decoded once
+    image_paths = sorted({record.image_url for record in records})
+    if not image_paths:
+        click.echo('✅ All images already have placeholders')
+        return
+
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    size = current_app.config['IMAGE_PLACEHOLDER_SIZE']
+    placeholders = {}
+
+    click.echo(f'🔄 Computing placeholders for {len(image_paths)} images...')
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(placeholder_for_file, os.path.join(upload_folder, path), size): path
+            for path in image_paths
+        }
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                placeholders[path] = future.result()
+            except Exception as e:
+                click.echo(f'⚠️  {path}: {str(e)}')
+
+    for record in records:
+        if record.image_url in placeholders:
+            record.image_placeholder = placeholders[record.image_url]
+    db.session.commit()
+
+    # Keep manifests in sync so re-uploads of the same file get the placeholder too
+    for path, placeholder in placeholders.items():
+        manifest_path = os.path.splitext(os.path.join(upload_folder, path))[0] + '.json'
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as f:
+                saved = json.load(f)
+            saved['placeholder'] = placeholder
+            with open(manifest_path, 'w') as f:
+                json.dump(saved, f)
+
+    click.echo(f'✅ Stored placeholders for {len(placeholders)} of {len(image_paths)} images')
+
+
+@images_cli.command('prune')
+def prune_images():
+    """Delete uploads no record uses, once IMAGE_RELEASE_GRACE has passed since they were stored"""
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    deleted = 0
+    for folder, dirs, files in os.walk(upload_folder):
+        # Skip the .tmp spool folder
+        dirs[:] = [d for d in dirs if not d.startswith('.')]
+        for name in files:
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(folder, name)) as f:
+                    image_url = json.load(f)['image_url']
+            except (OSError, ValueError, KeyError) as e:
+                click.echo(f'⚠️  {name}: {str(e)}')
+                continue
+            # Rechecks references and the grace period under the image lock
+            if release_image(image_url):
+                deleted += 1
+    click.echo(f'✅ Deleted {deleted} unused images')
+
+
+@export_cli.command('pages')
+@click.option('--force', is_flag=True, help='Re-render pages even if their content is unchanged.')
+def export_pages(force):
+    """Render public pages into STATIC_EXPORT_FOLDER, skipping unchanged ones"""
+    results = static_export.export(current_app._get_current_object(), force=force)
+    icons = {'rendered': '🔄', 'unchanged': '✔️ '}
+    for path, status in results:
+        click.echo(f'{icons.get(status, "⚠️ ")} {path}: {status}')
+
+    rendered = sum(1 for _, status in results if status == 'rendered')
+    click.echo(f'✅ Rendered {rendered} of {len(results)} pages into {current_app.config["STATIC_EXPORT_FOLDER"]}')
+
+
+@stats_cli.command('rebuild')
+def rebuild_stats():
+    """Recount dashboard counters from the tables (after bulk SQL changes)"""
+    totals = dashboard_stats.rebuild()
+    for name, value in sorted(totals.items()):
+        click.echo(f'{name}: {value}')
+    click.echo('✅ Dashboard counters rebuilt')
+
+
+@analytics_cli.command('rollup')
+@click.option('--full', is_flag=True, help='Recount every day instead of the days changed since the last run.')
+@click.option('--since', type=click.DateTime(), default=None, help='Recount days changed since this time (UTC).')
+def rollup_analytics(full, since):
+    """Recount daily reservation rollups (run nightly)"""
+    days = analytics.rollup(since=since, full=full)
+    click.echo(f'✅ Recounted {days} days')
@@ -0,0 +1,118 @@
+import gzip
+import zlib
+import hashlib
+from flask import request
+from app.cache import LRUCache
+
+try:
+    import brotli
+except ImportError:  # only gzip is offered without the optional brotli package
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = {
+    'text/html', 'text/css', 'text/plain', 'text/xml', 'text/csv', 'text/javascript',
+    'application/json', 'application/msgpack', 'application/javascript', 'application/xml', 'image/svg+xml',
+}
+
+
+class Compression:
+    """
+    gzip/brotli compression of text responses, negotiated from Accept-Encoding
+
+    Bodies under COMPRESS_MIN_SIZE bytes are sent as is. Responses whose
+    body is shared between requests (pages and JSON served by PageCache set
+    ``response.cache_compressed``) keep their compressed form in an LRU keyed
+    by body digest and encoding, so identical bytes are compressed once.
+    Streamed responses are compressed chunk by chunk as they are sent.
+    """
+
+    def __init__(self, app=None):
+        self.cache = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if not app.config['COMPRESS_ENABLED']:
+            return
+
+        self.cache = LRUCache(app.config['COMPRESS_CACHE_MAX_ENTRIES'])
+        self.min_size = app.config['COMPRESS_MIN_SIZE']
+        self.gzip_level = app.config['COMPRESS_GZIP_LEVEL']
+        self.brotli_quality = app.config['COMPRESS_BROTLI_QUALITY']
+        app.after_request(self.compress_response)
+
+    def negotiate(self):
+        """Pick the best encoding the client accepts, or None"""
+        accepted = request.accept_encodings
+        if brotli is not None and accepted['br']:
+            return 'br'
+        if accepted['gzip']:
+            return 'gzip'
+        return None
+
+    def compress(self, data, encoding):
+        if encoding == 'br':
+            return brotli.compress(data, quality=self.brotli_quality)
+        return gzip.compress(data, compresslevel=self.gzip_level, mtime=0)
+
+    def compress_stream(self, chunks, encoding):
+        """Compress chunks as they come, flushing each so clients can start on it"""
+        if encoding == 'br':
+            compressor = brotli.Compressor(quality=self.brotli_quality)
+            compress, flush, finish = compressor.process, compressor.flush, compressor.finish
+        else:
+            compressor = zlib.compressobj(self.gzip_level, zlib.DEFLATED, 31)  # 31: gzip container
+            compress, flush, finish = compressor.compress, lambda: compressor.flush(zlib.Z_SYNC_FLUSH), compressor.flush
+        try:
+            for chunk in chunks:
+                yield compress(chunk.encode() if isinstance(chunk, str) else chunk) + flush()
+            yield finish()
+        finally:
+            if hasattr(chunks, 'close'):
+                chunks.close()
+
+    def compress_response(self, response):
+        if response.direct_passthrough \
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES \
+                or response.status_code < 200 or response.status_code in (204, 206, 304) \
+                or 'Content-Encoding' in response.headers \
+                or 'no-transform' in response.headers.get('Cache-Control', ''):
+            return response
+
+        if response.is_streamed:
+            # Long streamed lists; their size is unknown, so they are always worth compressing
+            response.vary.add('Accept-Encoding')
+            encoding = self.negotiate()
+            if encoding is not None:
+                response.response = self.compress_stream(response.response, encoding)
+                response.headers['Content-Encoding'] = encoding
+            return response
+
+        data = response.get_data()
+        if len(data) < self.min_size:
+            return response
+
+        response.vary.add('Accept-Encoding')
+        encoding = self.negotiate()
+        if encoding is None:
+            return response
+
+        if getattr(response, 'cache_compressed', False):
+            key = (hashlib.blake2b(data, digest_size=16).digest(), encoding)
+            compressed = self.cache.get(key)
+            if compressed is None:
+                compressed = self.compress(data, encoding)
+                self.cache.set(key, compressed)
+        else:
+            compressed = self.compress(data, encoding)
+
+        if len(compressed) >= len(data):
+            return response
+
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+        etag, weak = response.get_etag()
+        if etag:
+            # A compressed body is a different representation
+            response.set_etag(f'{etag}-{encoding}', weak=weak)
+        return response
@@ -0,0 +1,164 @@
+import os
+import gzip
+import json
+import time
+import hashlib
+import threading
+from flask import url_for
+from app.locks import file_lock
+
+
+class StaticExport:
+    """
+    Pre-rendered copies of public pages for the proxy or a CDN to serve
+
+    Every endpoint in STATIC_EXPORT_PAGES is requested through the test
+    client as an anonymous visitor and written to
+    STATIC_EXPORT_FOLDER/<path>/index.html (plus a .gz variant), with asset
+    URLs already fingerprinted. A state file remembers the content versions
+    (the areas given to PageCache.cached) and the templates/static build each
+    page was rendered from, so later runs only re-render pages whose content
+    changed or that are older than STATIC_EXPORT_MAX_AGE (listings such as
+    upcoming events depend on the date).
+    """
+
+    STATE_FILE = '.export.json'
+
+    def __init__(self, versions, app=None):
+        self.versions = versions
+        self._app = None
+        self._lock = threading.Lock()
+        self._queued = False
+        self._queued_lock = threading.Lock()
+        self._areas = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if app.config['STATIC_EXPORT_ON_CHANGE']:
+            self._app = app
+            self.versions.on_change(self._content_changed)
+
+    def pages(self, app):
+        """List (path, content areas) for the exported endpoints"""
+        pages = []
+        with app.test_request_context():
+            for endpoint in app.config['STATIC_EXPORT_PAGES']:
+                view = app.view_functions[endpoint]
+                pages.append((url_for(endpoint), getattr(view, 'content_areas', ())))
+        return pages
+
+    def export(self, app, force=False):
+        """
+        Render pages whose content or build changed since the last export
+
+        Returns:
+            list: (path, status) tuples, status being 'rendered', 'unchanged'
+            or a reason the page could not be exported
+        """
+        folder = app.config['STATIC_EXPORT_FOLDER']
+        max_age = app.config['STATIC_EXPORT_MAX_AGE']
+        os.makedirs(folder, exist_ok=True)
+
+        with self._exclusive(folder), app.app_context():
+            state = self._load_state(folder)
+            build = self._build_version(app)
+            client = app.test_client(use_cookies=False)
+            results = []
+
+            for path, areas in self.pages(app):
+                target = os.path.join(folder, path.strip('/'), 'index.html')
+                versions = list(self.versions.get_many(areas))
+                entry = state.get(path)
+
+                if not force and entry is not None and os.path.exists(target) \
+                        and entry['versions'] == versions and entry['build'] == build \
+                        and time.time() - entry['rendered'] < max_age:
+                    results.append((path, 'unchanged'))
+                    continue
+
+                response = client.get(path, headers={'Accept-Encoding': 'identity'})
+                if response.status_code != 200 or 'Set-Cookie' in response.headers:
+                    # Leave the page to the app rather than serve an outdated or per-visitor copy
+                    self._remove(target)
+                    state.pop(path, None)
+                    reason = f'HTTP {response.status_code}' if response.status_code != 200 else 'sets a cookie'
+                    results.append((path, f'skipped ({reason})'))
+                    continue
+
+                if response.headers.get('X-Cache') == 'STALE':
+                    # Another request is re-rendering this page; keep the old copy and retry next run
+                    if entry is not None:
+                        entry['versions'] = None
+                    results.append((path, 'skipped (refresh in progress)'))
+                    continue
+
+                body = response.get_data()
+                self._write(target, body)
+                self._write(target + '.gz', gzip.compress(body, compresslevel=9, mtime=0))
+                state[path] = {'versions': versions, 'build': build, 'rendered': time.time()}
+                results.append((path, 'rendered'))
+
+            self._write(os.path.join(folder, self.STATE_FILE), json.dumps(state, indent=2).encode())
+        return results
+
+    def _content_changed(self, areas):
+        """Re-export in the background after a commit; one queued run covers bursts of changes"""
+        if self._areas is None:
+            self._areas = {area for _, page_areas in self.pages(self._app) for area in page_areas}
+        if self._areas.isdisjoint(areas):
+            return
+        with self._queued_lock:
+            if self._queued:
+                return
+            self._queued = True
+        threading.Thread(target=self._export_queued, daemon=True).start()
+
+    def _export_queued(self):
+        with self._lock:
+            with self._queued_lock:
+                self._queued = False
+            try:
+                self.export(self._app)
+            except Exception as e:
+                self._app.logger.error(f"Error exporting static pages: {str(e)}")
+
+    def _build_version(self, app):
+        """Fingerprint templates and static files (minus uploads) by name, size and mtime"""
+        digest = hashlib.sha256()
+        excluded = tuple(os.path.join(app.static_folder, folder) for folder in app.config['ASSET_EXCLUDE'])
+        folders = [os.path.join(app.root_path, app.template_folder), app.static_folder]
+
+        for folder in folders:
+            for root, dirs, files in os.walk(folder):
+                if root.startswith(excluded):
+                    dirs[:] = []
+                    continue
+                dirs.sort()
+                for name in sorted(files):
+                    stat = os.stat(os.path.join(root, name))
+                    digest.update(f'{root}/{name}:{stat.st_size}:{stat.st_mtime_ns}\n'.encode())
+        return digest.hexdigest()[:16]
+
+    def _load_state(self, folder):
+        try:
+            with open(os.path.join(folder, self.STATE_FILE)) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _exclusive(self, folder):
+        """Hold off exports from other threads and processes"""
+        return file_lock(os.path.join(folder, '.export.lock'))
+
+    def _write(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    def _remove(self, path):
+        for name in (path, path + '.gz'):
+            if os.path.exists(name):
+                os.remove(name)
@@ -1,11 +1,40 @@
 from flask_wtf import FlaskForm
-from flask_wtf.file import FileField, FileAllowed
+from flask_wtf.file import FileField, FileAllowed, MultipleFileField
 from wtforms import StringField, TextAreaField, PasswordField, BooleanField, SelectField, \
     IntegerField, FloatField, DateField, TimeField, DateTimeField
 from wtforms.validators import DataRequired, Email, Length, NumberRange, Optional, ValidationError
+from flask import current_app
 from datetime import datetime, date, time
 
 
+class ImagePixelLimit:
+    """Reject images with more pixels than IMAGE_MAX_PIXELS (reads the header only)"""
+    
+    def __init__(self, message=None):
+        self.message = message
+    
+    def __call__(self, form, field):
+        if not field.data:
+            return
+        
+        from PIL import Image
+        
+        max_pixels = current_app.config['IMAGE_MAX_PIXELS']
+        message = self.message or f'Image is too large. Maximum is {max_pixels // 1000000} megapixels.'
+        try:
+            with Image.open(field.data.stream) as image:
+                width, height = image.size
+        except Image.DecompressionBombError:
+            raise ValidationError(message)
+        except Exception:
+            raise ValidationError('The uploaded file is not a valid image.')
+        finally:
+            field.data.stream.seek(0)
+        
+        if width * height > max_pixels:
+            raise ValidationError(message)
+
+
 class LoginForm(FlaskForm):
     """Admin login form"""
     username = StringField('Username', validators=[DataRequired(), Length(min=3, max=64)])
@@ -50,7 +79,7 @@ class MenuItemForm(FlaskForm):
     description = TextAreaField('Description', validators=[Optional(), Length(max=500)])
     price = FloatField('Price', validators=[DataRequired(), NumberRange(min=0)])
     category_id = SelectField('Category', coerce=int, validators=[DataRequired()])
-    image = FileField('Image', validators=[FileAllowed(['jpg', 'jpeg', 'png', 'gif', 'webp'])])
+    image = FileField('Image', validators=[FileAllowed(['jpg', 'jpeg', 'png', 'gif', 'webp']), ImagePixelLimit()])
     is_available = BooleanField('Available')
     is_featured = BooleanField('Featured Item')
     allergens = StringField('Allergens (comma-separated)', validators=[Optional(), Length(max=255)])
@@ -71,7 +100,8 @@ class GalleryForm(FlaskForm):
     title = StringField('Title', validators=[Optional(), Length(max=100)])
     image = FileField('Image', validators=[
         DataRequired(),
-        FileAllowed(['jpg', 'jpeg', 'png', 'gif', 'webp'])
+        FileAllowed(['jpg', 'jpeg', 'png', 'gif', 'webp']),
+        ImagePixelLimit()
     ])
     description = TextAreaField('Description', validators=[Optional(), Length(max=500)])
     alt_text = StringField('Alt Text', validators=[Optional(), Length(max=255)])
@@ -79,6 +109,18 @@ class GalleryForm(FlaskForm):
     is_active = BooleanField('Active', default=True)
 
 
+class BulkGalleryForm(FlaskForm):
+    """Bulk gallery upload form (several files and/or a zip archive)"""
+    images = MultipleFileField('Images', validators=[FileAllowed(['jpg', 'jpeg', 'png', 'gif', 'webp'])])
+    archive = FileField('Zip Archive', validators=[FileAllowed(['zip'])])
+    is_active = BooleanField('Active', default=True)
+    
+    def validate_archive(self, field):
+        has_images = any(f and f.filename for f in self.images.data or [])
+        if not has_images and not field.data:
+            raise ValidationError('Choose some images or a zip archive to upload.')
+
+
 class ReviewForm(FlaskForm):
     """Review form"""
     customer_name = StringField('Name', validators=[DataRequired(), Length(min=2, max=100)])
@@ -95,7 +137,7 @@ class EventForm(FlaskForm):
     description = TextAreaField('Description', validators=[DataRequired(), Length(min=10, max=2000)])
     event_date = DateTimeField('Event Date & Time', validators=[DataRequired()], format='%Y-%m-%dT%H:%M')
     end_date = DateTimeField('End Date & Time', validators=[Optional()], format='%Y-%m-%dT%H:%M')
-    image = FileField('Event Image', validators=[FileAllowed(['jpg', 'jpeg', 'png', 'gif', 'webp'])])
+    image = FileField('Event Image', validators=[FileAllowed(['jpg', 'jpeg', 'png', 'gif', 'webp']), ImagePixelLimit()])
     is_active = BooleanField('Active', default=True)
     is_featured = BooleanField('Featured Event')
     
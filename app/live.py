@@ -0,0 +1,229 @@
+import os
+import json
+import time
+import threading
+from flask import current_app, has_app_context
+from app.serialization import json_default
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+try:
+    import fcntl
+except ImportError:  # Windows: concurrent rotations may drop a few events
+    fcntl = None
+
+
+class LiveEvents:
+    """
+    Notifications pushed to admin browsers (new reservations, messages, reviews)
+
+    Models opt in with a ``__live_event__`` name; after a commit that
+    inserted such rows, their ``to_dict()`` is appended as one JSON line to
+    LIVE_EVENTS_FILE, which every worker on the host shares. Each worker runs
+    a single watcher thread that stats the file every LIVE_EVENTS_POLL
+    seconds and wakes the streams it serves, which then read only the new
+    lines. Idle admin browsers therefore cost no database queries, and an
+    event id is the file position, so a reconnecting EventSource resumes
+    where it stopped via Last-Event-ID.
+    """
+
+    def __init__(self, app=None):
+        self.path = None
+        self.active = 0
+        self._changed = threading.Condition()
+        self._version = 0
+        self._watcher = None
+        self._lock = threading.Lock()
+        self._closing = False
+        self._stop_check = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.path = app.config['LIVE_EVENTS_FILE']
+        self.poll = app.config['LIVE_EVENTS_POLL']
+        self.max_bytes = app.config['LIVE_EVENTS_MAX_BYTES']
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+        if not event.contains(Session, 'after_flush', self._collect_events):
+            event.listen(Session, 'after_flush', self._collect_events)
+            event.listen(Session, 'after_commit', self._publish_events)
+            event.listen(Session, 'after_rollback', self._discard_events)
+
+    def publish(self, kind, data):
+        """Append an event for every connected admin on this host"""
+        line = json.dumps({'event': kind, 'data': data}, default=json_default, separators=(',', ':')) + '\n'
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            # One O_APPEND write per event keeps lines from concurrent workers whole
+            os.write(fd, line.encode())
+            if os.fstat(fd).st_size > self.max_bytes:
+                self._rotate(fd)
+        finally:
+            os.close(fd)
+
+    def stream(self, last_event_id=None, duration=None, keepalive=15):
+        """
+        Yield (id, event, data) tuples as events arrive, and None every
+        `keepalive` seconds without one; stops after `duration` seconds
+
+        Starts after last_event_id when it is still in the current file,
+        otherwise with the next new event. The first tuple is (id, None,
+        None): the starting position, for clients to resume from.
+        """
+        self._start_watcher()
+        deadline = time.monotonic() + duration if duration is not None else None
+        f = self._open()
+        try:
+            inode = os.fstat(f.fileno()).st_ino
+            position = self._resume_position(last_event_id, inode, f)
+            f.seek(position)
+            yield f'{inode}-{position}', None, None
+            while True:
+                with self._changed:
+                    seen = self._version
+                for line in iter(f.readline, b''):
+                    if not line.endswith(b'\n'):
+                        # Partial write in progress; read it again once complete
+                        f.seek(position)
+                        break
+                    position += len(line)
+                    try:
+                        message = json.loads(line)
+                    except ValueError:
+                        continue
+                    yield f'{inode}-{position}', message['event'], message['data']
+
+                if self._rotated(inode):
+                    f.close()
+                    f = self._open()
+                    inode, position = os.fstat(f.fileno()).st_ino, 0
+                    continue
+
+                remaining = deadline - time.monotonic() if deadline is not None else keepalive
+                if remaining <= 0 or self._closing:
+                    return
+                with self._changed:
+                    woken = self._changed.wait_for(lambda: self._version != seen, min(keepalive, remaining))
+                if not woken:
+                    yield None
+        finally:
+            f.close()
+
+    def close(self):
+        """End every open stream in this process (browsers reconnect elsewhere)"""
+        with self._changed:
+            self._closing = True
+            self._version += 1
+            self._changed.notify_all()
+
+    def stop_when(self, check):
+        """Close streams once check() returns True, e.g. when the server stops this worker"""
+        self._stop_check = check
+
+    def try_acquire(self, limit):
+        """
+        Claim one of `limit` stream slots in this worker
+
+        Returns a function that hands the slot back (calls after the first
+        do nothing), or None if every slot is taken.
+        """
+        with self._lock:
+            if self.active >= limit:
+                return None
+            self.active += 1
+        held = True
+
+        def release():
+            nonlocal held
+            with self._lock:
+                if held:
+                    held = False
+                    self.active -= 1
+
+        return release
+
+    def _resume_position(self, last_event_id, inode, f):
+        end = os.fstat(f.fileno()).st_size
+        try:
+            event_inode, position = (int(part) for part in (last_event_id or '').split('-'))
+        except ValueError:
+            return end
+        if event_inode != inode or position > end:
+            return end
+        return position
+
+    def _open(self):
+        # Create the file if no event was ever published, so there is something to watch
+        os.close(os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644))
+        return open(self.path, 'rb')
+
+    def _rotated(self, inode):
+        try:
+            return os.stat(self.path).st_ino != inode
+        except FileNotFoundError:
+            return False
+
+    def _rotate(self, fd):
+        """Start a new file; readers finish the old one through their open handle"""
+        if fcntl is not None:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+        # Another worker may have rotated while we waited for the lock
+        if self._rotated(os.fstat(fd).st_ino):
+            return
+        os.replace(self.path, self.path + '.1')
+
+    def _start_watcher(self):
+        with self._lock:
+            if self._watcher is None:
+                self._watcher = threading.Thread(target=self._watch, name='live-events', daemon=True)
+                self._watcher.start()
+
+    def _watch(self):
+        """Wake waiting streams when the file grows or is replaced"""
+        last = None
+        while True:
+            try:
+                stat = os.stat(self.path)
+                current = (stat.st_ino, stat.st_size)
+            except FileNotFoundError:
+                current = None
+            if current != last:
+                last = current
+                with self._changed:
+                    self._version += 1
+                    self._changed.notify_all()
+            if self._stop_check is not None and self._stop_check():
+                self.close()
+                return
+            time.sleep(self.poll)
+
+    def _after_fork(self):
+        # The watcher thread and stream count belong to the parent process
+        self.active = 0
+        self._changed = threading.Condition()
+        self._version = 0
+        self._lock = threading.Lock()
+        self._watcher = None
+        self._closing = False
+
+    def _collect_events(self, session, flush_context):
+        events = session.info.setdefault('live_events', [])
+        for obj in session.new:
+            kind = getattr(obj, '__live_event__', None)
+            if kind:
+                events.append((kind, obj.to_dict()))
+
+    def _publish_events(self, session):
+        for kind, data in session.info.pop('live_events', []):
+            try:
+                self.publish(kind, data)
+            except OSError as e:
+                # The row is committed either way; admins see it on their next reload
+                if has_app_context():
+                    current_app.logger.error(f"Error publishing live event: {str(e)}")
+
+    def _discard_events(self, session):
+        session.info.pop('live_events', None)
@@ -0,0 +1,38 @@
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: locks only hold within a process
+    fcntl = None
+
+# One thread lock per lock file in this process
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+@contextmanager
+def file_lock(path):
+    """
+    Hold an exclusive lock against other threads and worker processes
+
+    Threads in this process share one lock object per path; other processes
+    are held back by an flock on the file at path. The file is created if
+    missing and left in place afterwards, as deleting it could let another
+    process lock a fresh file while one is still waiting on the old one, so
+    callers should lock per folder or job rather than per file they write.
+    """
+    with _locks_guard:
+        lock = _locks.setdefault(path, threading.Lock())
+    with lock:
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
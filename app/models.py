@@ -1,17 +1,59 @@
 from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import UserMixin
-from app import db, login_manager
+from app import db, login_manager, user_cache
 
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    return user_cache.get(int(user_id), _load_session_user)
+
+
+def _load_session_user(user_id):
+    """Just the columns authorization needs; inactive accounts are logged out"""
+    row = db.session.query(User.id, User.username, User.role)\
+        .filter(User.id == user_id, User.is_active == True).first()
+    return SessionUser(*row) if row else None
+
+
+class SessionUser(UserMixin):
+    """
+    Read-only stand-in for the logged-in User, cached between requests
+
+    Views that need to change the account should load the User itself.
+    """
+    
+    def __init__(self, id, username, role):
+        self.id = id
+        self.username = username
+        self.role = role
+    
+    def is_admin(self):
+        return self.role == 'admin'
+    
+    def __repr__(self):
+        return f'<SessionUser {self.username}>'
+
+
+class ImageMixin:
+    """Columns and helpers for models that own an uploaded image"""
+    
+    # {'widths': [...], 'formats': [...]} as returned by utils.create_renditions
+    image_renditions = db.Column(db.JSON)
+    # Inline data URI preview, see utils.make_placeholder
+    image_placeholder = db.Column(db.Text)
+    
+    def set_image(self, saved):
+        """Apply the result of utils.save_image() to this record"""
+        self.image_url = saved['image_url']
+        self.image_renditions = saved['renditions']
+        self.image_placeholder = saved.get('placeholder')
 
 
 class User(UserMixin, db.Model):
     """User model for admin authentication"""
     __tablename__ = 'users'
+    __content_area__ = 'users'
     
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(64), unique=True, nullable=False, index=True)
@@ -38,6 +80,8 @@ class User(UserMixin, db.Model):
 class Reservation(db.Model):
     """Reservation model for table bookings"""
     __tablename__ = 'reservations'
+    __live_event__ = 'reservation'
+    __counters__ = {'total_reservations': None, 'pending_reservations': ('status', 'pending')}
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
@@ -48,8 +92,8 @@ class Reservation(db.Model):
     party_size = db.Column(db.Integer, nullable=False)
     special_requests = db.Column(db.Text)
     status = db.Column(db.String(20), default='pending')  # pending, confirmed, cancelled
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     
     def __repr__(self):
         return f'<Reservation {self.name} - {self.date} {self.time}>'
@@ -60,18 +104,19 @@ class Reservation(db.Model):
             'name': self.name,
             'email': self.email,
             'phone': self.phone,
-            'date': self.date.isoformat(),
+            'date': self.date,
             'time': self.time.strftime('%H:%M'),
             'party_size': self.party_size,
             'special_requests': self.special_requests,
             'status': self.status,
-            'created_at': self.created_at.isoformat()
+            'created_at': self.created_at
         }
 
 
 class Category(db.Model):
     """Category model for menu organization"""
     __tablename__ = 'categories'
+    __content_area__ = 'menu'
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(50), unique=True, nullable=False)
@@ -88,16 +133,20 @@ class Category(db.Model):
         return f'<Category {self.name}>'
 
 
-class MenuItem(db.Model):
+class MenuItem(ImageMixin, db.Model):
     """MenuItem model for restaurant menu"""
     __tablename__ = 'menu_items'
+    __content_area__ = 'menu'
+    __counters__ = {'total_menu_items': None}
+    __sync_area__ = 'menu'
+    __sync_via__ = {'category_id': 'categories'}  # to_dict() includes the category name
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text)
     price = db.Column(db.Float, nullable=False)
     category_id = db.Column(db.Integer, db.ForeignKey('categories.id'), nullable=False, index=True)
-    image_url = db.Column(db.String(255))
+    image_url = db.Column(db.String(255), index=True)
     is_available = db.Column(db.Boolean, default=True)
     is_featured = db.Column(db.Boolean, default=False)
     allergens = db.Column(db.String(255))  # comma-separated
@@ -105,6 +154,7 @@ class MenuItem(db.Model):
     display_order = db.Column(db.Integer, default=0)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    sync_version = db.Column(db.Integer, index=True)  # set by app.sync.CatalogSync
     
     def __repr__(self):
         return f'<MenuItem {self.name}>'
@@ -123,13 +173,14 @@ class MenuItem(db.Model):
         }
 
 
-class GalleryImage(db.Model):
+class GalleryImage(ImageMixin, db.Model):
     """Gallery model for restaurant images"""
     __tablename__ = 'gallery_images'
+    __content_area__ = 'gallery'
     
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(100))
-    image_url = db.Column(db.String(255), nullable=False)
+    image_url = db.Column(db.String(255), nullable=False, index=True)
     thumbnail_url = db.Column(db.String(255))
     description = db.Column(db.Text)
     alt_text = db.Column(db.String(255))
@@ -139,11 +190,18 @@ class GalleryImage(db.Model):
     
     def __repr__(self):
         return f'<GalleryImage {self.title}>'
+    
+    def set_image(self, saved):
+        super().set_image(saved)
+        self.thumbnail_url = saved['thumbnail_url']
 
 
 class Review(db.Model):
     """Review model for customer testimonials"""
     __tablename__ = 'reviews'
+    __content_area__ = 'reviews'
+    __live_event__ = 'review'
+    __counters__ = {'pending_reviews': ('is_approved', False)}
     
     id = db.Column(db.Integer, primary_key=True)
     customer_name = db.Column(db.String(100), nullable=False)
@@ -162,24 +220,27 @@ class Review(db.Model):
             'customer_name': self.customer_name,
             'rating': self.rating,
             'comment': self.comment,
-            'created_at': self.created_at.isoformat()
+            'created_at': self.created_at
         }
 
 
-class Event(db.Model):
+class Event(ImageMixin, db.Model):
     """Event model for restaurant events and promotions"""
     __tablename__ = 'events'
+    __content_area__ = 'events'
+    __sync_area__ = 'events'
     
     id = db.Column(db.Integer, primary_key=True)
     title = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text, nullable=False)
     event_date = db.Column(db.DateTime, nullable=False, index=True)
     end_date = db.Column(db.DateTime)
-    image_url = db.Column(db.String(255))
+    image_url = db.Column(db.String(255), index=True)
     is_active = db.Column(db.Boolean, default=True)
     is_featured = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    sync_version = db.Column(db.Integer, index=True)  # set by app.sync.CatalogSync
     
     def __repr__(self):
         return f'<Event {self.title}>'
@@ -192,7 +253,7 @@ class Event(db.Model):
             'id': self.id,
             'title': self.title,
             'description': self.description,
-            'event_date': self.event_date.isoformat(),
+            'event_date': self.event_date,
             'image_url': self.image_url,
             'is_active': self.is_active
         }
@@ -201,6 +262,8 @@ class Event(db.Model):
 class ContactMessage(db.Model):
     """Contact message model"""
     __tablename__ = 'contact_messages'
+    __live_event__ = 'message'
+    __counters__ = {'unread_messages': ('is_read', False)}
     
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
@@ -209,7 +272,76 @@ class ContactMessage(db.Model):
     subject = db.Column(db.String(200))
     message = db.Column(db.Text, nullable=False)
     is_read = db.Column(db.Boolean, default=False)
-    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     
     def __repr__(self):
         return f'<ContactMessage {self.name} - {self.subject}>'
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'email': self.email,
+            'subject': self.subject,
+            'is_read': self.is_read,
+            'created_at': self.created_at
+        }
+
+
+class StatCounter(db.Model):
+    """Running total for the admin dashboard, maintained by app.stats.DashboardStats"""
+    __tablename__ = 'stat_counters'
+    
+    name = db.Column(db.String(50), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<StatCounter {self.name}={self.value}>'
+
+
+class ReservationRollup(db.Model):
+    """Reservation totals per day and time slot, maintained by app.analytics.ReservationAnalytics"""
+    __tablename__ = 'reservation_rollups'
+    
+    day = db.Column(db.Date, primary_key=True)
+    slot = db.Column(db.Time, primary_key=True)
+    bookings = db.Column(db.Integer, nullable=False, default=0)
+    covers = db.Column(db.Integer, nullable=False, default=0)  # guests of bookings not cancelled
+    cancellations = db.Column(db.Integer, nullable=False, default=0)
+    # Lead time: days between booking and visit
+    lead_same_day = db.Column(db.Integer, nullable=False, default=0)
+    lead_1_2 = db.Column(db.Integer, nullable=False, default=0)
+    lead_3_7 = db.Column(db.Integer, nullable=False, default=0)
+    lead_8_30 = db.Column(db.Integer, nullable=False, default=0)
+    lead_31_plus = db.Column(db.Integer, nullable=False, default=0)
+    recounted_at = db.Column(db.DateTime, index=True)  # last full recount of the day; None if only updated on write
+    
+    def __repr__(self):
+        return f'<ReservationRollup {self.day} {self.slot}>'
+
+
+class SyncCounter(db.Model):
+    """Latest change version of a synced catalog, maintained by app.sync.CatalogSync"""
+    __tablename__ = 'sync_counters'
+    
+    area = db.Column(db.String(20), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    pruned_version = db.Column(db.Integer)  # newest version whose tombstones were pruned
+    
+    def __repr__(self):
+        return f'<SyncCounter {self.area}={self.version}>'
+
+
+class Tombstone(db.Model):
+    """Record of a deleted catalog row, so syncing clients drop their copy"""
+    __tablename__ = 'tombstones'
+    __table_args__ = (db.Index('ix_tombstones_area_version', 'area', 'sync_version'),)
+    
+    id = db.Column(db.Integer, primary_key=True)
+    area = db.Column(db.String(20), nullable=False)
+    record_id = db.Column(db.Integer, nullable=False)
+    sync_version = db.Column(db.Integer, nullable=False)
+    deleted_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<Tombstone {self.area}:{self.record_id}>'
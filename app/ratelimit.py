@@ -0,0 +1,228 @@
+import os
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+from math import floor
+from limits.storage import Storage, SlidingWindowCounterSupport
+from limits.storage.base import TimestampedSlidingWindow
+
+
+class _Lease:
+    """Hits a worker reserved for a rate limit window but hasn't used yet"""
+    __slots__ = ('tokens', 'size', 'granted', 'expires')
+
+    def __init__(self, tokens, size, granted, expires):
+        self.tokens = tokens
+        self.size = size
+        self.granted = granted
+        self.expires = expires
+
+
+class SQLiteStorage(Storage, SlidingWindowCounterSupport, TimestampedSlidingWindow):
+    """
+    Rate limit counters shared by every worker on a host through a SQLite file
+
+    Zero-dependency alternative to Redis for single-host deployments, selected
+    with RATELIMIT_STORAGE_URL = 'sqlite:////path/to/ratelimit.db'.
+
+    With the sliding-window-counter strategy a worker reserves hits for a
+    window in blocks: one transaction checks the shared count and adds the
+    whole block, never more than the limit leaves, so the limit holds across
+    processes. Later hits come out of the block in memory. Blocks start at a
+    single hit and double while a key stays busy (up to lease_size), and
+    unused hits are handed back after lease_ttl seconds, so quiet keys are
+    exact and busy ones cost one write per block instead of one per request.
+    """
+
+    STORAGE_SCHEME = ['sqlite']
+
+    def __init__(self, uri, wrap_exceptions=False, lease_size=32, lease_ttl=1.0, **options):
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        self.path = uri[len('sqlite:///'):]
+        self.lease_size = int(lease_size)
+        self.lease_ttl = float(lease_ttl)
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+        self._after_fork()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._after_fork)
+
+        with self._transaction() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS rate_limits '
+                         '(key TEXT PRIMARY KEY, count INTEGER NOT NULL, expires REAL NOT NULL)')
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    # Storage
+
+    def incr(self, key, expiry, amount=1):
+        now = time.time()
+        with self._transaction() as conn:
+            return self._add(conn, key, amount, now + expiry, now)
+
+    def get(self, key):
+        with self._transaction(write=False) as conn:
+            return self._count(conn, key, time.time())
+
+    def get_expiry(self, key):
+        now = time.time()
+        with self._transaction(write=False) as conn:
+            row = conn.execute('SELECT expires FROM rate_limits WHERE key = ? AND expires > ?',
+                               (key, now)).fetchone()
+        return row[0] if row else now
+
+    def check(self):
+        try:
+            with self._transaction(write=False) as conn:
+                conn.execute('SELECT 1')
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self):
+        with self._lock:
+            self._leases.clear()
+        with self._transaction() as conn:
+            return conn.execute('DELETE FROM rate_limits').rowcount
+
+    def clear(self, key):
+        with self._lock:
+            self._leases.pop(key, None)
+        with self._transaction() as conn:
+            conn.execute('DELETE FROM rate_limits WHERE key = ?', (key,))
+
+    # Sliding window counter
+
+    def acquire_sliding_window_entry(self, key, limit, expiry, amount=1):
+        if amount > limit:
+            return False
+
+        now = time.time()
+        previous_key, current_key = self.sliding_window_keys(key, expiry, now)
+
+        with self._lock:
+            lease = self._leases.get(current_key)
+            if lease is not None and lease.tokens >= amount:
+                lease.tokens -= amount
+                return True
+
+            # Keys hit again while their last block was fresh get a bigger block
+            size = 1
+            if lease is not None and now - lease.granted < self.lease_ttl:
+                size = min(lease.size * 2, self.lease_size)
+
+            with self._transaction() as conn:
+                previous_count, previous_ttl, current_count, _ = self._window(
+                    conn, previous_key, current_key, expiry, now)
+                available = limit - floor(previous_count * previous_ttl / expiry + current_count)
+                if available < amount:
+                    return False
+                # Leave at least half of what's left to other workers
+                extra = max(0, min(size - amount, (available - amount) // 2))
+                self._add(conn, current_key, amount + extra, now + 2 * expiry, now)
+
+            leftover = lease.tokens if lease is not None else 0
+            self._leases[current_key] = _Lease(leftover + extra, size, now, now + 2 * expiry)
+            if extra:
+                self._start_sweeper()
+            return True
+
+    def get_sliding_window(self, key, expiry):
+        now = time.time()
+        previous_key, current_key = self.sliding_window_keys(key, expiry, now)
+        with self._transaction(write=False) as conn:
+            return self._window(conn, previous_key, current_key, expiry, now)
+
+    def clear_sliding_window(self, key, expiry):
+        previous_key, current_key = self.sliding_window_keys(key, expiry, time.time())
+        self.clear(previous_key)
+        self.clear(current_key)
+
+    # Internals
+
+    @contextmanager
+    def _transaction(self, write=True):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+
+        conn.execute('BEGIN IMMEDIATE' if write else 'BEGIN')
+        try:
+            yield conn
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+        conn.execute('COMMIT')
+
+    def _count(self, conn, key, now):
+        row = conn.execute('SELECT count FROM rate_limits WHERE key = ? AND expires > ?', (key, now)).fetchone()
+        return row[0] if row else 0
+
+    def _add(self, conn, key, amount, expires, now):
+        """Add to a counter, restarting it if it expired; returns the new count"""
+        return conn.execute(
+            'INSERT INTO rate_limits (key, count, expires) VALUES (:key, :amount, :expires) '
+            'ON CONFLICT (key) DO UPDATE SET '
+            'count = CASE WHEN expires <= :now THEN :amount ELSE count + :amount END, '
+            'expires = CASE WHEN expires <= :now THEN :expires ELSE expires END '
+            'RETURNING count',
+            {'key': key, 'amount': amount, 'expires': expires, 'now': now},
+        ).fetchone()[0]
+
+    def _window(self, conn, previous_key, current_key, expiry, now):
+        """(previous count, previous TTL, current count, current TTL) as limits expects"""
+        previous_count = self._count(conn, previous_key, now)
+        current_count = self._count(conn, current_key, now)
+        previous_ttl = (1 - (((now - expiry) / expiry) % 1)) * expiry if previous_count else 0.0
+        current_ttl = (1 - ((now / expiry) % 1)) * expiry + expiry
+        return previous_count, previous_ttl, current_count, current_ttl
+
+    def _after_fork(self):
+        """
+        Start with fresh state (also in a forked worker)
+
+        Leases copied from a preloading master belong to the master, its
+        connections must not be shared and its sweeper thread doesn't exist
+        in the child.
+        """
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._leases = {}
+        self._sweeper = None
+
+    def _start_sweeper(self):
+        if self._sweeper is None:
+            self._sweeper = threading.Thread(target=self._sweep, name='ratelimit-leases', daemon=True)
+            self._sweeper.start()
+
+    def _sweep(self):
+        """Hand unused hits of stale leases back and delete expired counters"""
+        while True:
+            time.sleep(self.lease_ttl)
+            now = time.time()
+            with self._lock:
+                stale = [(key, lease) for key, lease in self._leases.items()
+                         if now - lease.granted >= self.lease_ttl]
+                try:
+                    with self._transaction() as conn:
+                        for key, lease in stale:
+                            if lease.tokens and lease.expires > now:
+                                conn.execute('UPDATE rate_limits SET count = MAX(count - ?, 0) '
+                                             'WHERE key = ? AND expires > ?', (lease.tokens, key, now))
+                            del self._leases[key]
+                        conn.execute('DELETE FROM rate_limits WHERE expires <= ?', (now,))
+                except sqlite3.Error:
+                    # Unreturned hits only make the limit stricter until the window ends
+                    for key, _ in stale:
+                        self._leases.pop(key, None)
+
+                if not self._leases:
+                    self._sweeper = None
+                    return
@@ -1,13 +1,18 @@
-from flask import Blueprint, render_template, request, flash, redirect, url_for, current_app
+from flask import Blueprint, render_template, request, flash, redirect, url_for, current_app, jsonify
 from flask_login import login_user, logout_user, login_required, current_user
 from functools import wraps
-from app import db
+from app import db, dashboard_stats, analytics, live_events, limiter
 from app.models import User, Reservation, MenuItem, Category, GalleryImage, Review, Event, ContactMessage
-from app.forms import (LoginForm, MenuItemForm, CategoryForm, GalleryForm, EventForm, 
+from app.forms import (LoginForm, MenuItemForm, CategoryForm, GalleryForm, BulkGalleryForm, EventForm, 
                        UserForm, ReservationUpdateForm)
-from app.utils import save_image, delete_image, send_email, create_slug
+from app.utils import (save_image, save_images, iter_zip_images, zip_image_members, stage_archive,
+                       staged_archive_path, release_image, send_email, create_slug)
+from itertools import chain, islice
+import os
+import zipfile
+import json
 from datetime import datetime, timedelta
-from sqlalchemy import func, and_
+from sqlalchemy import func, and_, select, literal, union_all
 
 admin_bp = Blueprint('admin', __name__)
 
@@ -61,34 +66,27 @@ def logout():
 @login_required
 def dashboard():
     """Admin dashboard"""
-    # Get statistics
-    total_reservations = Reservation.query.count()
-    pending_reservations = Reservation.query.filter_by(status='pending').count()
-    total_menu_items = MenuItem.query.count()
-    pending_reviews = Review.query.filter_by(is_approved=False).count()
-    unread_messages = ContactMessage.query.filter_by(is_read=False).count()
+    # Counters are maintained on write (see app.stats), so this is one small query
+    stats = dashboard_stats.get()
     
-    # Recent reservations
-    recent_reservations = Reservation.query.order_by(Reservation.created_at.desc()).limit(5).all()
-    
-    # Upcoming reservations
+    # Recent and upcoming reservations in one statement
     today = datetime.now().date()
-    upcoming_reservations = Reservation.query.filter(
-        and_(Reservation.date >= today, Reservation.status == 'confirmed')
-    ).order_by(Reservation.date, Reservation.time).limit(10).all()
+    recent = select(Reservation.id, literal('recent').label('list'))\
+        .order_by(Reservation.created_at.desc()).limit(5).subquery()
+    upcoming = select(Reservation.id, literal('upcoming').label('list'))\
+        .filter(and_(Reservation.date >= today, Reservation.status == 'confirmed'))\
+        .order_by(Reservation.date, Reservation.time).limit(10).subquery()
+    lists = union_all(select(recent.c.id, recent.c.list), select(upcoming.c.id, upcoming.c.list)).subquery()
+    rows = db.session.query(Reservation, lists.c.list).join(lists, lists.c.id == Reservation.id).all()
+    
+    recent_reservations = sorted((r for r, name in rows if name == 'recent'),
+                                 key=lambda r: r.created_at, reverse=True)
+    upcoming_reservations = sorted((r for r, name in rows if name == 'upcoming'),
+                                   key=lambda r: (r.date, r.time))
     
     # Recent contact messages
     recent_messages = ContactMessage.query.order_by(ContactMessage.created_at.desc()).limit(5).all()
     
-    # Revenue statistics (example - would need order model)
-    stats = {
-        'total_reservations': total_reservations,
-        'pending_reservations': pending_reservations,
-        'total_menu_items': total_menu_items,
-        'pending_reviews': pending_reviews,
-        'unread_messages': unread_messages
-    }
-    
     return render_template('admin/dashboard.html',
                          stats=stats,
                          recent_reservations=recent_reservations,
@@ -96,6 +94,41 @@ def dashboard():
                          recent_messages=recent_messages)
 
 
+@admin_bp.route('/stream')
+@login_required
+@limiter.exempt
+def stream():
+    """Server-sent events for new reservations, messages and reviews"""
+    config = current_app.config
+    last_event_id = request.headers.get('Last-Event-ID')
+    
+    # An open stream ties up a thread. Sync workers have only one, and busy
+    # workers keep theirs for normal requests: both send what's new and let the
+    # browser reconnect after LIVE_RETRY_MS, which still costs no queries.
+    release = request.environ.get('wsgi.multithread') and live_events.try_acquire(config['LIVE_MAX_STREAMS'])
+    duration = config['LIVE_STREAM_DURATION'] if release else 0
+    
+    def generate():
+        yield f"retry: {config['LIVE_RETRY_MS']}\n\n"
+        for item in live_events.stream(last_event_id, duration):
+            if item is None:
+                yield ': keepalive\n\n'
+                continue
+            event_id, kind, data = item
+            if kind is None:
+                yield f'id: {event_id}\n\n'
+            else:
+                yield f'id: {event_id}\nevent: {kind}\ndata: {json.dumps(data)}\n\n'
+    
+    response = current_app.response_class(generate(), mimetype='text/event-stream')
+    if release:
+        # The server closes the response however it ends, even if the client left before the first chunk
+        response.call_on_close(release)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # nginx: pass events through unbuffered
+    return response
+
+
 # ============ Reservations Management ============
 
 @admin_bp.route('/reservations')
@@ -160,6 +193,59 @@ def delete_reservation(id):
     return redirect(url_for('admin.reservations'))
 
 
+# ============ Analytics ============
+
+def analytics_range():
+    """
+    Report range from the query string, defaulting to the last 90 days
+    
+    Returns:
+        tuple: (start, end, bucket); bucket is None to pick one from the range length
+    
+    Raises:
+        ValueError: if the dates or bucket are invalid
+    """
+    today = datetime.now().date()
+    end = datetime.strptime(request.args['end'], '%Y-%m-%d').date() if request.args.get('end') else today
+    start = datetime.strptime(request.args['start'], '%Y-%m-%d').date() if request.args.get('start') \
+        else end - timedelta(days=89)
+    bucket = request.args.get('bucket') or None
+    
+    if start > end:
+        raise ValueError('start must not be after end')
+    if (end - start).days > 3660:
+        raise ValueError('ranges are limited to ten years')
+    if bucket not in (None, 'day', 'week', 'month'):
+        raise ValueError('bucket must be day, week or month')
+    return start, end, bucket
+
+
+@admin_bp.route('/analytics')
+@login_required
+def analytics_page():
+    """Reservation and covers charts over the daily rollups"""
+    try:
+        start, end, bucket = analytics_range()
+    except ValueError as e:
+        flash(f'Invalid range: {e}', 'warning')
+        return redirect(url_for('admin.analytics_page'))
+    
+    report = analytics.report(start, end, bucket)
+    return render_template('admin/analytics.html', report=report)
+
+
+@admin_bp.route('/analytics.json')
+@login_required
+def analytics_data():
+    """Same report as JSON (?start=YYYY-MM-DD&end=YYYY-MM-DD&bucket=day|week|month)"""
+    try:
+        start, end, bucket = analytics_range()
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    return jsonify({'success': True, **analytics.report(start, end, bucket)})
+
+
 # ============ Menu Management ============
 
 @admin_bp.route('/menu')
@@ -199,8 +285,7 @@ def add_menu_item():
         )
         
         if form.image.data:
-            image_file = save_image(form.image.data, folder='menu')
-            menu_item.image_url = image_file
+            menu_item.set_image(save_image(form.image.data))
         
         db.session.add(menu_item)
         db.session.commit()
@@ -231,15 +316,15 @@ def edit_menu_item(id):
         menu_item.display_order = form.display_order.data
         menu_item.updated_at = datetime.utcnow()
         
+        old_image = menu_item.image_url
         if form.image.data:
-            # Delete old image
-            if menu_item.image_url:
-                delete_image(menu_item.image_url)
-            # Save new image
-            image_file = save_image(form.image.data, folder='menu')
-            menu_item.image_url = image_file
+            menu_item.set_image(save_image(form.image.data))
         
         db.session.commit()
+        
+        # Drop the old image unless another record still uses it
+        if menu_item.image_url != old_image:
+            release_image(old_image)
         flash('Menu item updated successfully!', 'success')
         return redirect(url_for('admin.menu'))
     
@@ -252,12 +337,11 @@ def edit_menu_item(id):
 def delete_menu_item(id):
     """Delete menu item"""
     menu_item = MenuItem.query.get_or_404(id)
-    
-    if menu_item.image_url:
-        delete_image(menu_item.image_url)
+    image_url = menu_item.image_url
     
     db.session.delete(menu_item)
     db.session.commit()
+    release_image(image_url)
     
     flash('Menu item deleted successfully', 'success')
     return redirect(url_for('admin.menu'))
@@ -354,16 +438,14 @@ def add_gallery_image():
     form = GalleryForm()
     
     if form.validate_on_submit():
-        image_file = save_image(form.image.data, folder='gallery', size=(1200, 800))
-        
         gallery_image = GalleryImage(
             title=form.title.data,
-            image_url=image_file,
             description=form.description.data,
             alt_text=form.alt_text.data or form.title.data,
             display_order=form.display_order.data,
             is_active=form.is_active.data
         )
+        gallery_image.set_image(save_image(form.image.data, size=(1200, 800)))
         
         db.session.add(gallery_image)
         db.session.commit()
@@ -374,15 +456,147 @@ def add_gallery_image():
     return render_template('admin/gallery_form.html', form=form, title='Add Image')
 
 
+@admin_bp.route('/gallery/bulk', methods=['GET', 'POST'])
+@login_required
+def bulk_add_gallery_images():
+    """
+    Add many gallery images from multiple files or a zip archive
+    
+    The page's script sends the photos a few at a time (and zip archives
+    through stage_gallery_archive()), asking for JSON, so every request
+    finishes well within the worker timeout and reports each file. A plain
+    form post is handled too, committing every BULK_UPLOAD_CHUNK images.
+    """
+    # The request size limit for this view is raised by register_upload_limits() in app/__init__.py
+    form = BulkGalleryForm()
+    
+    if form.validate_on_submit():
+        uploads = sorted((f for f in form.images.data if f and f.filename), key=lambda f: f.filename)
+        if form.archive.data:
+            uploads = chain(uploads, iter_zip_images(form.archive.data.stream))
+        
+        results, added = _add_gallery_uploads(uploads, form.is_active.data)
+        
+        if _wants_json():
+            return _bulk_results_json(results, added)
+        return render_template('admin/gallery_bulk_form.html', form=BulkGalleryForm(formdata=None),
+                               title='Bulk Upload', results=results, added=added)
+    
+    if _wants_json() and request.method == 'POST':
+        errors = [error for field in form for error in field.errors]
+        return jsonify({'success': False, 'message': errors[0] if errors else 'Invalid upload'}), 400
+    
+    return render_template('admin/gallery_bulk_form.html', form=form, title='Bulk Upload')
+
+
+@admin_bp.route('/gallery/bulk/archive', methods=['POST'])
+@login_required
+def stage_gallery_archive():
+    """Keep an uploaded zip archive for gallery_archive_chunk() and list its images"""
+    archive = request.files.get('archive')
+    if not archive or not archive.filename.lower().endswith('.zip'):
+        return jsonify({'success': False, 'message': 'Choose a .zip archive'}), 400
+    
+    try:
+        token, names = stage_archive(archive)
+    except zipfile.BadZipFile:
+        return jsonify({'success': False, 'message': 'Not a valid zip archive'}), 400
+    
+    return jsonify({'success': True, 'token': token, 'files': names})
+
+
+@admin_bp.route('/gallery/bulk/archive/<token>', methods=['POST'])
+@login_required
+def gallery_archive_chunk(token):
+    """Add the next BULK_UPLOAD_CHUNK images of a staged archive, from form field `start`"""
+    path = staged_archive_path(token)
+    if path is None:
+        return jsonify({'success': False, 'message': 'Archive not found, please upload it again'}), 404
+    
+    start = request.form.get('start', 0, type=int)
+    stop = start + current_app.config['BULK_UPLOAD_CHUNK']
+    with zipfile.ZipFile(path) as archive:
+        total = len(zip_image_members(archive))
+    
+    results, added = _add_gallery_uploads(iter_zip_images(path, start, stop),
+                                          request.form.get('is_active') == 'y')
+    if stop >= total:
+        os.remove(path)
+    
+    return _bulk_results_json(results, added, next=stop if stop < total else None)
+
+
+def _add_gallery_uploads(uploads, is_active):
+    """
+    Resize uploads into new gallery images after the existing ones, in upload order
+    
+    Each BULK_UPLOAD_CHUNK images are committed before the next are read, so
+    a batch cut short keeps what was already added.
+    
+    Returns:
+        Tuple of (save_images() results, number of images added)
+    """
+    config = current_app.config
+    uploads = iter(uploads)
+    results, added = [], 0
+    
+    while True:
+        # Lazily: a zip member's stream closes once the next one is read, so each is spooled first
+        chunk_results = save_images(islice(uploads, config['BULK_UPLOAD_CHUNK']), size=(1200, 800),
+                                    max_workers=config['BULK_UPLOAD_WORKERS'])
+        if not chunk_results:
+            break
+        results.extend(chunk_results)
+        
+        next_order = (db.session.query(func.max(GalleryImage.display_order)).scalar() or 0) + 1
+        gallery_images = []
+        
+        for filename, saved, error in chunk_results:
+            if error:
+                continue
+            
+            title = os.path.splitext(filename)[0].replace('_', ' ').replace('-', ' ').strip()[:100]
+            gallery_image = GalleryImage(
+                title=title,
+                alt_text=title,
+                display_order=next_order + len(gallery_images),
+                is_active=is_active
+            )
+            gallery_image.set_image(saved)
+            gallery_images.append(gallery_image)
+        
+        # Flushed as a single multi-row INSERT
+        db.session.add_all(gallery_images)
+        db.session.commit()
+        added += len(gallery_images)
+    
+    return results, added
+
+
+def _wants_json():
+    return request.accept_mimetypes.best == 'application/json'
+
+
+def _bulk_results_json(results, added, **extra):
+    return jsonify({
+        'success': True,
+        'added': added,
+        'results': [{'filename': filename, 'added': error is None, 'error': error}
+                    for filename, saved, error in results],
+        **extra
+    })
+
+
 @admin_bp.route('/gallery/<int:id>/delete', methods=['POST'])
 @login_required
 def delete_gallery_image(id):
     """Delete gallery image"""
     image = GalleryImage.query.get_or_404(id)
+    image_url = image.image_url
     
-    delete_image(image.image_url)
     db.session.delete(image)
     db.session.commit()
+    release_image(image_url)
     
     flash('Image deleted successfully', 'success')
     return redirect(url_for('admin.gallery'))
@@ -455,8 +669,7 @@ def add_event():
         )
         
         if form.image.data:
-            image_file = save_image(form.image.data, folder='events')
-            event.image_url = image_file
+            event.set_image(save_image(form.image.data))
         
         db.session.add(event)
         db.session.commit()
@@ -483,13 +696,14 @@ def edit_event(id):
         event.is_featured = form.is_featured.data
         event.updated_at = datetime.utcnow()
         
+        old_image = event.image_url
         if form.image.data:
-            if event.image_url:
-                delete_image(event.image_url)
-            image_file = save_image(form.image.data, folder='events')
-            event.image_url = image_file
+            event.set_image(save_image(form.image.data))
         
         db.session.commit()
+        
+        if event.image_url != old_image:
+            release_image(old_image)
         flash('Event updated successfully!', 'success')
         return redirect(url_for('admin.events'))
     
@@ -502,12 +716,11 @@ def edit_event(id):
 def delete_event(id):
     """Delete event"""
     event = Event.query.get_or_404(id)
-    
-    if event.image_url:
-        delete_image(event.image_url)
+    image_url = event.image_url
     
     db.session.delete(event)
     db.session.commit()
+    release_image(image_url)
     
     flash('Event deleted successfully', 'success')
     return redirect(url_for('admin.events'))
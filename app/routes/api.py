@@ -1,14 +1,26 @@
-from flask import Blueprint, jsonify, request
-from app import db, limiter
+import json
+import time
+import hashlib
+from flask import Blueprint, request, current_app
+from werkzeug.exceptions import HTTPException
+from app import db, limiter, csrf, page_cache, content_versions, catalog_sync
+from app.cache import LRUCache
+from app.serialization import msgpack, prefers_msgpack, vary_on_accept, api_response, json_list_response
 from app.models import MenuItem, Category, Review, Event, Reservation
 from datetime import datetime
 from sqlalchemy import and_
+from sqlalchemy.orm import joinedload
 
 api_bp = Blueprint('api', __name__)
+api_bp.after_request(vary_on_accept)
+
+# (JSON body, MessagePack body, etag, time.monotonic() when built) of the availability snapshot per menu content version
+_availability_snapshots = LRUCache(max_entries=4)
 
 
 @api_bp.route('/menu')
 @limiter.limit("100 per minute")
+@page_cache.cached('menu', query_args=('category_id', 'featured'))
 def get_menu():
     """Get all menu items (API endpoint)"""
     category_id = request.args.get('category_id', type=int)
@@ -22,13 +34,8 @@ def get_menu():
     if featured_only:
         query = query.filter_by(is_featured=True)
     
-    items = query.order_by(MenuItem.category_id, MenuItem.display_order).all()
-    
-    return jsonify({
-        'success': True,
-        'count': len(items),
-        'items': [item.to_dict() for item in items]
-    })
+    query = query.options(joinedload(MenuItem.category)).order_by(MenuItem.category_id, MenuItem.display_order)
+    return json_list_response(query, 'items')
 
 
 @api_bp.route('/menu/<int:id>')
@@ -38,22 +45,80 @@ def get_menu_item(id):
     item = MenuItem.query.get_or_404(id)
     
     if not item.is_available:
-        return jsonify({'success': False, 'message': 'Item not available'}), 404
+        return api_response({'success': False, 'message': 'Item not available'}), 404
     
-    return jsonify({
+    return api_response({
         'success': True,
         'item': item.to_dict()
     })
 
 
+@api_bp.route('/menu/availability')
+@limiter.exempt
+def get_menu_availability():
+    """
+    Ids of menu items that are currently unavailable, polled by open menu pages
+
+    The snapshot is built once per menu content version and shared by every
+    client. Clients send the last ETag in If-None-Match and get an empty 304
+    until availability changes; the short public max-age lets a proxy or CDN
+    answer most polls without reaching a worker. Changes made on other hosts
+    or with raw SQL don't bump the content version here, so a snapshot is
+    also rebuilt once it is MENU_AVAILABILITY_MAX_AGE seconds old.
+    """
+    max_age = current_app.config['MENU_AVAILABILITY_MAX_AGE']
+    version = content_versions.get('menu')
+    snapshot = _availability_snapshots.get(version)
+    if snapshot is None or time.monotonic() - snapshot[3] >= max_age:
+        ids = [id for id, in db.session.query(MenuItem.id).filter_by(is_available=False).order_by(MenuItem.id)]
+        etag = hashlib.sha1(json.dumps(ids).encode()).hexdigest()[:16]
+        payload = {'success': True, 'version': etag, 'unavailable': ids}
+        snapshot = (json.dumps(payload, separators=(',', ':')), msgpack and msgpack.packb(payload),
+                    etag, time.monotonic())
+        _availability_snapshots.set(version, snapshot)
+    body, packed, etag, _ = snapshot
+    mimetype = 'application/json'
+    if prefers_msgpack():
+        body, mimetype = packed, 'application/msgpack'
+
+    # Compression (ours or a proxy's) may have suffixed or weakened the tag the client holds
+    if any(tag.split('-')[0] == etag for tag in request.if_none_match.as_set(include_weak=True)):
+        response = current_app.response_class(status=304)
+    else:
+        response = current_app.response_class(body, mimetype=mimetype)
+    # MessagePack is a different representation of the same snapshot
+    response.set_etag(etag if mimetype == 'application/json' else f'{etag}-msgpack')
+    response.cache_control.public = True
+    response.cache_control.max_age = max_age
+    return response
+
+
+@api_bp.route('/menu/changes')
+@limiter.limit("100 per minute")
+def get_menu_changes():
+    """
+    Menu items added or changed since a sync token, plus the ids of items
+    deleted or no longer available; without a token, the full menu
+    """
+    changes = catalog_sync.changes(MenuItem, request.args.get('since'), listed=MenuItem.is_available == True)
+    return api_response({
+        'success': True,
+        'token': changes['token'],
+        'reset': changes['reset'],
+        'items': [item.to_dict() for item in changes['rows']],
+        'removed': changes['removed']
+    })
+
+
 @api_bp.route('/categories')
 @limiter.limit("100 per minute")
+@page_cache.cached('menu')
 def get_categories():
     """Get all categories"""
     categories = Category.query.filter_by(is_active=True)\
         .order_by(Category.display_order).all()
     
-    return jsonify({
+    return api_response({
         'success': True,
         'categories': [{
             'id': c.id,
@@ -79,7 +144,7 @@ def get_reviews():
     avg_rating = db.session.query(db.func.avg(Review.rating))\
         .filter_by(is_approved=True).scalar() or 0
     
-    return jsonify({
+    return api_response({
         'success': True,
         'count': len(reviews),
         'average_rating': round(avg_rating, 2),
@@ -98,12 +163,23 @@ def get_events():
     if upcoming_only:
         query = query.filter(Event.event_date >= datetime.utcnow())
     
-    events = query.order_by(Event.event_date).all()
-    
-    return jsonify({
+    return json_list_response(query.order_by(Event.event_date), 'events')
+
+
+@api_bp.route('/events/changes')
+@limiter.limit("100 per minute")
+def get_event_changes():
+    """
+    Events added or changed since a sync token, plus the ids of events
+    deleted or deactivated; without a token, every active event
+    """
+    changes = catalog_sync.changes(Event, request.args.get('since'), listed=Event.is_active == True)
+    return api_response({
         'success': True,
-        'count': len(events),
-        'events': [event.to_dict() for event in events]
+        'token': changes['token'],
+        'reset': changes['reset'],
+        'events': [event.to_dict() for event in changes['rows']],
+        'removed': changes['removed']
     })
 
 
@@ -115,7 +191,7 @@ def check_reservation_availability():
     
     required_fields = ['date', 'time', 'party_size']
     if not all(field in data for field in required_fields):
-        return jsonify({
+        return api_response({
             'success': False,
             'message': 'Missing required fields'
         }), 400
@@ -128,7 +204,7 @@ def check_reservation_availability():
         
         # Check if date is in the past
         if date_obj < datetime.now().date():
-            return jsonify({
+            return api_response({
                 'success': False,
                 'available': False,
                 'message': 'Cannot book reservations in the past'
@@ -147,7 +223,7 @@ def check_reservation_availability():
         max_reservations_per_slot = 5
         available = existing_count < max_reservations_per_slot
         
-        return jsonify({
+        return api_response({
             'success': True,
             'available': available,
             'message': 'Time slot available' if available else 'This time slot is fully booked',
@@ -156,12 +232,12 @@ def check_reservation_availability():
         })
         
     except ValueError as e:
-        return jsonify({
+        return api_response({
             'success': False,
             'message': 'Invalid date or time format'
         }), 400
     except Exception as e:
-        return jsonify({
+        return api_response({
             'success': False,
             'message': 'Error checking availability'
         }), 500
@@ -174,13 +250,13 @@ def search():
     query = request.args.get('q', '').strip()
     
     if not query:
-        return jsonify({
+        return api_response({
             'success': False,
             'message': 'Search query is required'
         }), 400
     
     if len(query) < 2:
-        return jsonify({
+        return api_response({
             'success': False,
             'message': 'Search query must be at least 2 characters'
         }), 400
@@ -196,7 +272,7 @@ def search():
         )
     ).order_by(MenuItem.name).limit(20).all()
     
-    return jsonify({
+    return api_response({
         'success': True,
         'query': query,
         'count': len(items),
@@ -216,7 +292,7 @@ def get_stats():
         and_(Event.is_active == True, Event.event_date >= datetime.utcnow())
     ).count()
     
-    return jsonify({
+    return api_response({
         'success': True,
         'stats': {
             'total_reviews': total_reviews,
@@ -227,10 +303,75 @@ def get_stats():
     })
 
 
+def _batch_paths():
+    """Paths listed in a batch request body, or None if it isn't a list of strings"""
+    data = request.get_json(silent=True)
+    paths = data.get('requests') if isinstance(data, dict) else None
+    if not isinstance(paths, list) or not all(isinstance(path, str) for path in paths):
+        return None
+    return paths
+
+
+@api_bp.route('/batch', methods=['POST'])
+@csrf.exempt  # read-only, and called by apps without a session
+@limiter.limit("100 per minute", cost=lambda: len(_batch_paths() or []) or 1)
+def batch():
+    """
+    Run several GETs to the read endpoints above in one round trip
+
+    Body: {"requests": ["/api/menu", "/api/reviews?limit=5", ...]}. Each path
+    runs in its own request context under this request's app context, so
+    they share one database session and content version lookups. The batch
+    costs one hit per sub-request, and each sub-request also counts against
+    its endpoint's own limit, coming back with status 429 once that is used
+    up, as a separate request would.
+    """
+    paths = _batch_paths()
+    if not paths:
+        return api_response({'success': False, 'message': 'Expected {"requests": ["/api/...", ...]}'}), 400
+
+    max_requests = current_app.config['API_BATCH_MAX_REQUESTS']
+    if len(paths) > max_requests:
+        return api_response({'success': False, 'message': f'At most {max_requests} requests per batch'}), 400
+
+    responses = []
+    for path in paths:
+        status, body = _run_batched(path)
+        responses.append({'path': path, 'status': status, 'body': body})
+
+    return api_response({
+        'success': True,
+        'responses': responses
+    })
+
+
+def _run_batched(path):
+    """(status, JSON body) of a GET to one of this blueprint's read endpoints"""
+    # Same client address, so endpoint limits are charged to the caller's own counters
+    with current_app.test_request_context(path, method='GET', base_url=request.host_url,
+                                          environ_overrides={'REMOTE_ADDR': request.remote_addr}):
+        rule = request.url_rule
+        if request.routing_exception is not None or rule is None \
+                or rule.endpoint == 'api.batch' or not rule.endpoint.startswith('api.'):
+            return 404, {'success': False, 'message': 'Not an API read endpoint'}
+
+        view = current_app.view_functions[rule.endpoint]
+        try:
+            # The limiter's wrapper checks the endpoint's limit, raising RateLimitExceeded (a 429)
+            response = current_app.make_response(view(**request.view_args))
+        except HTTPException as e:
+            response = current_app.make_response(current_app.handle_user_exception(e))
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.error(f"Error in batched request {path}: {str(e)}")
+            return 500, {'success': False, 'message': 'Internal server error'}
+        return response.status_code, response.get_json(silent=True)
+
+
 # Error handlers for API
 @api_bp.errorhandler(404)
 def api_not_found(error):
-    return jsonify({
+    return api_response({
         'success': False,
         'message': 'Resource not found'
     }), 404
@@ -238,7 +379,7 @@ def api_not_found(error):
 
 @api_bp.errorhandler(500)
 def api_internal_error(error):
-    return jsonify({
+    return api_response({
         'success': False,
         'message': 'Internal server error'
     }), 500
@@ -246,7 +387,7 @@ def api_internal_error(error):
 
 @api_bp.errorhandler(429)
 def api_rate_limit_exceeded(error):
-    return jsonify({
+    return api_response({
         'success': False,
         'message': 'Rate limit exceeded. Please try again later.'
     }), 429
@@ -0,0 +1,182 @@
+from flask import Blueprint, current_app, request, abort
+from urllib.parse import quote
+from werkzeug.security import safe_join
+from werkzeug.utils import send_file
+from app import limiter
+from app.locks import file_lock
+from app.utils import RENDITION_EXTENSIONS
+import os
+import mimetypes
+import threading
+
+images_bp = Blueprint('images', __name__)
+
+
+@images_bp.route('/static/uploads/<path:filename>')
+@limiter.exempt
+def upload(filename):
+    """Serve an uploaded file (takes precedence over the generic static route)"""
+    if not _is_public_upload(filename):
+        abort(404)
+    return send_stored_file(current_app.config['UPLOAD_FOLDER'], filename,
+                            current_app.config['UPLOAD_ACCEL_LOCATION'],
+                            current_app.config['UPLOAD_MAX_AGE'])
+
+
+@images_bp.route('/img/<int:width>x<int:height>/<path:filename>')
+@limiter.exempt
+def resized(width, height, filename):
+    """Serve an upload resized to a whitelisted size, generating it on first request"""
+    if f'{width}x{height}' not in current_app.config['IMAGE_RESIZE_SIZES']:
+        abort(404)
+
+    if not _is_public_upload(filename):
+        abort(404)
+    source = safe_join(current_app.config['UPLOAD_FOLDER'], filename)
+    if source is None or not os.path.isfile(source):
+        abort(404)
+
+    cache_path = safe_join(current_app.config['IMAGE_CACHE_FOLDER'], f'{width}x{height}', filename)
+
+    if _is_fresh(cache_path, source):
+        # Bump mtime so eviction treats the file as recently used
+        os.utime(cache_path)
+    else:
+        from PIL import Image
+
+        with _coalesce(cache_path):
+            # Another request may have finished the resize while we waited
+            if not _is_fresh(cache_path, source):
+                try:
+                    _render(source, cache_path, (width, height))
+                except (OSError, Image.DecompressionBombError) as e:
+                    current_app.logger.error(f"Error resizing image {filename}: {str(e)}")
+                    abort(404)
+        evict_image_cache()
+
+    return send_stored_file(current_app.config['IMAGE_CACHE_FOLDER'], f'{width}x{height}/{filename}',
+                            current_app.config['IMAGE_CACHE_ACCEL_LOCATION'],
+                            current_app.config['IMAGE_CACHE_MAX_AGE'])
+
+
+def send_stored_file(folder, filename, accel_location, max_age):
+    """
+    Serve a file from folder without a worker copying its bytes in Python
+
+    UPLOAD_SERVING picks how:
+        'x-accel':    nginx serves accel_location + filename from an internal
+                      location (X-Accel-Redirect), including ranges and validators
+        'x-sendfile': Apache/lighttpd serve the absolute path (X-Sendfile)
+        'sendfile':   the file is handed to the server's wsgi.file_wrapper, which
+                      gunicorn sends with sendfile(2); Werkzeug answers
+                      conditional and range requests
+
+    Stored files are content-addressed or never rewritten, so they are
+    cacheable forever.
+    """
+    path = safe_join(folder, filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+
+    mode = current_app.config['UPLOAD_SERVING']
+    if mode == 'x-accel':
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        response = current_app.response_class(mimetype=mimetype)
+        response.headers['X-Accel-Redirect'] = accel_location.rstrip('/') + '/' + quote(filename)
+    else:
+        response = send_file(path, request.environ, max_age=max_age, conditional=True,
+                             use_x_sendfile=mode == 'x-sendfile',
+                             response_class=current_app.response_class)
+
+    response.headers['Cache-Control'] = f'public, max-age={max_age}, immutable'
+    return response
+
+
+def _is_public_upload(filename):
+    """
+    Whether an uploads path names an image or rendition, as opposed to the
+    .tmp spool folder, .json manifests or .lock files kept next to them
+    """
+    if any(part.startswith('.') for part in filename.split('/')):
+        return False
+    extension = os.path.splitext(filename)[1].lower().lstrip('.')
+    return extension in current_app.config['ALLOWED_EXTENSIONS'] or extension in RENDITION_EXTENSIONS.values()
+
+
+def _is_fresh(cache_path, source):
+    """Check whether a cached rendition exists and is newer than its source"""
+    try:
+        return os.path.getmtime(cache_path) >= os.path.getmtime(source)
+    except OSError:
+        return False
+
+
+def _coalesce(cache_path):
+    """
+    Serialize generation of renditions across threads and worker processes
+
+    The lock covers the rendition's folder (a few images of one size, see
+    utils.image_lock()), so only the first request resizes and the cache
+    holds one lock file per folder rather than one per rendition.
+    """
+    return file_lock(os.path.join(os.path.dirname(cache_path), '.lock'))
+
+
+def _render(source, cache_path, size):
+    """Crop-resize source to exactly size and atomically write it to cache_path"""
+    from PIL import Image, ImageOps
+
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    tmp_path = f'{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+
+    try:
+        with Image.open(source) as image:
+            image_format = image.format
+            image = ImageOps.exif_transpose(image)
+            if image_format == 'JPEG' and image.mode != 'RGB':
+                image = image.convert('RGB')
+            resized = ImageOps.fit(image, size, Image.Resampling.LANCZOS)
+            resized.save(tmp_path, format=image_format, quality=85, optimize=True)
+        os.replace(tmp_path, cache_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def evict_image_cache():
+    """Delete least recently used renditions until the cache fits IMAGE_CACHE_MAX_BYTES"""
+    cache_folder = current_app.config['IMAGE_CACHE_FOLDER']
+    max_bytes = current_app.config['IMAGE_CACHE_MAX_BYTES']
+
+    entries = []
+    total = 0
+    for root, _, files in os.walk(cache_folder):
+        for name in files:
+            path = os.path.join(root, name)
+            if name.endswith('.lock') and name != '.lock':
+                # Per-rendition lock files written by earlier versions
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+                continue
+            if name == '.lock' or name.endswith('.tmp'):
+                continue
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+    if total <= max_bytes:
+        return
+
+    for _, size, path in sorted(entries):
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        if total <= max_bytes:
+            break
@@ -1,5 +1,5 @@
 from flask import Blueprint, render_template, request, flash, redirect, url_for, jsonify
-from app import db, limiter
+from app import db, limiter, page_cache
 from app.models import MenuItem, Category, GalleryImage, Review, Event, Reservation, ContactMessage
 from app.forms import ReservationForm, ContactForm, ReviewForm
 from app.utils import send_reservation_confirmation, send_contact_notification
@@ -10,6 +10,7 @@ main_bp = Blueprint('main', __name__)
 
 
 @main_bp.route('/')
+@page_cache.cached('menu', 'reviews', 'events', 'gallery')
 def index():
     """Homepage"""
     # Get featured menu items
@@ -37,6 +38,7 @@ def index():
 
 
 @main_bp.route('/menu')
+@page_cache.cached('menu', query_args=('search', 'category'))
 def menu():
     """Menu page"""
     # Get all active categories with their items
@@ -96,6 +98,7 @@ def reservations():
 
 
 @main_bp.route('/gallery')
+@page_cache.cached('gallery', query_args=('page',))
 def gallery():
     """Gallery page"""
     page = request.args.get('page', 1, type=int)
@@ -109,6 +112,7 @@ def gallery():
 
 
 @main_bp.route('/events')
+@page_cache.cached('events')
 def events():
     """Events page"""
     # Get upcoming events
@@ -125,6 +129,7 @@ def events():
 
 
 @main_bp.route('/about')
+@page_cache.cached()
 def about():
     """About page"""
     return render_template('about.html')
@@ -0,0 +1,148 @@
+from datetime import date, time
+from flask import request, current_app, jsonify, stream_with_context
+from flask.json.provider import DefaultJSONProvider, _default as flask_default
+from sqlalchemy import func
+
+try:
+    import orjson
+except ImportError:  # the stdlib encoder is used without the optional orjson package
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # API responses stay JSON without the optional msgpack package
+    msgpack = None
+
+MSGPACK_MIMETYPES = ('application/msgpack', 'application/x-msgpack')
+
+
+def json_default(obj):
+    """Encode what JSON has no type for: dates and times as ISO 8601, the rest as Flask does"""
+    if isinstance(obj, (date, time)):
+        return obj.isoformat()
+    return flask_default(obj)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    Flask JSON provider that encodes with orjson when it is installed
+
+    Dates, datetimes and times become ISO 8601 strings (Flask's own provider
+    writes dates as HTTP dates), so ``to_dict()`` methods return them as is.
+    Both encoders write the same compact, key-sorted JSON, except that
+    orjson leaves non-ASCII characters as UTF-8 instead of \\u escapes.
+    """
+
+    default = staticmethod(json_default)
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None or not kwargs.keys() <= {'indent', 'separators'}:
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=self._options(kwargs.get('indent'))).decode()
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        pretty = (self.compact is None and self._app.debug) or self.compact is False
+        # Hand the encoded bytes to the response as they are, without a round trip through str
+        body = orjson.dumps(obj, default=self.default, option=self._options(pretty) | orjson.OPT_APPEND_NEWLINE)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+    def _options(self, indent):
+        option = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return option
+
+
+def prefers_msgpack():
+    """Whether the client asked for MessagePack and can get it"""
+    return msgpack is not None and \
+        request.accept_mimetypes.best_match(('application/json',) + MSGPACK_MIMETYPES) in MSGPACK_MIMETYPES
+
+
+def api_response(*args, **kwargs):
+    """
+    Respond as jsonify() would, or with MessagePack for clients that prefer it
+
+    The format is negotiated before anything is encoded, so MessagePack is
+    packed straight from the Python objects, with dates and times as ISO
+    8601 strings like in the JSON.
+    """
+    if not prefers_msgpack():
+        return jsonify(*args, **kwargs)
+    obj = current_app.json._prepare_response_obj(args, kwargs)
+    return current_app.response_class(msgpack.packb(obj, default=json_default), mimetype=MSGPACK_MIMETYPES[0])
+
+
+def json_list_response(query, key, serialize=lambda obj: obj.to_dict()):
+    """
+    Respond with {"count": n, key: [serialized rows], "success": true}, as api_response() would
+
+    Up to API_STREAM_MIN_ROWS rows are encoded in one go, so the response
+    can be cached or compressed as a whole. Clients that prefer MessagePack
+    always get it in one go, packed by api_response(). Longer
+    results are streamed: rows are fetched API_STREAM_YIELD_PER at a time and
+    each batch is sent before the next is read, which keeps memory flat and
+    gets the first bytes out early. The bytes are the same either way. The
+    query must not have a LIMIT of its own.
+    """
+    config = current_app.config
+    provider = current_app.json
+    pretty = (provider.compact is None and current_app.debug) or provider.compact is False
+    buffered = pretty or prefers_msgpack()
+    # One row past the threshold tells whether the result is longer, without counting it
+    objects = query.all() if buffered else query.limit(config['API_STREAM_MIN_ROWS'] + 1).all()
+    if buffered or len(objects) <= config['API_STREAM_MIN_ROWS']:
+        return api_response({'success': True, 'count': len(objects), key: [serialize(obj) for obj in objects]})
+
+    batch = config['API_STREAM_YIELD_PER']
+    new_session = current_app.extensions['sqlalchemy'].session.session_factory
+
+    def encode(obj):
+        return provider.dumps(serialize(obj), separators=(',', ':'))
+
+    @stream_with_context
+    def generate():
+        # The request's session is closed by the time the body is sent, so rows come from a session of our own
+        with new_session() as session:
+            # The total comes with the rows, so it always matches them
+            rows = iter(query.with_session(session).add_columns(func.count().over()).yield_per(batch))
+            first = next(rows, None)
+            total = first[1] if first is not None else 0
+            # Encode the envelope with an empty list and stream the rows into it, keeping the key order
+            envelope = provider.dumps({'success': True, 'count': total, key: []}, separators=(',', ':'))
+            head, tail = envelope.split(f'"{key}":[]', 1)
+
+            chunk = [f'{head}"{key}":[']
+            if first is not None:
+                chunk.append(encode(first[0]))
+            for n, (obj, _) in enumerate(rows, 1):
+                chunk.append(',' + encode(obj))
+                if n % batch == 0:
+                    yield ''.join(chunk)
+                    chunk = []
+            chunk.append(f']{tail}\n')
+            yield ''.join(chunk)
+
+    return current_app.response_class(generate(), mimetype=provider.mimetype)
+
+
+def vary_on_accept(response):
+    """
+    Mark API responses as depending on the Accept header
+
+    Register as an after_request handler of the blueprints whose views
+    respond with api_response(), so caches keep JSON and MessagePack apart.
+    """
+    if msgpack is not None and response.mimetype in ('application/json',) + MSGPACK_MIMETYPES:
+        response.vary.add('Accept')
+    return response
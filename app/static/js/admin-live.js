@@ -0,0 +1,77 @@
+// Live admin updates: new reservations, messages and reviews pushed over server-sent events
+
+(() => {
+    const script = document.currentScript;
+    if (!script || !window.EventSource) return;
+
+    const status = document.getElementById('live-status');
+    const setStatus = (text, color) => {
+        if (!status) return;
+        status.textContent = text;
+        status.className = `badge bg-${color} me-2`;
+    };
+
+    // ===== HELPERS =====
+    const escapeHtml = value => String(value ?? '').replace(/[&<>"']/g, c => ({
+        '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'
+    })[c]);
+
+    const bumpStat = (name, by = 1) => {
+        document.querySelectorAll(`[data-stat="${name}"]`).forEach(el => {
+            const value = (parseInt(el.textContent, 10) || 0) + by;
+            el.textContent = value;
+            el.classList.toggle('d-none', el.classList.contains('badge') && value <= 0);
+        });
+    };
+
+    const prependRow = (tbodyId, html, keep = 5) => {
+        const tbody = document.getElementById(tbodyId);
+        if (!tbody) return;
+        tbody.insertAdjacentHTML('afterbegin', html);
+        tbody.firstElementChild.classList.add('table-success');
+        while (tbody.children.length > keep) tbody.lastElementChild.remove();
+    };
+
+    const formatDate = iso => new Date(`${iso}T00:00:00`).toLocaleDateString(undefined, { month: 'short', day: '2-digit' });
+
+    // ===== EVENT HANDLERS =====
+    const handlers = {
+        reservation: r => {
+            bumpStat('total_reservations');
+            if (r.status === 'pending' || !r.status) bumpStat('pending_reservations');
+            prependRow('recent-reservations', `<tr>
+                <td>${escapeHtml(r.name)}</td>
+                <td>${escapeHtml(formatDate(r.date))}</td>
+                <td>${escapeHtml(r.time)}</td>
+                <td><span class="badge bg-warning">${escapeHtml(r.status || 'pending')}</span></td>
+            </tr>`);
+
+            const banner = document.getElementById('live-new-reservations');
+            if (banner) {
+                const count = banner.querySelector('[data-live-count]');
+                count.textContent = (parseInt(count.textContent, 10) || 0) + 1;
+                banner.classList.remove('d-none');
+            }
+        },
+        message: m => {
+            bumpStat('unread_messages');
+            prependRow('recent-messages', `<tr class="table-warning">
+                <td>${escapeHtml(m.name)}</td>
+                <td>${escapeHtml(m.email)}</td>
+                <td>${escapeHtml(m.subject || 'No subject')}</td>
+                <td>${escapeHtml(new Date(m.created_at).toLocaleDateString())}</td>
+                <td><span class="badge bg-primary">New</span></td>
+            </tr>`);
+        },
+        review: () => bumpStat('pending_reviews'),
+    };
+
+    // ===== STREAM =====
+    // EventSource reconnects by itself and sends Last-Event-ID, so nothing is missed in between
+    const source = new EventSource(script.dataset.stream);
+    source.onopen = () => setStatus('Live', 'success');
+    source.onerror = () => setStatus(source.readyState === EventSource.CLOSED ? 'Offline' : 'Reconnecting', 'secondary');
+    Object.entries(handlers).forEach(([name, handler]) => {
+        source.addEventListener(name, event => handler(JSON.parse(event.data)));
+    });
+})();
@@ -77,6 +77,55 @@ categoryBadges.forEach(badge => {
     });
 });
 
+// ===== LIVE MENU AVAILABILITY =====
+// Marks items sold out (or back) in place; the server answers 304 until something changes
+const menuSection = document.getElementById('menu-items');
+if (menuSection && menuSection.dataset.availability) {
+    const interval = (parseInt(menuSection.dataset.poll, 10) || 20) * 1000;
+    let etag = null;
+    let timer = null;
+
+    const applyAvailability = (unavailable) => {
+        const soldOut = new Set(unavailable.map(String));
+        document.querySelectorAll('.menu-item-card[data-item-id]').forEach(item => {
+            const isSoldOut = soldOut.has(item.dataset.itemId);
+            if (item.classList.contains('sold-out') === isSoldOut) return;
+            item.classList.toggle('sold-out', isSoldOut);
+            const title = item.querySelector('.menu-item-title');
+            if (isSoldOut) {
+                title.insertAdjacentHTML('beforeend', ' <span class="badge bg-secondary sold-out-badge">Sold out</span>');
+            } else {
+                item.querySelector('.sold-out-badge')?.remove();
+            }
+        });
+    };
+
+    const pollAvailability = async () => {
+        try {
+            const response = await fetch(menuSection.dataset.availability, {
+                headers: etag ? { 'If-None-Match': etag } : {}
+            });
+            if (response.ok) {
+                etag = response.headers.get('ETag');
+                applyAvailability((await response.json()).unavailable);
+            }
+        } catch (error) {
+            // Offline for a moment; try again on the next tick
+        }
+    };
+
+    // Background tabs stop polling and catch up as soon as they are shown again
+    const schedule = () => {
+        clearInterval(timer);
+        timer = document.hidden ? null : setInterval(pollAvailability, interval + Math.random() * 1000);
+    };
+    document.addEventListener('visibilitychange', () => {
+        if (!document.hidden) pollAvailability();
+        schedule();
+    });
+    schedule();
+}
+
 // ===== RESERVATION FORM - AVAILABILITY CHECK =====
 const reservationForm = document.getElementById('reservationForm');
 if (reservationForm) {
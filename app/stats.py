@@ -0,0 +1,137 @@
+from collections import Counter
+from sqlalchemy import event, select, update, func, case, bindparam
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, attributes
+
+
+def stored_value(session, obj, attribute):
+    """Value of a persistent object's attribute as stored in the database, during a flush"""
+    history = attributes.get_history(obj, attribute)
+    if history.deleted:
+        return history.deleted[0]
+    if history.unchanged:
+        return history.unchanged[0]
+    # Assigned without the old value being loaded: ask the database
+    model = type(obj)
+    return session.connection().execute(
+        select(getattr(model, attribute)).where(model.id == obj.id)
+    ).scalar()
+
+
+class DashboardStats:
+    """
+    Running totals for the admin dashboard, kept in the stat_counters table
+
+    Models list the counters they feed in a ``__counters__`` mapping of
+    counter name to None (every row) or (attribute, value) (rows where the
+    attribute has that value). Every flush adjusts the totals in the same
+    transaction as the rows it writes, so reading them stays one small query
+    however large the tables grow. Counters that are missing are recomputed
+    with a single aggregate query; ``flask stats rebuild`` does the same
+    after changes made outside the ORM.
+    """
+
+    def __init__(self, db, app=None):
+        self.db = db
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if not event.contains(Session, 'before_flush', self._collect_deltas):
+            event.listen(Session, 'before_flush', self._collect_deltas)
+            event.listen(Session, 'after_flush', self._apply_deltas)
+            event.listen(Session, 'after_rollback', self._discard_deltas)
+
+    def counted_models(self):
+        return [mapper.class_ for mapper in self.db.Model.registry.mappers
+                if getattr(mapper.class_, '__counters__', None)]
+
+    def get(self):
+        """All counters as a dict, rebuilding them if any is missing"""
+        from app.models import StatCounter
+
+        totals = dict(self.db.session.query(StatCounter.name, StatCounter.value).all())
+        names = {name for model in self.counted_models() for name in model.__counters__}
+        if names <= totals.keys():
+            return totals
+        return self.rebuild()
+
+    def compute(self):
+        """Count every counter from the tables themselves, in one statement"""
+        columns = []
+        for model in self.counted_models():
+            for name, condition in model.__counters__.items():
+                if condition is None:
+                    total = func.count()
+                else:
+                    attribute, value = condition
+                    total = func.coalesce(func.sum(case((getattr(model, attribute) == value, 1), else_=0)), 0)
+                columns.append(select(total).select_from(model).scalar_subquery().label(name))
+        row = self.db.session.execute(select(*columns)).one()
+        return dict(row._mapping)
+
+    def rebuild(self):
+        """Replace the stored counters with fresh counts and return them"""
+        from app.models import StatCounter
+
+        totals = self.compute()
+        table = StatCounter.__table__
+        try:
+            self.db.session.execute(table.delete())
+            self.db.session.execute(table.insert(), [{'name': name, 'value': value}
+                                                     for name, value in totals.items()])
+            self.db.session.commit()
+        except IntegrityError:
+            # Another worker rebuilt them at the same time
+            self.db.session.rollback()
+        return totals
+
+    def _collect_deltas(self, session, flush_context, instances):
+        deltas = session.info.setdefault('stat_counter_deltas', Counter())
+        for obj in session.new:
+            for name, condition in getattr(obj, '__counters__', {}).items():
+                if condition is None or self._matches(condition, self._new_value(obj, condition[0])):
+                    deltas[name] += 1
+
+        for obj in session.deleted:
+            for name, condition in getattr(obj, '__counters__', {}).items():
+                if condition is None or self._matches(condition, stored_value(session, obj, condition[0])):
+                    deltas[name] -= 1
+
+        for obj in session.dirty:
+            for name, condition in getattr(obj, '__counters__', {}).items():
+                if condition is None:
+                    continue
+                history = attributes.get_history(obj, condition[0])
+                if not history.added:
+                    continue
+                deltas[name] += self._matches(condition, history.added[0]) \
+                    - self._matches(condition, stored_value(session, obj, condition[0]))
+
+    def _apply_deltas(self, session, flush_context):
+        from app.models import StatCounter
+
+        deltas = session.info.pop('stat_counter_deltas', None)
+        changes = [{'counter': name, 'delta': delta} for name, delta in (deltas or {}).items() if delta]
+        if changes:
+            table = StatCounter.__table__
+            session.connection().execute(
+                update(table).where(table.c.name == bindparam('counter'))
+                .values(value=table.c.value + bindparam('delta')),
+                changes,
+            )
+
+    def _discard_deltas(self, session):
+        session.info.pop('stat_counter_deltas', None)
+
+    def _matches(self, condition, value):
+        return value == condition[1]
+
+    def _new_value(self, obj, attribute):
+        """Value a pending row will be inserted with, column default included"""
+        value = getattr(obj, attribute)
+        if value is None:
+            default = obj.__table__.c[attribute].default
+            if default is not None and default.is_scalar:
+                value = default.arg
+        return value
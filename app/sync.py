@@ -0,0 +1,179 @@
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import event, select, update, delete, func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+
+class CatalogSync:
+    """
+    Change tracking for clients that keep their own copy of a catalog
+
+    Models opt in with a ``__sync_area__`` name and a ``sync_version``
+    column. Every flush that inserts, changes or deletes such rows takes the
+    area's next version from the sync_counters table and stamps it on them;
+    deletions leave a Tombstone with that version instead. Bumping the
+    counter row locks it until commit, so versions become visible in order
+    and a client holding version N only ever needs rows above N.
+
+    Tombstones are kept for SYNC_TOMBSTONE_RETENTION_DAYS and pruned when
+    later rows of their area are deleted. The counter remembers the newest
+    version pruned, and clients with an older token start over.
+
+    A model can also list ``__sync_via__ = {'category_id': 'categories'}``:
+    changing a row of the categories table then restamps the rows that point
+    at it, since their serialized form includes it.
+    """
+
+    def __init__(self, db, app=None):
+        self.db = db
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        if not event.contains(Session, 'before_flush', self._stamp_changes):
+            event.listen(Session, 'before_flush', self._stamp_changes)
+
+    def synced_models(self):
+        return [mapper.class_ for mapper in self.db.Model.registry.mappers
+                if getattr(mapper.class_, '__sync_area__', None)]
+
+    def changes(self, model, token=None, listed=None):
+        """
+        Rows of a synced model changed since a sync token
+
+        Args:
+            token: Token from a previous response; None, an unknown token or
+                one from before the latest tombstone pruning returns every
+                listed row with reset=True
+            listed: Filter for rows the catalog shows (e.g. available items);
+                changed rows outside it are reported as removed
+
+        Returns:
+            dict: 'token' for the next call, 'reset', the changed 'rows' and
+            the 'removed' ids
+        """
+        from app.models import SyncCounter, Tombstone
+
+        area = model.__sync_area__
+        # Read the version before the rows: anything committed in between is sent twice, never missed
+        current, pruned = self.db.session.query(SyncCounter.version, SyncCounter.pruned_version)\
+            .filter_by(area=area).first() or (0, None)
+        since = self._parse_token(token)
+        # Deletions up to the pruned version are forgotten, so older tokens can't be brought up to date
+        reset = since is None or since > current or since < (pruned or 0)
+
+        query = model.query
+        if reset:
+            if listed is not None:
+                query = query.filter(listed)
+            return {'token': str(current), 'reset': True, 'rows': query.order_by(model.id).all(), 'removed': []}
+
+        rows, removed = [], []
+        if listed is not None:
+            query = query.add_columns(listed)
+        for row in query.filter(model.sync_version > since).order_by(model.id):
+            if listed is None:
+                rows.append(row)
+            elif row[1]:
+                rows.append(row[0])
+            else:
+                removed.append(row[0].id)
+
+        removed.extend(record_id for record_id, in self.db.session.query(Tombstone.record_id).filter(
+            Tombstone.area == area, Tombstone.sync_version > since).order_by(Tombstone.record_id))
+        return {'token': str(current), 'reset': False, 'rows': rows, 'removed': removed}
+
+    def stamp_unversioned(self):
+        """
+        Give rows without a sync_version a new version of their area
+
+        Rows from before change tracking existed (or inserted with raw SQL)
+        have none, so no delta would ever include them. Run by flask init-db.
+
+        Returns:
+            dict: number of rows stamped per area, for areas that had any
+        """
+        stamped = {}
+        connection = self.db.session.connection()
+        for model in self.synced_models():
+            unversioned = select(model.id).where(model.sync_version.is_(None)).exists()
+            if not connection.execute(select(unversioned)).scalar():
+                continue
+            version = self._next_version(connection, model.__sync_area__)
+            stamped[model.__sync_area__] = connection.execute(
+                update(model).where(model.sync_version.is_(None)).values(sync_version=version)).rowcount
+        self.db.session.commit()
+        return stamped
+
+    def _parse_token(self, token):
+        try:
+            version = int(token)
+        except (TypeError, ValueError):
+            return None
+        return version if version >= 0 else None
+
+    def _next_version(self, connection, area):
+        """Increment an area's counter, holding its row lock until the transaction ends"""
+        from app.models import SyncCounter
+
+        table = SyncCounter.__table__
+        dialect = connection.dialect.name
+        if dialect in ('postgresql', 'sqlite'):
+            insert = (postgresql if dialect == 'postgresql' else sqlite).insert(table).values(area=area, version=1)
+            connection.execute(insert.on_conflict_do_update(index_elements=['area'],
+                                                            set_={'version': table.c.version + 1}))
+        elif not connection.execute(update(table).where(table.c.area == area)
+                                    .values(version=table.c.version + 1)).rowcount:
+            connection.execute(table.insert().values(area=area, version=1))
+        return connection.execute(select(table.c.version).where(table.c.area == area)).scalar()
+
+    def _stamp_changes(self, session, flush_context, instances):
+        from app.models import Tombstone
+
+        stamped, deleted, touched = [], [], {}
+        for obj in session.new:
+            if getattr(obj, '__sync_area__', None):
+                stamped.append(obj)
+        for obj in session.dirty:
+            if not session.is_modified(obj, include_collections=False):
+                continue
+            if getattr(obj, '__sync_area__', None):
+                stamped.append(obj)
+            touched.setdefault(obj.__tablename__, set()).add(obj.id)
+        for obj in session.deleted:
+            if getattr(obj, '__sync_area__', None):
+                deleted.append(obj)
+
+        dependents = [(model, column, touched[table]) for model in self.synced_models()
+                      for column, table in getattr(model, '__sync_via__', {}).items() if table in touched]
+        areas = {obj.__sync_area__ for obj in stamped + deleted} | {model.__sync_area__ for model, _, _ in dependents}
+        if not areas:
+            return
+
+        connection = session.connection()
+        versions = {area: self._next_version(connection, area) for area in sorted(areas)}
+        for obj in stamped:
+            obj.sync_version = versions[obj.__sync_area__]
+        for obj in deleted:
+            session.add(Tombstone(area=obj.__sync_area__, record_id=obj.id, sync_version=versions[obj.__sync_area__]))
+        for area in sorted({obj.__sync_area__ for obj in deleted}):
+            self._prune_tombstones(connection, area)
+        for model, column, ids in dependents:
+            connection.execute(update(model).where(getattr(model, column).in_(ids))
+                               .values(sync_version=versions[model.__sync_area__]))
+
+    def _prune_tombstones(self, connection, area):
+        """Delete an area's tombstones older than the retention, under the counter row lock"""
+        from app.models import SyncCounter, Tombstone
+
+        cutoff = datetime.utcnow() - timedelta(days=current_app.config['SYNC_TOMBSTONE_RETENTION_DAYS'])
+        tombstones = Tombstone.__table__
+        pruned = connection.execute(select(func.max(tombstones.c.sync_version)).where(
+            tombstones.c.area == area, tombstones.c.deleted_at < cutoff)).scalar()
+        if pruned is None:
+            return
+        # Versions grow with time, so everything up to the newest expired one goes
+        connection.execute(delete(tombstones).where(tombstones.c.area == area, tombstones.c.sync_version <= pruned))
+        counters = SyncCounter.__table__
+        connection.execute(update(counters).where(counters.c.area == area).values(pruned_version=pruned))
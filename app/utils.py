@@ -1,10 +1,22 @@
+import io
 import os
+import re
+import glob
+import base64
+import json
+import hashlib
 import secrets
-from PIL import Image
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from flask import current_app, url_for
-from flask_mail import Message
-from app import mail
-from slugify import slugify
+from werkzeug.datastructures import FileStorage
+from markupsafe import Markup, escape
+from sqlalchemy import select, func, union_all
+from app import db, mail
+from app.locks import file_lock
+from app.models import MenuItem, Event, GalleryImage
 
 
 def allowed_file(filename):
@@ -13,9 +25,23 @@ def allowed_file(filename):
            filename.rsplit('.', 1)[1].lower() in current_app.config['ALLOWED_EXTENSIONS']
 
 
+RENDITION_EXTENSIONS = {'avif': 'avif', 'webp': 'webp', 'jpeg': 'jpg'}
+RENDITION_MIME_TYPES = {'avif': 'image/avif', 'webp': 'image/webp', 'jpeg': 'image/jpeg'}
+
+
 def save_image(form_image, folder='images', size=(800, 800)):
     """
-    Save uploaded image with random filename
+    Save uploaded image under its content hash and generate responsive renditions
+    
+    Identical uploads processed at the same size map to the same file, so a
+    photo reused for menu items and events is stored and processed once.
+    Results are recorded in a JSON manifest next to the image and returned
+    directly on later uploads of the same content. The size is part of the
+    hash: the same photo in the gallery (1200x800) is stored separately, as
+    it needs its own resized file and renditions anyway.
+    
+    The upload is streamed to a temporary file rather than read into memory,
+    and decoded with load_image() so large photos never expand to full size.
     
     Args:
         form_image: FileStorage object from form
@@ -23,57 +49,469 @@ def save_image(form_image, folder='images', size=(800, 800)):
         size: Tuple of (width, height) for resizing
     
     Returns:
-        Filename of saved image
+        Dict with 'image_url', 'thumbnail_url', 'renditions' (see create_renditions)
+        and 'placeholder' (see make_placeholder)
     """
-    # Generate random filename
-    random_hex = secrets.token_hex(8)
     _, file_ext = os.path.splitext(form_image.filename)
-    filename = random_hex + file_ext
+    upload_path, digest = spool_upload(form_image, size)
+    return store_image(upload_path, digest, file_ext, folder, size)
+
+
+def store_image(upload_path, digest, file_ext, folder='images', size=(800, 800)):
+    """
+    Process an upload already spooled to disk by spool_upload()
+    
+    Takes ownership of upload_path: it is deleted before returning. If
+    processing fails, partial output is removed and the error re-raised.
+    Arguments and return value are as for save_image().
+    """
+    from PIL import Image
+    
+    image_url = f"{folder}/{digest[:2]}/{digest}{file_ext.lower()}"
     
     # Create folder path
-    folder_path = os.path.join(current_app.config['UPLOAD_FOLDER'], folder)
+    file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], image_url)
+    folder_path = os.path.dirname(file_path)
     if not os.path.exists(folder_path):
         os.makedirs(folder_path)
     
-    file_path = os.path.join(folder_path, filename)
+    manifest_path = os.path.splitext(file_path)[0] + '.json'
+    # release_image() can't delete the files while they are checked or written
+    with image_lock(image_url):
+        if os.path.exists(file_path) and os.path.exists(manifest_path):
+            try:
+                with open(manifest_path) as f:
+                    saved = json.load(f)
+                # Restarts the grace period release_image() gives the caller to commit
+                os.utime(manifest_path)
+                os.remove(upload_path)
+                return saved
+            except (OSError, ValueError) as e:
+                current_app.logger.error(f"Error reading image manifest: {str(e)}")
+        
+        tmp_path = f"{file_path}.{secrets.token_hex(4)}.tmp"
+        
+        # Resize and save image
+        try:
+            image = load_image(upload_path, size)
+            
+            # Convert RGBA to RGB if necessary
+            if image.mode in ('RGBA', 'LA', 'P'):
+                background = Image.new('RGB', image.size, (255, 255, 255))
+                if image.mode == 'P':
+                    image = image.convert('RGBA')
+                background.paste(image, mask=image.split()[-1] if image.mode == 'RGBA' else None)
+                image = background
+            
+            # Resize maintaining aspect ratio
+            image.thumbnail(size, Image.Resampling.LANCZOS)
+            
+            # Save with optimization
+            image.save(tmp_path, format=Image.registered_extensions().get(file_ext.lower()),
+                       quality=85, optimize=True)
+            os.replace(tmp_path, file_path)
+            
+            renditions = create_renditions(image, image_url)
+            placeholder = make_placeholder(image, current_app.config['IMAGE_PLACEHOLDER_SIZE'])
+            os.remove(upload_path)
+            
+        except Exception as e:
+            if not isinstance(e, Image.DecompressionBombError):
+                current_app.logger.error(f"Error saving image: {str(e)}")
+            # Never keep the original or half-written output; without a
+            # manifest, the next upload of the same file starts over
+            for path in (tmp_path, upload_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            delete_image(image_url)
+            raise
+        
+        saved = {
+            'image_url': image_url,
+            'thumbnail_url': thumbnail_path(image_url, renditions),
+            'renditions': renditions,
+            'placeholder': placeholder
+        }
+        
+        # Written last: its presence marks the image and renditions as complete
+        with open(manifest_path, 'w') as f:
+            json.dump(saved, f)
     
-    # Resize and save image
+    return saved
+
+
+def save_images(uploads, folder='images', size=(800, 800), max_workers=None, validate=True):
+    """
+    Save many uploads at once, resizing them on a thread pool
+    
+    Uploads are streamed to disk one after another (so a request body or zip
+    archive is read sequentially), then decoded and resized in parallel;
+    Pillow releases the GIL while doing so. One bad file doesn't stop the rest.
+    
+    Args:
+        uploads: Iterable of FileStorage objects
+        folder: Subfolder in uploads directory
+        size: Tuple of (width, height) for resizing
+        max_workers: Thread pool size (defaults to CPU count)
+        validate: Check each file with Image.verify() before decoding it
+    
+    Returns:
+        List of (filename, saved dict or None, error message or None), in input order
+    """
+    from PIL import Image
+    
+    app = current_app._get_current_object()
+    
+    def process(upload_path, digest, filename):
+        with app.app_context():
+            if validate:
+                try:
+                    with Image.open(upload_path) as image:
+                        image.verify()
+                except Exception:
+                    os.remove(upload_path)
+                    raise
+            return store_image(upload_path, digest, os.path.splitext(filename)[1], folder, size)
+    
+    results = []
+    pending = {}
+    with ThreadPoolExecutor(max_workers=max_workers or os.cpu_count()) as executor:
+        for upload in uploads:
+            try:
+                upload_path, digest = spool_upload(upload, size)
+            except Exception as e:
+                results.append((upload.filename, None, str(e)))
+                continue
+            
+            # The same photo twice in one batch is processed once
+            if digest in pending:
+                os.remove(upload_path)
+            else:
+                pending[digest] = executor.submit(process, upload_path, digest, upload.filename)
+            results.append((upload.filename, pending[digest], None))
+    
+    for index, (filename, future, error) in enumerate(results):
+        if future is None:
+            continue
+        try:
+            results[index] = (filename, future.result(), None)
+        except Image.DecompressionBombError:
+            results[index] = (filename, None, 'image has too many pixels')
+        except Exception as e:
+            current_app.logger.error(f"Error saving image {filename}: {str(e)}")
+            results[index] = (filename, None, 'not a valid image')
+    
+    return results
+
+
+def zip_image_members(archive):
+    """Allowed images in an open ZipFile, by name"""
+    members = []
+    for info in sorted(archive.infolist(), key=lambda info: info.filename):
+        filename = os.path.basename(info.filename)
+        if info.is_dir() or filename.startswith('.') or info.filename.startswith('__MACOSX/'):
+            continue
+        if allowed_file(filename):
+            members.append(info)
+    return members
+
+
+def iter_zip_images(archive, start=0, stop=None):
+    """
+    Yield a FileStorage for each allowed image in a zip archive, by name
+    
+    Args:
+        archive: Path or file object of the archive
+        start, stop: Slice of the images to yield, as indexes into zip_image_members()
+    """
+    with zipfile.ZipFile(archive) as zf:
+        for info in zip_image_members(zf)[start:stop]:
+            with zf.open(info) as member:
+                yield FileStorage(stream=member, filename=os.path.basename(info.filename))
+
+
+def stage_archive(form_file):
+    """
+    Keep an uploaded zip archive on disk so its images can be added over several requests
+    
+    Archives left behind by abandoned uploads are removed after a day.
+    
+    Returns:
+        Tuple of (token for staged_archive_path(), names of the images in it)
+    
+    Raises:
+        zipfile.BadZipFile: not a zip archive
+    """
+    folder = os.path.join(current_app.config['UPLOAD_FOLDER'], '.tmp')
+    os.makedirs(folder, exist_ok=True)
+    for path in glob.glob(os.path.join(folder, 'bulk-*.zip')):
+        try:
+            if os.path.getmtime(path) < time.time() - 24 * 3600:
+                os.remove(path)
+        except OSError:
+            pass
+    
+    token = secrets.token_hex(16)
+    path = os.path.join(folder, f'bulk-{token}.zip')
+    form_file.save(path)
     try:
-        image = Image.open(form_image)
-        
-        # Convert RGBA to RGB if necessary
-        if image.mode in ('RGBA', 'LA', 'P'):
-            background = Image.new('RGB', image.size, (255, 255, 255))
+        with zipfile.ZipFile(path) as zf:
+            names = [os.path.basename(info.filename) for info in zip_image_members(zf)]
+    except zipfile.BadZipFile:
+        os.remove(path)
+        raise
+    return token, names
+
+
+def staged_archive_path(token):
+    """Path of an archive kept by stage_archive(), or None if there is none for the token"""
+    if not re.fullmatch(r'[0-9a-f]{32}', token or ''):
+        return None
+    path = os.path.join(current_app.config['UPLOAD_FOLDER'], '.tmp', f'bulk-{token}.zip')
+    return path if os.path.exists(path) else None
+
+
+def spool_upload(form_image, size):
+    """
+    Stream an upload to a temporary file in chunks, hashing it on the way
+    
+    Args:
+        form_image: FileStorage object from form
+        size: Tuple of (width, height) the image will be processed at
+    
+    Returns:
+        Tuple of (temporary file path, hex digest of size and content)
+    
+    Raises:
+        ValueError: upload is larger than MAX_CONTENT_LENGTH (e.g. a zip member)
+    """
+    tmp_folder = os.path.join(current_app.config['UPLOAD_FOLDER'], '.tmp')
+    if not os.path.exists(tmp_folder):
+        os.makedirs(tmp_folder)
+    
+    max_size = current_app.config['MAX_CONTENT_LENGTH']
+    digest = hashlib.sha256(f"{size[0]}x{size[1]}:".encode())
+    written = 0
+    fd, tmp_path = tempfile.mkstemp(dir=tmp_folder)
+    with os.fdopen(fd, 'wb') as f:
+        if form_image.stream.seekable():
+            form_image.stream.seek(0)
+        for chunk in iter(lambda: form_image.stream.read(64 * 1024), b''):
+            written += len(chunk)
+            if max_size and written > max_size:
+                f.close()
+                os.remove(tmp_path)
+                raise ValueError(f"file is larger than {max_size // (1024 * 1024)}MB")
+            digest.update(chunk)
+            f.write(chunk)
+    
+    return tmp_path, digest.hexdigest()
+
+
+def load_image(path, size):
+    """
+    Decode an image at the smallest scale that still covers size
+    
+    JPEGs are decoded at 1/2, 1/4 or 1/8 scale with draft(), which picks the
+    smallest DCT scale still covering size, so the full resolution bitmap is
+    never allocated. Other formats can't be scaled while decoding; they are
+    box-reduced straight after load, keeping twice the target resolution for
+    the final LANCZOS resize.
+    
+    Raises:
+        Image.DecompressionBombError: image exceeds IMAGE_MAX_PIXELS
+    """
+    from PIL import Image
+    
+    image = Image.open(path)
+    width, height = image.size
+    max_pixels = current_app.config['IMAGE_MAX_PIXELS']
+    if width * height > max_pixels:
+        image.close()
+        raise Image.DecompressionBombError(
+            f"Image has {width * height} pixels, more than the {max_pixels} allowed")
+    
+    scale = min(size[0] / width, size[1] / height, 1)
+    
+    if image.format == 'JPEG':
+        image.draft('RGB', (max(1, round(width * scale)), max(1, round(height * scale))))
+        image.load()
+    else:
+        target = (max(1, round(width * scale * 2)), max(1, round(height * scale * 2)))
+        image.load()
+        factor = min(width // target[0], height // target[1])
+        if factor >= 2:
             if image.mode == 'P':
                 image = image.convert('RGBA')
-            background.paste(image, mask=image.split()[-1] if image.mode == 'RGBA' else None)
-            image = background
-        
-        # Resize maintaining aspect ratio
-        image.thumbnail(size, Image.Resampling.LANCZOS)
-        
-        # Save with optimization
-        image.save(file_path, quality=85, optimize=True)
+            image = image.reduce(factor)
+    
+    return image
+
+
+def supported_rendition_formats():
+    """Return the configured rendition formats this Pillow build can encode"""
+    from PIL import Image
+    
+    Image.init()
+    return [fmt for fmt in current_app.config['IMAGE_RENDITION_FORMATS']
+            if fmt in RENDITION_EXTENSIONS and fmt.upper() in Image.SAVE]
+
+
+def rendition_path(image_path, width, fmt):
+    """Get the upload-relative path of one rendition of an image"""
+    stem, _ = os.path.splitext(image_path)
+    return f"{stem}-{width}w.{RENDITION_EXTENSIONS[fmt]}"
+
+
+def thumbnail_path(image_path, renditions):
+    """Get the smallest JPEG rendition of an image, if any were generated"""
+    if not renditions or 'jpeg' not in renditions['formats']:
+        return None
+    return rendition_path(image_path, renditions['widths'][0], 'jpeg')
+
+
+def create_renditions(image, image_path):
+    """
+    Save downscaled copies of a decoded image for srcset/<picture> markup
+    
+    Every configured width narrower than the image is generated, plus the
+    image's own width, in each supported format (AVIF/WebP with a JPEG
+    fallback). Files are named by rendition_path() next to the original.
+    
+    Args:
+        image: RGB PIL image, already resized to its display size
+        image_path: Upload-relative path of the saved original
+    
+    Returns:
+        Dict with ascending 'widths' and preferred-first 'formats', or None
+    """
+    from PIL import Image
+    
+    formats = supported_rendition_formats()
+    if not formats:
+        return None
+    
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    
+    widths = sorted(w for w in set(current_app.config['IMAGE_RENDITION_WIDTHS']) if w < image.width)
+    widths.append(image.width)
+    
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    quality = current_app.config['IMAGE_RENDITION_QUALITY']
+    
+    for width in widths:
+        if width == image.width:
+            resized = image
+        else:
+            height = max(1, round(image.height * width / image.width))
+            resized = image.resize((width, height), Image.Resampling.LANCZOS)
         
-    except Exception as e:
-        current_app.logger.error(f"Error saving image: {str(e)}")
-        # Save original if processing fails
-        form_image.save(file_path)
+        for fmt in formats:
+            options = {'quality': quality}
+            if fmt == 'jpeg':
+                options.update(optimize=True, progressive=True)
+            elif fmt == 'webp':
+                options['method'] = 6
+            resized.save(os.path.join(upload_folder, rendition_path(image_path, width, fmt)),
+                         format=fmt.upper(), **options)
     
-    return f"{folder}/{filename}"
+    return {'widths': widths, 'formats': formats}
+
+
+def make_placeholder(image, size=20):
+    """
+    Encode a tiny blurred preview of an image as a data URI
+    
+    The result (a few hundred bytes) is stored on the record and inlined as
+    the <img> background, so cards show the image's colours before it loads.
+    """
+    from PIL import Image
+    
+    preview = image.convert('RGB')
+    preview.thumbnail((size, size), Image.Resampling.BOX)
+    buffer = io.BytesIO()
+    preview.save(buffer, format='JPEG', quality=50, optimize=True)
+    return 'data:image/jpeg;base64,' + base64.b64encode(buffer.getvalue()).decode('ascii')
+
+
+def placeholder_for_file(path, size=20):
+    """Compute make_placeholder() for an image on disk (usable without an app context)"""
+    from PIL import Image
+    
+    with Image.open(path) as image:
+        image.draft('RGB', (size, size))
+        return make_placeholder(image, size)
 
 
 def delete_image(image_path):
-    """Delete image file"""
+    """Delete image file, its manifest and any renditions generated for it"""
     if image_path:
         try:
             full_path = os.path.join(current_app.config['UPLOAD_FOLDER'], image_path)
-            if os.path.exists(full_path):
-                os.remove(full_path)
+            stem, _ = os.path.splitext(full_path)
+            for path in [full_path, stem + '.json'] + glob.glob(glob.escape(stem) + '-*w.*'):
+                if os.path.exists(path):
+                    os.remove(path)
         except Exception as e:
             current_app.logger.error(f"Error deleting image: {str(e)}")
 
 
+def image_reference_count(image_path):
+    """Count MenuItem, Event and GalleryImage rows that use an image"""
+    references = union_all(*(
+        select(model.id).where(model.image_url == image_path)
+        for model in (MenuItem, Event, GalleryImage)
+    )).subquery()
+    return db.session.execute(select(func.count()).select_from(references)).scalar()
+
+
+def release_image(image_path):
+    """
+    Delete an image once no record references it any more
+    
+    Call after committing the change that dropped the reference; uploads are
+    shared between records, so the file may still be in use elsewhere.
+    
+    An upload that store_image() handed out less than IMAGE_RELEASE_GRACE
+    seconds ago is kept even without references: the request it was handed
+    to may not have committed its record yet. `flask images prune` deletes
+    such uploads later if they stay unused.
+    
+    Returns:
+        bool: True if the image was deleted
+    """
+    if not image_path:
+        return False
+    # Counted and deleted in one go, so store_image() never hands out a file being deleted
+    with image_lock(image_path):
+        if image_reference_count(image_path) or image_recently_stored(image_path):
+            return False
+        delete_image(image_path)
+        return True
+
+
+def image_recently_stored(image_path):
+    """Whether store_image() returned the image within the last IMAGE_RELEASE_GRACE seconds"""
+    stem, _ = os.path.splitext(os.path.join(current_app.config['UPLOAD_FOLDER'], image_path))
+    try:
+        stored_at = os.path.getmtime(stem + '.json')
+    except OSError:
+        return False
+    return time.time() - stored_at < current_app.config['IMAGE_RELEASE_GRACE']
+
+
+def image_lock(image_path):
+    """
+    Lock an upload's folder against other threads and worker processes
+    
+    Uploads are spread over folders by the first two characters of their
+    hash, so the lock covers a few images at most.
+    """
+    folder_path = os.path.dirname(os.path.join(current_app.config['UPLOAD_FOLDER'], image_path))
+    return file_lock(os.path.join(folder_path, '.lock'))
+
+
 def send_email(subject, recipients, text_body=None, html_body=None):
     """
     Send email
@@ -84,6 +522,8 @@ def send_email(subject, recipients, text_body=None, html_body=None):
         text_body: Plain text body
         html_body: HTML body
     """
+    from flask_mail import Message
+    
     try:
         msg = Message(
             subject=subject,
@@ -198,6 +638,8 @@ def send_contact_notification(message):
 
 def create_slug(text):
     """Create URL-friendly slug from text"""
+    from slugify import slugify
+    
     return slugify(text)
 
 
@@ -239,3 +681,45 @@ def get_image_url(image_path):
     if not image_path:
         return url_for('static', filename='images/placeholder.jpg')
     return url_for('static', filename=f'uploads/{image_path}')
+
+
+
+def responsive_image(image_path, renditions=None, alt='', sizes='100vw', placeholder=None, **attrs):
+    """
+    Render <picture> markup with a srcset per rendition format
+    
+    Args:
+        image_path: Upload-relative image path (e.g. 'menu/abc.jpg')
+        renditions: Rendition metadata stored on the model, if any
+        alt: Alternative text
+        sizes: Value of the sizes attribute describing the display width
+        placeholder: Data URI from make_placeholder(), shown until the image loads
+        **attrs: Extra <img> attributes; use class_ for class
+    
+    Returns:
+        Markup safe to emit from a template
+    """
+    img_attrs = {'src': get_image_url(image_path), 'alt': alt, 'loading': 'lazy', 'decoding': 'async'}
+    img_attrs.update((key.rstrip('_'), value) for key, value in attrs.items())
+    if placeholder:
+        img_attrs['style'] = (img_attrs.get('style', '') +
+                              f" background: url('{placeholder}') center / cover no-repeat;").strip()
+    
+    sources = []
+    if image_path and renditions:
+        for fmt in renditions['formats']:
+            srcset = ', '.join(
+                f"{get_image_url(rendition_path(image_path, width, fmt))} {width}w"
+                for width in renditions['widths']
+            )
+            if fmt == 'jpeg':
+                img_attrs.update(srcset=srcset, sizes=sizes)
+            else:
+                sources.append(
+                    f'<source type="{RENDITION_MIME_TYPES[fmt]}" srcset="{escape(srcset)}" sizes="{escape(sizes)}">'
+                )
+    
+    img = '<img ' + ' '.join(f'{key}="{escape(value)}"' for key, value in img_attrs.items()) + '>'
+    if not sources:
+        return Markup(img)
+    return Markup('<picture class="responsive-picture">' + ''.join(sources) + img + '</picture>')
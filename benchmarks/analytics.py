@@ -0,0 +1,87 @@
+"""
+Reservation analytics over rollups versus the reservations table
+
+    python benchmarks/analytics.py [--reservations 1000000] [--repeat 20]
+
+Fills the in-memory SQLite database with reservations over two years,
+builds the rollups once (flask analytics rollup --full), then times a
+year-long report over the rollups against the same per-day aggregation run
+on the reservations table, plus the /admin/analytics.json request and the
+extra cost rollups add to booking a table.
+"""
+import argparse
+import time
+from datetime import date, time as clock, timedelta
+
+from common import create_benchmark_app, seed_reservations
+
+
+def per_call_ms(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def scan_reservations(db, start, end):
+    """Covers per day the way it had to be done without rollups"""
+    from sqlalchemy import case, func
+    from app.models import Reservation
+
+    return db.session.query(Reservation.date, func.count(),
+                            func.sum(case((Reservation.status != 'cancelled', Reservation.party_size), else_=0)))\
+        .filter(Reservation.date.between(start, end)).group_by(Reservation.date).all()
+
+
+def book(db, n):
+    from app.models import Reservation
+
+    db.session.add(Reservation(name='Guest', email='guest@example.com', phone='555-0100', party_size=4,
+                               date=date.today() + timedelta(days=n % 30), time=clock(19, 30)))
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--reservations', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    from sqlalchemy import event
+    from sqlalchemy.orm import Session
+    from app import db, analytics
+    from app.models import User
+
+    app = create_benchmark_app(WTF_CSRF_ENABLED=False)
+    end = date.today()
+    start = end - timedelta(days=364)
+    with app.app_context():
+        seed_reservations(db, args.reservations)
+        user = User(username='bench', email='bench@example.com', role='admin')
+        user.set_password('bench')
+        db.session.add(user)
+        db.session.commit()
+
+        begin = time.perf_counter()
+        days = analytics.rollup(full=True)
+        print(f'{args.reservations} reservations, full rollup of {days} days in {time.perf_counter() - begin:.1f}s\n')
+
+        print(f'{"year per day, reservations":<32}{per_call_ms(lambda: scan_reservations(db, start, end), args.repeat):>9.2f} ms')
+        print(f'{"year report, rollups":<32}{per_call_ms(lambda: analytics.report(start, end), args.repeat):>9.2f} ms')
+
+        with_rollups = per_call_ms(lambda: book(db, 0), args.repeat * 5)
+        event.remove(Session, 'before_flush', analytics._collect_deltas)
+        without = per_call_ms(lambda: book(db, 0), args.repeat * 5)
+        event.listen(Session, 'before_flush', analytics._collect_deltas)
+        print(f'{"booking, without rollups":<32}{without:>9.2f} ms')
+        print(f'{"booking, with rollups":<32}{with_rollups:>9.2f} ms')
+
+    client = app.test_client()
+    client.post('/admin/login', data={'username': 'bench', 'password': 'bench'})
+    url = f'/admin/analytics.json?start={start}&end={end}'
+    client.get(url)
+    print(f'{"/admin/analytics.json (year)":<32}{per_call_ms(lambda: client.get(url), args.repeat):>9.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
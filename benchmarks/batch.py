@@ -0,0 +1,49 @@
+"""
+App launch reads: five API requests versus one /api/batch
+
+    python benchmarks/batch.py [--rtt 150] [--repeat 50]
+
+Times the five reads the mobile app makes on launch as separate requests
+and as one batch, in process, then adds --rtt milliseconds of network
+round trip per request (about 150 ms on a cellular connection) for the
+end-to-end estimate.
+"""
+import argparse
+import time
+
+from common import create_benchmark_app
+
+LAUNCH = ['/api/menu', '/api/categories', '/api/events', '/api/reviews', '/api/stats']
+
+
+def per_call_ms(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--rtt', type=float, default=150)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    app = create_benchmark_app()
+    client = app.test_client()
+
+    def separate():
+        for path in LAUNCH:
+            assert client.get(path).status_code == 200
+
+    def batched():
+        assert client.post('/api/batch', json={'requests': LAUNCH}).status_code == 200
+
+    separate(), batched()
+    for label, fn, trips in [('5 separate requests', separate, len(LAUNCH)), ('1 batch request', batched, 1)]:
+        server = per_call_ms(fn, args.repeat)
+        print(f'{label:<24}{server:>9.2f} ms server{server + trips * args.rtt:>10.0f} ms with {args.rtt:.0f} ms RTT')
+
+
+if __name__ == '__main__':
+    main()
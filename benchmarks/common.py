@@ -0,0 +1,82 @@
+"""Shared setup for the benchmark scripts: an app over a seeded in-memory database"""
+import os
+import sys
+import random
+import tempfile
+from datetime import date, datetime, time as clock, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('SECRET_KEY', 'benchmark')
+# Keep version tokens and live events away from the real instance folder
+_instance = tempfile.mkdtemp(prefix='restaurant-bench-')
+os.environ.setdefault('CONTENT_VERSION_FOLDER', os.path.join(_instance, 'content_versions'))
+os.environ.setdefault('LIVE_EVENTS_FILE', os.path.join(_instance, 'live', 'events.jsonl'))
+
+
+def create_benchmark_app(**overrides):
+    """Create a testing app with production-like caching and a seeded database"""
+    from app import create_app, db, limiter
+
+    app = create_app('testing')
+    app.config.update(PAGE_CACHE_ENABLED=True, **overrides)
+    limiter.enabled = False
+
+    with app.app_context():
+        db.create_all()
+        seed(db)
+    return app
+
+
+def seed(db, categories=6, items_per_category=15, reviews=60, events=12):
+    """Fill the database with a realistic amount of public content"""
+    from app.models import Category, MenuItem, Review, Event
+
+    now = datetime.utcnow()
+    for c in range(categories):
+        category = Category(name=f'Category {c}', slug=f'category-{c}',
+                            description='Dishes from around the Mediterranean', display_order=c)
+        db.session.add(category)
+        db.session.flush()
+        for i in range(items_per_category):
+            db.session.add(MenuItem(
+                name=f'Dish {c}-{i}', category_id=category.id, price=9.5 + i,
+                description='Slow-cooked with olive oil, garlic, lemon and fresh herbs, '
+                            'served with warm pita and a side salad.',
+                allergens='gluten,dairy' if i % 3 == 0 else None, preparation_time=15, display_order=i,
+                is_featured=i == 0,
+            ))
+
+    for r in range(reviews):
+        db.session.add(Review(customer_name=f'Guest {r}', rating=3 + r % 3, is_approved=True,
+                              comment='Lovely food and friendly staff, we will be back soon!'))
+
+    for e in range(events):
+        db.session.add(Event(title=f'Live music night {e}', event_date=now + timedelta(days=e + 1),
+                             description='An evening of traditional music with a set menu.'))
+
+    db.session.commit()
+
+
+def seed_reservations(db, reservations):
+    """Bulk-insert reservations spread over two years, plus one contact message per hundred"""
+    from app.models import Reservation, ContactMessage
+
+    now = datetime.utcnow()
+    statuses = ['pending', 'confirmed', 'cancelled']
+    batch = []
+    for n in range(reservations):
+        day = date.today() + timedelta(days=random.randint(-700, 60))
+        booked = datetime.combine(day, clock(12)) - timedelta(days=random.choice([0, 0, 1, 2, 4, 7, 14, 45]))
+        batch.append({'name': f'Guest {n}', 'email': 'guest@example.com', 'phone': '555-0100',
+                      'date': day, 'time': clock(12 + n % 10, 0), 'party_size': 2 + n % 6,
+                      'status': statuses[n % 3], 'created_at': booked, 'updated_at': booked})
+        if len(batch) == 50000:
+            db.session.execute(Reservation.__table__.insert(), batch)
+            batch = []
+    if batch:
+        db.session.execute(Reservation.__table__.insert(), batch)
+    db.session.execute(ContactMessage.__table__.insert(), [
+        {'name': f'Guest {n}', 'email': 'guest@example.com', 'message': 'Hello', 'is_read': n % 2 == 0,
+         'created_at': now - timedelta(minutes=n)} for n in range(reservations // 100)
+    ])
+    db.session.commit()
@@ -0,0 +1,71 @@
+"""
+CPU cost versus bytes saved by response compression, per endpoint
+
+    python benchmarks/compression.py [--repeat 200]
+
+For each endpoint the uncompressed body is fetched once, then compressed
+repeatedly at the configured gzip level and brotli quality. The last
+columns time full requests with compression off, on, and on with the body
+already in the compressed-body cache (pages and JSON served by PageCache).
+"""
+import argparse
+import gzip
+import time
+
+from common import create_benchmark_app
+
+ENDPOINTS = ['/', '/menu', '/events', '/reviews', '/api/menu', '/api/categories', '/api/events']
+
+
+def per_call_ms(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    from app import compression
+    from app.compression import brotli
+
+    app = create_benchmark_app()
+    client = app.test_client()
+    gzip_level = app.config['COMPRESS_GZIP_LEVEL']
+    brotli_quality = app.config['COMPRESS_BROTLI_QUALITY']
+    encodings = ['gzip'] + (['br'] if brotli is not None else [])
+
+    print(f'gzip level {gzip_level}, brotli quality {brotli_quality if brotli else "n/a (not installed)"}, '
+          f'{args.repeat} runs each\n')
+    header = f'{"endpoint":<18}{"raw":>9}'
+    for encoding in encodings:
+        header += f'{encoding + " bytes":>12}{"saved":>8}{"ms":>8}'
+    header += f'{"req off":>10}{"req on":>9}{"cached":>9}'
+    print(header)
+
+    for endpoint in ENDPOINTS:
+        raw = client.get(endpoint, headers={'Accept-Encoding': 'identity'}).get_data()
+        row = f'{endpoint:<18}{len(raw):>9}'
+        for encoding in encodings:
+            if encoding == 'br':
+                compress = lambda: brotli.compress(raw, quality=brotli_quality)
+            else:
+                compress = lambda: gzip.compress(raw, compresslevel=gzip_level, mtime=0)
+            size = len(compress())
+            row += f'{size:>12}{1 - size / len(raw):>8.0%}{per_call_ms(compress, args.repeat):>8.3f}'
+
+        accept = {'Accept-Encoding': ', '.join(encodings)}
+        request = lambda headers: client.get(endpoint, headers=headers)
+        off = per_call_ms(lambda: request({'Accept-Encoding': 'identity'}), args.repeat)
+        # Only responses that opted in are cached; clear to time a real compression
+        on = per_call_ms(lambda: (compression.cache.clear(), request(accept)), args.repeat)
+        cached = per_call_ms(lambda: request(accept), args.repeat)
+        row += f'{off:>10.3f}{on:>9.3f}{cached:>9.3f}'
+        print(row)
+
+
+if __name__ == '__main__':
+    main()
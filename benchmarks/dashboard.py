@@ -0,0 +1,70 @@
+"""
+Admin dashboard cost at a large number of reservations
+
+    python benchmarks/dashboard.py [--reservations 1000000] [--repeat 20]
+
+Fills the in-memory SQLite database with reservations and messages, then
+times the old per-counter COUNT queries against the maintained counters,
+and a full /admin/dashboard request with its SQL statement count.
+"""
+import argparse
+import time
+
+from common import create_benchmark_app, seed_reservations
+
+
+def old_counts(db):
+    from app.models import Reservation, MenuItem, Review, ContactMessage
+
+    return (Reservation.query.count(), Reservation.query.filter_by(status='pending').count(),
+            MenuItem.query.count(), Review.query.filter_by(is_approved=False).count(),
+            ContactMessage.query.filter_by(is_read=False).count())
+
+
+def per_call_ms(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--reservations', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    from sqlalchemy import event
+    from app import db, dashboard_stats
+    from app.models import User
+
+    app = create_benchmark_app(WTF_CSRF_ENABLED=False)
+    with app.app_context():
+        start = time.perf_counter()
+        seed_reservations(db, args.reservations)
+        user = User(username='bench', email='bench@example.com', role='admin')
+        user.set_password('bench')
+        db.session.add(user)
+        db.session.commit()
+        print(f'{args.reservations} reservations inserted in {time.perf_counter() - start:.1f}s')
+
+        start = time.perf_counter()
+        dashboard_stats.rebuild()
+        print(f'counters rebuilt in {(time.perf_counter() - start) * 1000:.0f} ms (one aggregate query)\n')
+
+        print(f'{"five COUNT queries":<28}{per_call_ms(lambda: old_counts(db), args.repeat):>10.2f} ms')
+        print(f'{"maintained counters":<28}{per_call_ms(dashboard_stats.get, args.repeat):>10.2f} ms')
+
+        statements = []
+        event.listen(db.engine, 'before_cursor_execute', lambda *a: statements.append(a[2]))
+
+    client = app.test_client()
+    client.post('/admin/login', data={'username': 'bench', 'password': 'bench'})
+    client.get('/admin/dashboard')
+    statements.clear()
+    ms = per_call_ms(lambda: client.get('/admin/dashboard'), args.repeat)
+    print(f'{"/admin/dashboard request":<28}{ms:>10.2f} ms, {len(statements) // args.repeat} SQL statements')
+
+
+if __name__ == '__main__':
+    main()
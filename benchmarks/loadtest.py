@@ -0,0 +1,176 @@
+"""
+Throughput and latency of the gunicorn profile at different worker settings
+
+    python benchmarks/loadtest.py [--settings 1x1,3x1,2x4] [--duration 10] [--concurrency 16]
+
+Each setting is WORKERSxTHREADS. For every setting gunicorn is started with
+gunicorn.conf.py against a seeded SQLite database, and a keep-alive client
+pool replays a mix of public pages and API calls for --duration seconds.
+The output lists requests per second, latency percentiles, errors and the
+memory of the workers (PSS), which shows what preload_app saves.
+"""
+import argparse
+import http.client
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+from common import seed
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PATHS = ['/', '/menu', '/events', '/gallery', '/api/menu', '/api/events', '/api/categories']
+
+
+def prepare_database():
+    """Create and seed the SQLite database the gunicorn workers will use"""
+    from app import create_app, db
+
+    app = create_app('production')
+    with app.app_context():
+        db.create_all()
+        seed(db)
+
+
+def server_env(args, workers, threads, port):
+    env = dict(os.environ)
+    env.update(
+        WEB_CONCURRENCY=str(workers),
+        GUNICORN_THREADS=str(threads),
+        GUNICORN_BIND=f'127.0.0.1:{port}',
+        GUNICORN_PRELOAD=str(not args.no_preload),
+        GUNICORN_ACCESS_LOG='',
+        GUNICORN_LOG_LEVEL='warning',
+        RATELIMIT_ENABLED='False',
+        PAGE_CACHE_ENABLED=str(not args.no_page_cache),
+    )
+    return env
+
+
+def wait_until_ready(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            connection = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            connection.request('GET', '/about')
+            connection.getresponse().read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError('gunicorn did not start')
+
+
+def workers_memory(master_pid):
+    """
+    Memory of the master's children in MB
+
+    PSS (proportional set size) splits shared pages between the processes
+    sharing them, so unlike RSS it shows what copy-on-write preloading saves.
+    """
+    total = 0
+    for pid in os.listdir('/proc'):
+        if not pid.isdigit():
+            continue
+        try:
+            with open(f'/proc/{pid}/stat') as f:
+                ppid = int(f.read().rsplit(')', 1)[1].split()[1])
+            if ppid == master_pid:
+                with open(f'/proc/{pid}/smaps_rollup') as f:
+                    total += next(int(line.split()[1]) for line in f if line.startswith('Pss:'))
+        except (OSError, ValueError, IndexError, StopIteration):
+            continue
+    return total / 1024
+
+
+def run_load(port, duration, concurrency):
+    """Closed-loop load: each client sends its next request when the previous one finishes"""
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def client(offset):
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+        own, failed, i = [], 0, offset
+        while time.monotonic() < deadline:
+            path = PATHS[i % len(PATHS)]
+            i += 1
+            start = time.perf_counter()
+            for attempt in range(2):
+                try:
+                    connection.request('GET', path, headers={'Accept-Encoding': 'gzip'})
+                    response = connection.getresponse()
+                    response.read()
+                    break
+                except (OSError, http.client.HTTPException):
+                    # A recycled worker closes its keep-alive connections; reconnect once like a browser
+                    connection.close()
+                    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+            else:
+                failed += 1
+                continue
+            if response.status != 200:
+                failed += 1
+            own.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(own)
+            errors[0] += failed
+
+    clients = [threading.Thread(target=client, args=(n,)) for n in range(concurrency)]
+    for thread in clients:
+        thread.start()
+    for thread in clients:
+        thread.join()
+    return latencies, errors[0]
+
+
+def percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--settings', default='1x1,3x1,2x4', help='Comma-separated WORKERSxTHREADS')
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--no-preload', action='store_true')
+    parser.add_argument('--no-page-cache', action='store_true')
+    args = parser.parse_args()
+
+    instance = tempfile.mkdtemp(prefix='restaurant-load-')
+    os.environ.setdefault('SECRET_KEY', 'benchmark')
+    os.environ['FLASK_ENV'] = 'production'
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(instance, 'load.db')
+    os.environ['CONTENT_VERSION_FOLDER'] = os.path.join(instance, 'content_versions')
+    prepare_database()
+
+    print(f'{args.concurrency} clients, {args.duration:g}s per setting, '
+          f'preload {"off" if args.no_preload else "on"}, page cache {"off" if args.no_page_cache else "on"}\n')
+    print(f'{"setting":<10}{"req/s":>9}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}{"errors":>8}{"PSS MB":>9}')
+
+    for setting in args.settings.split(','):
+        workers, threads = (int(n) for n in setting.lower().split('x'))
+        server = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '-c', 'gunicorn.conf.py', 'run:app'],
+            cwd=ROOT, env=server_env(args, workers, threads, args.port),
+        )
+        try:
+            wait_until_ready(args.port)
+            run_load(args.port, 1, args.concurrency)  # warm caches and connections
+            latencies, errors = run_load(args.port, args.duration, args.concurrency)
+            memory = workers_memory(server.pid)
+        finally:
+            server.terminate()
+            server.wait()
+
+        latencies.sort()
+        print(f'{setting:<10}{len(latencies) / args.duration:>9.0f}{statistics.median(latencies) * 1000:>9.1f}'
+              f'{percentile(latencies, 0.95):>9.1f}{percentile(latencies, 0.99):>9.1f}{errors:>8}{memory:>9.0f}')
+
+
+if __name__ == '__main__':
+    main()
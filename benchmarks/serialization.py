@@ -0,0 +1,95 @@
+"""
+JSON encoding of a large menu: Flask's stdlib provider versus FastJSONProvider
+
+    python benchmarks/serialization.py [--items 10000] [--events 2000] [--repeat 20]
+
+Builds a synthetic menu of unsaved MenuItem and Event objects and times
+turning it into a response body with Flask's default provider (with
+to_dict() calling isoformat() per date, as before), FastJSONProvider on the
+stdlib fallback and FastJSONProvider with orjson, plus MessagePack when
+installed.
+"""
+import argparse
+import time
+from datetime import datetime, timedelta
+
+from flask.json.provider import DefaultJSONProvider
+
+from common import create_benchmark_app
+
+
+def per_call_ms(fn, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def synthetic_menu(items, events):
+    from app.models import Category, MenuItem, Event
+
+    categories = [Category(name=f'Category {c}', slug=f'category-{c}') for c in range(20)]
+    now = datetime.utcnow()
+    return (
+        [MenuItem(id=n, name=f'Dish {n}', category=categories[n % 20], price=9.5 + n % 20,
+                  description='Slow-cooked with olive oil, garlic, lemon and fresh herbs, served with warm pita.',
+                  allergens='gluten,dairy' if n % 3 == 0 else None, is_available=True, is_featured=n % 10 == 0)
+         for n in range(items)],
+        [Event(id=n, title=f'Live music night {n}', description='An evening of traditional music.',
+               event_date=now + timedelta(hours=n), is_active=True) for n in range(events)],
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--items', type=int, default=10000)
+    parser.add_argument('--events', type=int, default=2000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    import app.serialization as serialization
+    from app.serialization import FastJSONProvider
+
+    app = create_benchmark_app()
+    items, events = synthetic_menu(args.items, args.events)
+
+    def payload(isoformat):
+        event_dicts = [event.to_dict() for event in events]
+        if isoformat:
+            # What to_dict() did before the provider encoded dates itself
+            for event in event_dicts:
+                event['event_date'] = event['event_date'].isoformat()
+        return {'success': True, 'items': [item.to_dict() for item in items], 'events': event_dicts}
+
+    orjson = serialization.orjson
+    stdlib = DefaultJSONProvider(app)
+    fast = FastJSONProvider(app)
+    cases = [('before: stdlib provider', lambda: stdlib.response(payload(True)), None),
+             ('FastJSON, stdlib fallback', lambda: fast.response(payload(False)), None)]
+    if orjson is not None:
+        cases.append(('FastJSON, orjson', lambda: fast.response(payload(False)), orjson))
+
+    print(f'{args.items} menu items, {args.events} events\n')
+    print(f'{"":<28}{"total ms":>10}{"encode ms":>11}{"bytes":>10}')
+    with app.test_request_context('/api/menu', headers={'Accept': 'application/msgpack'}):
+        for label, build, encoder in cases:
+            serialization.orjson = encoder
+            total = per_call_ms(build, args.repeat)
+            ready = payload(label.startswith('before'))
+            provider = stdlib if label.startswith('before') else fast
+            encode = per_call_ms(lambda: provider.response(ready), args.repeat)
+            print(f'{label:<28}{total:>10.2f}{encode:>11.2f}{len(build().get_data()):>10}')
+        serialization.orjson = orjson
+
+        if serialization.msgpack is not None:
+            # Clients asking for MessagePack get the objects packed by api_response(), without JSON
+            app.json = fast
+            ready = payload(False)
+            total = per_call_ms(lambda: serialization.api_response(payload(False)), args.repeat)
+            encode = per_call_ms(lambda: serialization.api_response(ready), args.repeat)
+            size = len(serialization.api_response(ready).get_data())
+            print(f'{"MessagePack":<28}{total:>10.2f}{encode:>11.2f}{size:>10}')
+
+
+if __name__ == '__main__':
+    main()
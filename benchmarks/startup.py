@@ -0,0 +1,87 @@
+"""
+Import and app factory time of a fresh worker
+
+    python benchmarks/startup.py [--runs 10] [--top 15] [--max-ms 600]
+
+Each run starts a new interpreter, like a gunicorn worker after a recycle,
+and times `import app` and `create_app()` separately. The slowest imports
+of one extra run under `python -X importtime` are listed so the cause of a
+regression is visible. With --max-ms the script exits non-zero when the
+median total exceeds the budget, so it can gate CI.
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import json, time
+start = time.perf_counter()
+import app
+imported = time.perf_counter()
+app.create_app({config!r})
+created = time.perf_counter()
+print(json.dumps({{'import': imported - start, 'factory': created - imported}}))
+"""
+
+
+def probe_env():
+    env = dict(os.environ)
+    env.setdefault('SECRET_KEY', 'benchmark')
+    env.setdefault('DATABASE_URL', 'sqlite:///' + os.path.join(tempfile.gettempdir(), 'restaurant-bench.db'))
+    # gunicorn does not go through the flask CLI
+    env.pop('FLASK_RUN_FROM_CLI', None)
+    return env
+
+
+def run_probe(config, extra_args=()):
+    return subprocess.run([sys.executable, *extra_args, '-c', PROBE.format(config=config)],
+                          cwd=ROOT, env=probe_env(), capture_output=True, text=True, check=True)
+
+
+def slowest_imports(config, top):
+    """Top-level-ish modules by cumulative import time, from -X importtime"""
+    stderr = run_probe(config, ('-X', 'importtime')).stderr
+    rows = []
+    for line in stderr.splitlines():
+        match = re.match(r'import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)', line)
+        if match and len(match.group(3)) <= 3:  # the module imported directly plus one level
+            rows.append((int(match.group(2)), match.group(4)))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--config', default='production')
+    parser.add_argument('--max-ms', type=float, help='Fail if the median total exceeds this')
+    args = parser.parse_args()
+
+    samples = [json.loads(run_probe(args.config).stdout.strip().splitlines()[-1]) for _ in range(args.runs)]
+    imports = [s['import'] * 1000 for s in samples]
+    factories = [s['factory'] * 1000 for s in samples]
+    totals = [i + f for i, f in zip(imports, factories)]
+
+    print(f'{args.runs} fresh interpreters, config {args.config!r}\n')
+    print(f'{"":<12}{"median ms":>10}{"min ms":>10}{"max ms":>10}')
+    for label, values in (('import app', imports), ('create_app', factories), ('total', totals)):
+        print(f'{label:<12}{statistics.median(values):>10.1f}{min(values):>10.1f}{max(values):>10.1f}')
+
+    print(f'\nSlowest imports (cumulative):')
+    for micros, module in slowest_imports(args.config, args.top):
+        print(f'{micros / 1000:>8.1f} ms  {module}')
+
+    if args.max_ms is not None and statistics.median(totals) > args.max_ms:
+        print(f'\n❌ Median startup {statistics.median(totals):.1f} ms exceeds {args.max_ms:.1f} ms')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
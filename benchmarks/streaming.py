@@ -0,0 +1,74 @@
+"""
+Streamed versus buffered /api/menu for a large menu
+
+    python benchmarks/streaming.py [--items 20000] [--repeat 3]
+
+Adds --items menu items, then requests /api/menu with the page cache off,
+once encoded in one go (API_STREAM_MIN_ROWS above the item count) and once
+streamed, and reports time to first byte, total time and peak Python
+memory (tracemalloc) while producing the body. Both bodies must be equal.
+"""
+import argparse
+import time
+import tracemalloc
+from datetime import datetime
+
+from common import create_benchmark_app
+
+
+def measure(client, path):
+    """(first byte ms, total ms, peak MB, body) of one request, consuming the body as a server would"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    response = client.get(path, buffered=False)
+    chunks = iter(response.response)
+    body = [next(chunks)]
+    first = time.perf_counter() - start
+    size = len(body[0])
+    for chunk in chunks:
+        size += len(chunk)
+        body.append(chunk)
+    total = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    response.close()
+    return first * 1000, total * 1000, peak / 1024 / 1024, b''.join(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--items', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    from app import db
+    from app.models import MenuItem
+
+    app = create_benchmark_app()
+    app.config['PAGE_CACHE_ENABLED'] = False
+    now = datetime.utcnow()
+    with app.app_context():
+        db.session.execute(MenuItem.__table__.insert(), [{
+            'name': f'Dish {n}', 'category_id': 1 + n % 6, 'price': 9.5 + n % 20, 'display_order': n % 15,
+            'description': 'Slow-cooked with olive oil, garlic, lemon and fresh herbs, served with warm pita.',
+            'allergens': 'gluten,dairy' if n % 3 == 0 else None, 'is_available': True, 'is_featured': False,
+            'created_at': now, 'updated_at': now,
+        } for n in range(args.items)])
+        db.session.commit()
+
+    client = app.test_client()
+    bodies = {}
+    print(f'{args.items} extra menu items\n')
+    print(f'{"":<12}{"first byte ms":>15}{"total ms":>10}{"peak MB":>10}{"bytes":>10}')
+    for label, min_rows in [('buffered', args.items * 10), ('streamed', app.config['API_STREAM_MIN_ROWS'])]:
+        app.config['API_STREAM_MIN_ROWS'] = min_rows
+        runs = [measure(client, '/api/menu') for _ in range(args.repeat)]
+        first, total, peak, body = min(runs, key=lambda run: run[1])
+        bodies[label] = body
+        print(f'{label:<12}{first:>15.1f}{total:>10.1f}{peak:>10.1f}{len(body):>10}')
+
+    print('\nidentical bodies' if bodies['buffered'] == bodies['streamed'] else '\nBODIES DIFFER')
+
+
+if __name__ == '__main__':
+    main()
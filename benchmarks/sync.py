@@ -0,0 +1,60 @@
+"""
+Delta sync versus re-downloading the menu catalog
+
+    python benchmarks/sync.py [--edits 3]
+
+Syncs once from scratch (/api/menu/changes without a token), then makes a
+typical admin change (a price edit, an item marked unavailable and a
+deleted item per round) and compares the bytes and time of the follow-up
+delta sync with fetching /api/menu again, with and without gzip.
+"""
+import argparse
+import time
+
+from common import create_benchmark_app
+
+
+def fetch(client, url, gzip=False):
+    headers = {'Accept-Encoding': 'gzip'} if gzip else {}
+    start = time.perf_counter()
+    response = client.get(url, headers=headers)
+    return response, (time.perf_counter() - start) * 1000
+
+
+def edit(db, round_):
+    from app.models import MenuItem
+
+    items = MenuItem.query.filter_by(is_available=True).order_by(MenuItem.id).offset(round_).limit(3).all()
+    items[0].price += 1
+    items[1].is_available = False
+    db.session.delete(items[2])
+    db.session.commit()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--edits', type=int, default=3)
+    args = parser.parse_args()
+
+    from app import db
+    from app.models import MenuItem
+
+    app = create_benchmark_app()
+    with app.app_context():
+        print(f'{MenuItem.query.count()} menu items\n')
+
+    client = app.test_client()
+    token = client.get('/api/menu/changes').json['token']
+    print(f'{"":<28}{"bytes":>9}{"gzip":>9}{"ms":>9}')
+    for round_ in range(args.edits):
+        with app.app_context():
+            edit(db, round_)
+        for label, url in [('full /api/menu', '/api/menu'), ('delta /api/menu/changes', f'/api/menu/changes?since={token}')]:
+            response, ms = fetch(client, url)
+            compressed, _ = fetch(client, url, gzip=True)
+            print(f'{label:<28}{len(response.data):>9}{len(compressed.data):>9}{ms:>9.2f}')
+        token = response.json['token']
+
+
+if __name__ == '__main__':
+    main()
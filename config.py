@@ -49,12 +49,102 @@ class Config:
     MAX_CONTENT_LENGTH = int(os.environ.get('MAX_CONTENT_LENGTH', 16 * 1024 * 1024))  # 16MB
     UPLOAD_FOLDER = os.path.join(basedir, os.environ.get('UPLOAD_FOLDER', 'app/static/uploads'))
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
+    IMAGE_MAX_PIXELS = int(os.environ.get('IMAGE_MAX_PIXELS', 50 * 1000 * 1000))  # reject larger images undecoded
+    # Seconds release_image() keeps an unreferenced upload after handing it out, for the request to commit
+    IMAGE_RELEASE_GRACE = int(os.environ.get('IMAGE_RELEASE_GRACE', 600))
+    BULK_UPLOAD_MAX_LENGTH = int(os.environ.get('BULK_UPLOAD_MAX_LENGTH', 1024 * 1024 * 1024))  # 1GB per bulk request
+    BULK_UPLOAD_WORKERS = int(os.environ.get('BULK_UPLOAD_WORKERS', 0)) or None  # None: one per CPU
+    # Photos resized per request and committed together; ~2s each on one CPU, well within GUNICORN_TIMEOUT
+    BULK_UPLOAD_CHUNK = int(os.environ.get('BULK_UPLOAD_CHUNK', 4))
+    
+    # Responsive image renditions (widths in px, formats in preference order)
+    IMAGE_RENDITION_WIDTHS = [int(w) for w in os.environ.get('IMAGE_RENDITION_WIDTHS', '320,640,960,1200').split(',')]
+    IMAGE_RENDITION_FORMATS = os.environ.get('IMAGE_RENDITION_FORMATS', 'avif,webp,jpeg').split(',')
+    IMAGE_RENDITION_QUALITY = int(os.environ.get('IMAGE_RENDITION_QUALITY', 80))
+    IMAGE_PLACEHOLDER_SIZE = int(os.environ.get('IMAGE_PLACEHOLDER_SIZE', 20))  # px, longest side of inline LQIP
+    
+    # On-demand resizing (/img/<width>x<height>/<path>)
+    IMAGE_RESIZE_SIZES = set(os.environ.get('IMAGE_RESIZE_SIZES', '150x150,300x200,600x400,1200x800').split(','))
+    IMAGE_CACHE_FOLDER = os.path.join(basedir, os.environ.get('IMAGE_CACHE_FOLDER', 'instance/image_cache'))
+    IMAGE_CACHE_MAX_BYTES = int(os.environ.get('IMAGE_CACHE_MAX_BYTES', 256 * 1024 * 1024))  # 256MB
+    IMAGE_CACHE_MAX_AGE = int(os.environ.get('IMAGE_CACHE_MAX_AGE', 365 * 24 * 3600))  # 1 year
+    
+    # Serving uploads and resized images: 'sendfile' (zero-copy through the WSGI
+    # server), 'x-accel' (nginx X-Accel-Redirect) or 'x-sendfile' (Apache/lighttpd)
+    UPLOAD_SERVING = os.environ.get('UPLOAD_SERVING', 'sendfile')
+    UPLOAD_ACCEL_LOCATION = os.environ.get('UPLOAD_ACCEL_LOCATION', '/_internal/uploads/')
+    IMAGE_CACHE_ACCEL_LOCATION = os.environ.get('IMAGE_CACHE_ACCEL_LOCATION', '/_internal/image_cache/')
+    UPLOAD_MAX_AGE = int(os.environ.get('UPLOAD_MAX_AGE', 365 * 24 * 3600))  # 1 year
+    
+    # Caching
+    CONTENT_VERSION_FOLDER = os.path.join(basedir, os.environ.get('CONTENT_VERSION_FOLDER', 'instance/content_versions'))
+    PAGE_CACHE_ENABLED = os.environ.get('PAGE_CACHE_ENABLED', 'True') == 'True'
+    PAGE_CACHE_MAX_ENTRIES = int(os.environ.get('PAGE_CACHE_MAX_ENTRIES', 512))
+    PAGE_CACHE_TTL = int(os.environ.get('PAGE_CACHE_TTL', 300))  # seconds; bounds staleness of date-based listings
+    FRAGMENT_CACHE_ENABLED = os.environ.get('FRAGMENT_CACHE_ENABLED', 'True') == 'True'
+    FRAGMENT_CACHE_MAX_ENTRIES = int(os.environ.get('FRAGMENT_CACHE_MAX_ENTRIES', 1024))
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 30))  # seconds; bounds how long a deactivated login lingers
+    USER_CACHE_MAX_ENTRIES = int(os.environ.get('USER_CACHE_MAX_ENTRIES', 256))
+    
+    # Templates: compiled bytecode shared by all workers, optional warm-up at start
+    TEMPLATE_CACHE_FOLDER = os.path.join(basedir, os.environ.get('TEMPLATE_CACHE_FOLDER', 'instance/jinja_cache'))
+    WARMUP_ON_START = os.environ.get('WARMUP_ON_START', 'False') == 'True'
+    WARMUP_PAGES = ['main.index', 'main.menu', 'main.events', 'main.gallery', 'main.about']
+    
+    # Static export of public pages (flask export pages)
+    STATIC_EXPORT_FOLDER = os.path.join(basedir, os.environ.get('STATIC_EXPORT_FOLDER', 'instance/export'))
+    STATIC_EXPORT_PAGES = ['main.index', 'main.menu', 'main.events', 'main.gallery', 'main.about']
+    STATIC_EXPORT_MAX_AGE = int(os.environ.get('STATIC_EXPORT_MAX_AGE', 3600))  # re-render date-based listings hourly
+    STATIC_EXPORT_ON_CHANGE = os.environ.get('STATIC_EXPORT_ON_CHANGE', 'False') == 'True'  # re-export after commits
+    
+    # Reservation analytics (flask analytics rollup)
+    ANALYTICS_SLOT_MINUTES = int(os.environ.get('ANALYTICS_SLOT_MINUTES', 30))  # run a full rollup after changing
+    
+    # Live admin updates (server-sent events at /admin/stream)
+    LIVE_EVENTS_FILE = os.path.join(basedir, os.environ.get('LIVE_EVENTS_FILE', 'instance/live/events.jsonl'))
+    LIVE_EVENTS_POLL = float(os.environ.get('LIVE_EVENTS_POLL', 0.5))  # seconds between checks, per worker
+    LIVE_EVENTS_MAX_BYTES = int(os.environ.get('LIVE_EVENTS_MAX_BYTES', 1024 * 1024))
+    LIVE_MAX_STREAMS = int(os.environ.get('LIVE_MAX_STREAMS', 4))  # per worker; keep below GUNICORN_THREADS
+    LIVE_STREAM_DURATION = int(os.environ.get('LIVE_STREAM_DURATION', 300))  # seconds before the browser reconnects
+    LIVE_RETRY_MS = int(os.environ.get('LIVE_RETRY_MS', 5000))
+    
+    # Live menu availability (polled by open menu pages at /api/menu/availability)
+    MENU_AVAILABILITY_POLL = int(os.environ.get('MENU_AVAILABILITY_POLL', 20))  # seconds between polls, per page
+    MENU_AVAILABILITY_MAX_AGE = int(os.environ.get('MENU_AVAILABILITY_MAX_AGE', 10))  # seconds proxies and workers reuse a snapshot
+    
+    # Batched API reads (POST /api/batch)
+    API_BATCH_MAX_REQUESTS = int(os.environ.get('API_BATCH_MAX_REQUESTS', 10))
+    
+    # Delta sync (/api/menu/changes, /api/events/changes): deletions are remembered this long;
+    # clients whose sync token is older get the full catalog again
+    SYNC_TOMBSTONE_RETENTION_DAYS = int(os.environ.get('SYNC_TOMBSTONE_RETENTION_DAYS', 90))
+    
+    # Streamed API lists (/api/menu, /api/events)
+    API_STREAM_MIN_ROWS = int(os.environ.get('API_STREAM_MIN_ROWS', 500))  # longer lists are streamed, not cached
+    API_STREAM_YIELD_PER = int(os.environ.get('API_STREAM_YIELD_PER', 200))  # rows fetched and sent per chunk
+    
+    # Response compression (gzip, plus brotli when installed)
+    COMPRESS_ENABLED = os.environ.get('COMPRESS_ENABLED', 'True') == 'True'
+    COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 500))  # bytes; smaller bodies gain nothing
+    COMPRESS_GZIP_LEVEL = int(os.environ.get('COMPRESS_GZIP_LEVEL', 6))
+    COMPRESS_BROTLI_QUALITY = int(os.environ.get('COMPRESS_BROTLI_QUALITY', 5))
+    COMPRESS_CACHE_MAX_ENTRIES = int(os.environ.get('COMPRESS_CACHE_MAX_ENTRIES', 1024))
+    
+    # Static assets (fingerprinted URLs, precompressed variants)
+    ASSET_FINGERPRINTING = os.environ.get('ASSET_FINGERPRINTING', 'True') == 'True'
+    ASSET_CACHE_FOLDER = os.path.join(basedir, os.environ.get('ASSET_CACHE_FOLDER', 'instance/assets'))
+    ASSET_EXCLUDE = ['uploads']
+    ASSET_MAX_AGE = int(os.environ.get('ASSET_MAX_AGE', 365 * 24 * 3600))  # 1 year
     
     # Pagination
     ITEMS_PER_PAGE = int(os.environ.get('ITEMS_PER_PAGE', 12))
     
     # Rate Limiting
-    RATELIMIT_STORAGE_URL = os.environ.get('RATELIMIT_STORAGE_URL', 'memory://')
+    RATELIMIT_ENABLED = os.environ.get('RATELIMIT_ENABLED', 'True') == 'True'
+    # Shared by all workers: redis://host:6379 across hosts, or a SQLite file on a single host
+    RATELIMIT_STORAGE_URL = os.environ.get('RATELIMIT_STORAGE_URL') or \
+        'sqlite:///' + os.path.join(basedir, 'instance', 'ratelimit.db')
+    RATELIMIT_STRATEGY = os.environ.get('RATELIMIT_STRATEGY', 'sliding-window-counter')
     RATELIMIT_DEFAULT = os.environ.get('RATELIMIT_DEFAULT', '200 per day;50 per hour')
 
 
@@ -62,6 +152,8 @@ class DevelopmentConfig(Config):
     """Development configuration"""
     DEBUG = True
     SQLALCHEMY_ECHO = False
+    # Static files change while developing; hashes are only computed at startup
+    ASSET_FINGERPRINTING = False
 
 
 class ProductionConfig(Config):
@@ -82,6 +174,9 @@ class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
     WTF_CSRF_ENABLED = False
+    PAGE_CACHE_ENABLED = False
+    FRAGMENT_CACHE_ENABLED = False
+    RATELIMIT_STORAGE_URL = 'memory://'
 
 
 # Configuration dictionary
@@ -0,0 +1,78 @@
+"""
+Gunicorn settings for production (`gunicorn -c gunicorn.conf.py run:app`)
+
+Every choice can be overridden with an environment variable:
+
+    GUNICORN_BIND            address to listen on (default 0.0.0.0:$PORT or :8000)
+    WEB_CONCURRENCY          worker processes (default 2 x CPUs + 1, capped by
+                             GUNICORN_MAX_WORKERS, default 8)
+    GUNICORN_THREADS         threads per worker; more than 1 switches to gthread
+                             (needed to hold /admin/stream connections open)
+    GUNICORN_PRELOAD         load the app in the master so workers share memory
+                             copy-on-write (default True)
+    GUNICORN_TIMEOUT         seconds before a silent worker is killed
+    GUNICORN_KEEPALIVE       seconds to keep idle client connections open
+    GUNICORN_MAX_REQUESTS    recycle a worker after this many requests (0 disables)
+    GUNICORN_MAX_RSS_GROWTH  recycle a worker whose resident memory grew by more
+                             than this many MB since it started (0 disables)
+    GUNICORN_LOG_LEVEL, GUNICORN_ACCESS_LOG
+"""
+import os
+import multiprocessing
+
+# Server socket
+bind = os.environ.get('GUNICORN_BIND', f"0.0.0.0:{os.environ.get('PORT', 8000)}")
+
+# Workers
+_max_workers = int(os.environ.get('GUNICORN_MAX_WORKERS', 8))
+workers = int(os.environ.get('WEB_CONCURRENCY', 0)) or min(multiprocessing.cpu_count() * 2 + 1, _max_workers)
+threads = int(os.environ.get('GUNICORN_THREADS', 1))
+worker_class = 'gthread' if threads > 1 else 'sync'
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'True') == 'True'
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+if os.path.isdir('/dev/shm'):
+    # Heartbeat files on tmpfs: a slow disk can't stall workers into timeouts
+    worker_tmp_dir = '/dev/shm'
+
+# Recycling: by request count (jittered so workers don't restart together) and memory growth
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 1000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', max_requests // 10))
+max_rss_growth = int(os.environ.get('GUNICORN_MAX_RSS_GROWTH', 200)) * 1024 * 1024
+
+# Logging
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
+accesslog = os.environ.get('GUNICORN_ACCESS_LOG', '-') or None
+errorlog = '-'
+
+
+def _rss():
+    """Resident set size of this process in bytes (0 where /proc is unavailable)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def post_fork(server, worker):
+    worker.baseline_rss = _rss()
+
+    if preload_app:
+        # Connections opened in the master (e.g. by warm-up) must not be shared with children
+        from app import db
+        with worker.app.wsgi().app_context():
+            db.engine.dispose(close=False)
+
+
+def post_worker_init(worker):
+    # Open event streams (/admin/stream) would hold a stopping worker until graceful_timeout
+    from app import live_events
+    live_events.stop_when(lambda: not worker.alive)
+
+
+def post_request(worker, req, environ, resp):
+    if max_rss_growth and _rss() - worker.baseline_rss > max_rss_growth:
+        worker.log.info(f'Worker {worker.pid} grew by more than {max_rss_growth // (1024 * 1024)}MB, recycling')
+        worker.alive = False
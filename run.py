@@ -1,3 +1,4 @@
+import os
 from app import create_app, db
 from app.models import User, Reservation, MenuItem, Category, GalleryImage, Review, Event, ContactMessage
 
@@ -20,5 +21,11 @@ def make_shell_context():
     }
 
 
+# Compile templates and prime caches before the worker (or preloading master) serves
+if app.config['WARMUP_ON_START'] and os.environ.get('FLASK_RUN_FROM_CLI') != 'true':
+    from app.warmup import warm_up
+    warm_up(app)
+
+
 if __name__ == '__main__':
     app.run(debug=True)
@@ -0,0 +1,53 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('SECRET_KEY', 'test')
+# Uploads, caches and version tokens go to a scratch folder instead of the real instance folder
+_instance = tempfile.mkdtemp(prefix='restaurant-test-')
+for _name, _path in [('UPLOAD_FOLDER', 'uploads'), ('IMAGE_CACHE_FOLDER', 'image_cache'),
+                     ('CONTENT_VERSION_FOLDER', 'content_versions'), ('TEMPLATE_CACHE_FOLDER', 'jinja_cache'),
+                     ('STATIC_EXPORT_FOLDER', 'export'), ('ASSET_CACHE_FOLDER', 'assets'),
+                     ('LIVE_EVENTS_FILE', 'live/events.jsonl')]:
+    os.environ.setdefault(_name, os.path.join(_instance, _path))
+
+
+@pytest.fixture
+def app():
+    from app import create_app, db
+
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def admin(app):
+    from app import db
+    from app.models import User
+
+    user = User(username='admin', email='admin@example.com', role='admin')
+    user.set_password('admin')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+@pytest.fixture
+def admin_client(admin, client):
+    """Test client signed in as an admin"""
+    with client.session_transaction() as session:
+        session['_user_id'] = str(admin.id)
+        session['_fresh'] = True
+    return client
@@ -0,0 +1,107 @@
+from app import db
+from app.models import Category, MenuItem
+
+
+def test_batch_charges_each_endpoint_limit(app):
+    client = app.test_client()
+    client.environ_base['REMOTE_ADDR'] = '203.0.113.7'
+
+    # /api/stats allows 30 per minute
+    statuses = []
+    for _ in range(4):
+        response = client.post('/api/batch', json={'requests': ['/api/stats'] * 10})
+        assert response.status_code == 200
+        statuses.extend(item['status'] for item in response.json['responses'])
+
+    assert statuses == [200] * 30 + [429] * 10
+    # Batched and direct requests from the same client share the endpoint's counter
+    assert client.get('/api/stats').status_code == 429
+    assert client.get('/api/categories').status_code == 200
+    assert app.test_client().get('/api/stats').status_code == 200
+
+
+def test_long_lists_are_streamed(app, client):
+    category = Category(name='Mains', slug='mains')
+    db.session.add_all([MenuItem(name=f'Dish {n}', price=10, category=category, display_order=n) for n in range(6)])
+    db.session.commit()
+    buffered = client.get('/api/menu')
+
+    # Streamed responses have no Content-Length
+    app.config['API_STREAM_MIN_ROWS'] = 6
+    assert 'Content-Length' in client.get('/api/menu').headers
+
+    app.config.update(API_STREAM_MIN_ROWS=5, API_STREAM_YIELD_PER=2)
+    streamed = client.get('/api/menu')
+    assert 'Content-Length' not in streamed.headers
+    assert streamed.data == buffered.data
+    assert streamed.json['count'] == 6
+
+
+def test_availability_snapshot_expires(app, client):
+    from sqlalchemy import text
+    from app.routes.api import _availability_snapshots
+
+    _availability_snapshots.clear()
+    db.session.add(MenuItem(name='Moussaka', price=14.5, category=Category(name='Mains', slug='mains')))
+    db.session.commit()
+    assert client.get('/api/menu/availability').json['unavailable'] == []
+
+    # Sold out on another host: this worker's menu content version doesn't change
+    db.session.execute(text('UPDATE menu_items SET is_available = 0'))
+    db.session.commit()
+    assert client.get('/api/menu/availability').json['unavailable'] == []
+
+    app.config['MENU_AVAILABILITY_MAX_AGE'] = 0
+    assert client.get('/api/menu/availability').json['unavailable'] == [1]
+
+
+def test_msgpack_is_packed_without_json(app, client, monkeypatch):
+    import msgpack
+
+    db.session.add(MenuItem(name='Moussaka', price=14.5, category=Category(name='Mains', slug='mains')))
+    db.session.commit()
+    app.config['PAGE_CACHE_ENABLED'] = True
+    as_json = client.get('/api/menu')
+
+    # Negotiated up front: the JSON encoder never runs for MessagePack clients
+    monkeypatch.setattr(app.json, 'response', None)
+    packed = client.get('/api/menu', headers={'Accept': 'application/msgpack'})
+    assert packed.mimetype == 'application/msgpack'
+    assert msgpack.unpackb(packed.data) == as_json.json
+    assert 'Accept' in packed.vary
+    monkeypatch.undo()
+
+    # The page cache keeps the two formats apart
+    assert client.get('/api/menu').headers['X-Cache'] == 'HIT'
+    assert client.get('/api/menu').json == as_json.json
+    assert client.get('/api/menu', headers={'Accept': 'application/msgpack'}).data == packed.data
+
+
+def test_tokens_older_than_pruned_tombstones_reset(app, client):
+    from datetime import datetime, timedelta
+    from app.models import Tombstone
+
+    category = Category(name='Mains', slug='mains')
+    items = [MenuItem(name=f'Dish {n}', price=10, category=category) for n in range(3)]
+    db.session.add_all(items)
+    db.session.commit()
+    ids = [item.id for item in items]
+    first_token = client.get('/api/menu/changes').json['token']
+
+    db.session.delete(items[0])
+    db.session.commit()
+    second_token = client.get(f'/api/menu/changes?since={first_token}').json['token']
+
+    # The first deletion passes the retention window; the next one prunes its tombstone
+    expired = datetime.utcnow() - timedelta(days=app.config['SYNC_TOMBSTONE_RETENTION_DAYS'] + 1)
+    Tombstone.query.update({'deleted_at': expired})
+    db.session.delete(items[1])
+    db.session.commit()
+    assert [t.record_id for t in Tombstone.query.all()] == [ids[1]]
+
+    # A client that never saw the first deletion must start over
+    stale = client.get(f'/api/menu/changes?since={first_token}').json
+    assert stale['reset'] and [item['id'] for item in stale['items']] == [ids[2]]
+
+    recent = client.get(f'/api/menu/changes?since={second_token}').json
+    assert not recent['reset'] and recent['removed'] == [ids[1]]
@@ -0,0 +1,18 @@
+import os
+
+from flask import url_for
+
+
+def test_fingerprinted_assets_are_written_to_disk(app, client):
+    with app.test_request_context():
+        url = url_for('static', filename='css/style.css')
+    hashed = url[len('/static/'):]
+    assert hashed != 'css/style.css'
+
+    # What a web server serves for the fingerprinted URL without asking the app
+    with open(os.path.join(app.config['ASSET_CACHE_FOLDER'], hashed), 'rb') as f:
+        on_disk = f.read()
+    with open(os.path.join(app.static_folder, 'css', 'style.css'), 'rb') as f:
+        assert on_disk == f.read()
+    assert os.path.exists(os.path.join(app.config['ASSET_CACHE_FOLDER'], hashed + '.gz'))
+    assert client.get(url).data == on_disk
@@ -0,0 +1,61 @@
+import pytest
+
+from app import db, page_cache
+from app.models import Category
+
+
+@pytest.fixture
+def cached_app(app):
+    app.config['PAGE_CACHE_ENABLED'] = True
+    # The page cache is shared by every app in this process
+    page_cache.clear()
+    db.session.add(Category(name='Mains', slug='mains'))
+    db.session.commit()
+    return app
+
+
+def test_page_cache_serves_anonymous_visitors(cached_app):
+    client = cached_app.test_client()
+    assert client.get('/api/categories').headers['X-Cache'] == 'MISS'
+    assert client.get('/api/categories').headers['X-Cache'] == 'HIT'
+
+
+def test_page_cache_bypassed_for_logged_in_users(cached_app, admin_client):
+    cached_app.test_client().get('/api/categories')
+
+    assert 'X-Cache' not in admin_client.get('/api/categories').headers
+
+
+def test_page_cache_bypassed_with_pending_flashes(cached_app):
+    cached_app.test_client().get('/api/categories')
+    client = cached_app.test_client()
+    with client.session_transaction() as session:
+        session['_flashes'] = [('success', 'Reservation received')]
+
+    assert 'X-Cache' not in client.get('/api/categories').headers
+
+
+def test_page_cache_bypassed_with_remember_cookie(cached_app):
+    cached_app.test_client().get('/api/categories')
+    client = cached_app.test_client()
+    client.set_cookie(cached_app.config.get('REMEMBER_COOKIE_NAME', 'remember_token'), '1|signature')
+
+    assert 'X-Cache' not in client.get('/api/categories').headers
+
+
+def test_page_cache_invalidated_on_commit(cached_app):
+    client = cached_app.test_client()
+    client.get('/api/categories')
+
+    # Rolled back changes leave the cached page alone
+    db.session.add(Category(name='Desserts', slug='desserts'))
+    db.session.flush()
+    db.session.rollback()
+    assert client.get('/api/categories').headers['X-Cache'] == 'HIT'
+
+    db.session.add(Category(name='Desserts', slug='desserts'))
+    db.session.commit()
+    response = client.get('/api/categories')
+    assert response.headers['X-Cache'] == 'MISS'
+    assert [c['name'] for c in response.json['categories']] == ['Mains', 'Desserts']
+    assert client.get('/api/categories').headers['X-Cache'] == 'HIT'
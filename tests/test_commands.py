@@ -0,0 +1,68 @@
+import os
+
+from PIL import Image
+from sqlalchemy import inspect, text
+
+from app import db
+from app.commands import init_db, backfill_placeholders
+from app.models import GalleryImage
+
+
+def test_init_db_adds_columns_missing_from_existing_tables(app):
+    # A gallery table from before images had renditions and placeholders
+    db.drop_all()
+    with db.engine.begin() as connection:
+        connection.execute(text('CREATE TABLE gallery_images (id INTEGER PRIMARY KEY, title VARCHAR(100), '
+                                'image_url VARCHAR(255) NOT NULL)'))
+        connection.execute(text("INSERT INTO gallery_images (title, image_url) VALUES ('Terrace', 'terrace.jpg')"))
+
+    result = app.test_cli_runner().invoke(init_db)
+
+    assert result.exit_code == 0, result.output
+    assert 'gallery_images.image_renditions' in result.output
+    columns = {column['name'] for column in inspect(db.engine).get_columns('gallery_images')}
+    assert {'image_renditions', 'image_placeholder', 'display_order', 'is_active'} <= columns
+    assert db.session.execute(text('SELECT title FROM gallery_images')).scalar() == 'Terrace'
+
+    # Nothing left to add the second time
+    assert 'Added column' not in app.test_cli_runner().invoke(init_db).output
+
+
+def test_placeholders_after_upgrade(app):
+    path = 'images/te/terrace.jpg'
+    full_path = os.path.join(app.config['UPLOAD_FOLDER'], path)
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+    Image.new('RGB', (400, 300), (200, 120, 40)).save(full_path)
+
+    db.drop_all()
+    with db.engine.begin() as connection:
+        connection.execute(text('CREATE TABLE gallery_images (id INTEGER PRIMARY KEY, title VARCHAR(100), '
+                                'image_url VARCHAR(255) NOT NULL)'))
+        connection.execute(text("INSERT INTO gallery_images (title, image_url) VALUES ('Terrace', :path)"),
+                           {'path': path})
+
+    runner = app.test_cli_runner()
+    assert 'backfill-placeholders' in runner.invoke(init_db).output
+    result = runner.invoke(backfill_placeholders, ['--workers', '1'])
+
+    assert result.exit_code == 0, result.output
+    assert db.session.query(GalleryImage.image_placeholder).scalar().startswith('data:image/jpeg;base64,')
+
+
+def test_init_db_prepares_delta_sync_on_existing_data(app, client):
+    # A menu from before delta sync: no sync_version column, counter or tombstone tables
+    with db.engine.begin() as connection:
+        for statement in ['DROP TABLE sync_counters', 'DROP TABLE tombstones',
+                          'DROP INDEX ix_menu_items_sync_version', 'ALTER TABLE menu_items DROP COLUMN sync_version']:
+            connection.execute(text(statement))
+        connection.execute(text("INSERT INTO categories (id, name, slug) VALUES (1, 'Mains', 'mains')"))
+        connection.execute(text("INSERT INTO menu_items (id, name, price, category_id, is_available) "
+                                "VALUES (1, 'Moussaka', 14.5, 1, 1)"))
+
+    result = app.test_cli_runner().invoke(init_db)
+
+    assert result.exit_code == 0, result.output
+    assert {'sync_counters', 'tombstones'} <= set(inspect(db.engine).get_table_names())
+    assert 'Gave 1 menu rows a sync version' in result.output
+    # Deltas from before the stamp include the existing item
+    assert [item['id'] for item in client.get('/api/menu/changes?since=0').json['items']] == [1]
@@ -0,0 +1,192 @@
+import os
+import subprocess
+import sys
+import textwrap
+from datetime import datetime
+
+import pytest
+from PIL import Image
+
+WIDTH, HEIGHT = 6000, 4000
+# Pillow keeps RGB images at 4 bytes per pixel
+FULL_BITMAP_MB = WIDTH * HEIGHT * 4 / 1024 / 1024
+
+# Saves one image in a fresh interpreter and prints how much its peak RSS grew, in MB
+SAVE_IMAGE_RSS = textwrap.dedent('''
+    import io, os, resource, sys
+    from PIL import Image
+    from werkzeug.datastructures import FileStorage
+    from app import create_app
+    from app.utils import save_image
+
+    app = create_app('testing')
+    with app.app_context():
+        # Load the codecs and encoders first, so only the big image counts
+        warm_up = io.BytesIO()
+        Image.new('RGB', (64, 64)).save(warm_up, 'PNG')
+        warm_up.seek(0)
+        save_image(FileStorage(warm_up, 'warm-up.png'), size=(1200, 800))
+
+        before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        with open(sys.argv[1], 'rb') as f:
+            save_image(FileStorage(f, os.path.basename(sys.argv[1])), size=(1200, 800))
+        print((resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before) / 1024)
+''')
+
+
+@pytest.mark.parametrize('extension, max_growth_mb', [
+    # Decoded at 1/4 scale by draft(), never at full size
+    ('jpg', FULL_BITMAP_MB / 2),
+    # PNG has no scaled decoding, but the full bitmap must be the only full-size copy
+    ('png', FULL_BITMAP_MB * 1.5),
+], ids=['jpeg', 'png'])
+def test_save_image_peak_memory(tmp_path, extension, max_growth_mb):
+    path = tmp_path / f'photo.{extension}'
+    Image.linear_gradient('L').resize((WIDTH, HEIGHT)).convert('RGB').save(path)
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, UPLOAD_FOLDER=str(tmp_path / 'uploads'), PYTHONPATH=root)
+
+    result = subprocess.run([sys.executable, '-c', SAVE_IMAGE_RSS, str(path)], env=env, cwd=root,
+                            capture_output=True, text=True, check=True)
+
+    assert float(result.stdout.split()[-1]) < max_growth_mb
+
+
+def test_release_image_keeps_shared_uploads(app, tmp_path):
+    from werkzeug.datastructures import FileStorage
+    from app import db
+    from app.models import Event
+    from app.utils import save_image, release_image
+
+    # Released as soon as unused, see test_release_image_waits_for_uncommitted_uploads
+    app.config['IMAGE_RELEASE_GRACE'] = 0
+    path = tmp_path / 'dish.png'
+    Image.new('RGB', (300, 200), (30, 120, 60)).save(path)
+
+    def upload():
+        with open(path, 'rb') as f:
+            return save_image(FileStorage(f, 'dish.png'))
+
+    saved = upload()
+    events = [Event(title=f'Tasting {n}', description='Wine and mezze', event_date=datetime(2026, 11, n + 1)) for n in range(2)]
+    for event in events:
+        event.set_image(saved)
+    db.session.add_all(events)
+    db.session.commit()
+    image_file = os.path.join(app.config['UPLOAD_FOLDER'], saved['image_url'])
+
+    db.session.delete(events[0])
+    db.session.commit()
+    release_image(saved['image_url'])
+    assert os.path.exists(image_file)
+
+    db.session.delete(events[1])
+    db.session.commit()
+    release_image(saved['image_url'])
+    assert not os.path.exists(image_file)
+
+    # Uploading the photo again stores it again
+    assert upload() == saved
+    assert os.path.exists(image_file)
+
+
+def test_release_image_waits_for_uncommitted_uploads(app, tmp_path):
+    from werkzeug.datastructures import FileStorage
+    from app.utils import save_image, release_image
+
+    path = tmp_path / 'dish.png'
+    Image.new('RGB', (300, 200), (30, 120, 60)).save(path)
+    with open(path, 'rb') as f:
+        saved = save_image(FileStorage(f, 'dish.png'))
+    image_file = os.path.join(app.config['UPLOAD_FOLDER'], saved['image_url'])
+
+    # Another request dropping its last reference must not delete the file
+    # handed out above before its record is committed
+    assert not release_image(saved['image_url'])
+    assert os.path.exists(image_file)
+
+    # Still unused once the grace period is over: the prune deletes it
+    app.config['IMAGE_RELEASE_GRACE'] = 0
+    result = app.test_cli_runner().invoke(args=['images', 'prune'])
+    assert 'Deleted 1 unused images' in result.output
+    assert not os.path.exists(image_file)
+
+
+def test_failed_processing_leaves_nothing_behind(app, tmp_path, monkeypatch):
+    from werkzeug.datastructures import FileStorage
+    from app import utils
+
+    def fail(*args, **kwargs):
+        raise OSError('disk full')
+
+    # Fails after the resized file and its renditions have been written
+    monkeypatch.setattr(utils, 'make_placeholder', fail)
+    path = tmp_path / 'dish.png'
+    Image.new('RGB', (300, 200), (30, 120, 60)).save(path)
+
+    def upload():
+        with open(path, 'rb') as f:
+            return utils.save_image(FileStorage(f, 'dish.png'))
+
+    upload_folder = app.config['UPLOAD_FOLDER']
+
+    def stored_files():
+        return {os.path.join(folder, name) for folder, _, files in os.walk(upload_folder)
+                for name in files if name != '.lock'}
+
+    before = stored_files()
+    with pytest.raises(OSError):
+        upload()
+    assert stored_files() == before
+
+    # Without a manifest the next upload is processed again
+    monkeypatch.undo()
+    saved = upload()
+    assert saved['placeholder'] and saved['renditions']
+    assert os.path.exists(os.path.join(upload_folder, saved['image_url']))
+
+
+def test_resized_images_share_one_lock_file_per_folder(app, client, tmp_path):
+    from werkzeug.datastructures import FileStorage
+    from app.utils import save_image
+
+    saved = []
+    for n in range(3):
+        path = tmp_path / f'dish{n}.png'
+        Image.new('RGB', (300, 200), (30, 120, 60 + n)).save(path)
+        with open(path, 'rb') as f:
+            saved.append(save_image(FileStorage(f, path.name)))
+    size_folder = os.path.join(app.config['IMAGE_CACHE_FOLDER'], '300x200')
+    # A per-rendition lock file left by an earlier version
+    legacy_lock = os.path.join(size_folder, saved[0]['image_url'] + '.lock')
+    os.makedirs(os.path.dirname(legacy_lock), exist_ok=True)
+    open(legacy_lock, 'w').close()
+
+    for image in saved:
+        assert client.get(f"/img/300x200/{image['image_url']}").status_code == 200
+
+    lock_files = [os.path.join(folder, name) for folder, _, files in os.walk(size_folder)
+                  for name in files if name.endswith('.lock')]
+    assert lock_files and all(os.path.basename(path) == '.lock' for path in lock_files)
+    assert len(lock_files) == len({os.path.dirname(image['image_url']) for image in saved})
+
+
+def test_only_images_are_served_from_uploads(app, client, tmp_path):
+    from werkzeug.datastructures import FileStorage
+    from app.utils import save_image
+
+    path = tmp_path / 'dish.png'
+    Image.new('RGB', (300, 200), (30, 120, 60)).save(path)
+    with open(path, 'rb') as f:
+        saved = save_image(FileStorage(f, 'dish.png'))
+    assert saved['thumbnail_url'] != saved['image_url']
+    folder = os.path.dirname(saved['image_url'])
+    spool = os.path.join(app.config['UPLOAD_FOLDER'], '.tmp', 'bulk-upload.zip')
+    os.makedirs(os.path.dirname(spool), exist_ok=True)
+    open(spool, 'w').close()
+
+    assert client.get(f"/static/uploads/{saved['image_url']}").status_code == 200
+    assert client.get(f"/static/uploads/{saved['thumbnail_url']}").status_code == 200
+    for hidden in [os.path.splitext(saved['image_url'])[0] + '.json', f'{folder}/.lock', '.tmp/bulk-upload.zip']:
+        assert client.get(f'/static/uploads/{hidden}').status_code == 404
+        assert client.get(f'/img/300x200/{hidden}').status_code == 404
@@ -0,0 +1,19 @@
+from flask_login import login_user
+
+from app import live_events
+
+
+def test_stream_slot_released_when_client_leaves_early(app, admin):
+    app.config['LIVE_MAX_STREAMS'] = 1
+    with app.test_request_context('/admin/stream', environ_overrides={'wsgi.multithread': True}):
+        login_user(admin)
+        response = app.full_dispatch_request()
+    assert live_events.active == 1
+
+    # The client disconnects before the first chunk: the server closes the response unread
+    response.close()
+    assert live_events.active == 0
+
+    # Closing again doesn't give back a slot that isn't held
+    response.close()
+    assert live_events.active == 0
@@ -0,0 +1,40 @@
+import os
+import subprocess
+import sys
+import textwrap
+import time
+
+PROCESSES = 4
+REQUESTS = 60
+LIMIT = 40
+
+# One gunicorn-like worker: its own app, two bursts of requests at fixed times, prints how many got through
+WORKER = textwrap.dedent('''
+    import sys, time
+    from app import create_app
+
+    client = create_app('production').test_client()
+    admitted = 0
+    for start in map(float, sys.argv[1:]):
+        time.sleep(max(0, start - time.time()))
+        admitted += sum(client.get('/about').status_code == 200 for _ in range(%d))
+    print(admitted)
+''' % REQUESTS)
+
+
+def test_sqlite_storage_limit_holds_across_processes(tmp_path):
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, PYTHONPATH=root, PAGE_CACHE_ENABLED='True',
+               DATABASE_URL='sqlite:///' + str(tmp_path / 'app.db'),
+               RATELIMIT_STORAGE_URL='sqlite:///' + str(tmp_path / 'ratelimit.db'),
+               RATELIMIT_DEFAULT=f'{LIMIT} per day')
+    # Every worker starts together; the second burst comes after the lease TTL, so hits
+    # that workers reserved in the first but didn't use are back in the shared count
+    first = time.time() + 5
+    workers = [subprocess.Popen([sys.executable, '-c', WORKER, str(first), str(first + 2.5)],
+                                env=env, cwd=root, stdout=subprocess.PIPE, text=True)
+               for _ in range(PROCESSES)]
+    admitted = [int(worker.communicate(timeout=60)[0]) for worker in workers]
+
+    assert all(worker.returncode == 0 for worker in workers)
+    assert sum(admitted) == LIMIT
@@ -0,0 +1,47 @@
+from datetime import date, time
+
+from app import db, dashboard_stats
+from app.models import Reservation
+
+
+def reservation(**fields):
+    return Reservation(name='Eleni', email='eleni@example.com', phone='555-0100', date=date(2026, 11, 20),
+                       time=time(20, 0), party_size=4, **fields)
+
+
+def assert_counters(expected):
+    stored = dashboard_stats.get()
+    assert {name: stored[name] for name in expected} == expected
+    # Maintained totals always agree with a recount
+    assert dashboard_stats.compute() == stored
+
+
+def test_counters_follow_inserts_status_changes_and_deletes(app):
+    dashboard_stats.rebuild()
+    assert_counters({'total_reservations': 0, 'pending_reservations': 0})
+
+    # The status column default counts as pending
+    pending, confirmed = reservation(), reservation(status='confirmed')
+    db.session.add_all([pending, confirmed])
+    db.session.commit()
+    assert_counters({'total_reservations': 2, 'pending_reservations': 1})
+
+    # Expired by the commit: the old status is read from the database
+    pending.status = 'confirmed'
+    db.session.commit()
+    assert_counters({'total_reservations': 2, 'pending_reservations': 0})
+
+    confirmed.status = 'pending'
+    db.session.commit()
+    db.session.delete(confirmed)
+    db.session.commit()
+    assert_counters({'total_reservations': 1, 'pending_reservations': 0})
+
+
+def test_rolled_back_changes_leave_counters_alone(app):
+    dashboard_stats.rebuild()
+    db.session.add(reservation())
+    db.session.flush()
+    db.session.rollback()
+
+    assert_counters({'total_reservations': 0, 'pending_reservations': 0})
@@ -0,0 +1,100 @@
+import io
+import os
+import re
+import zipfile
+
+import pytest
+from PIL import Image
+
+from app import db
+from app.models import GalleryImage
+
+
+def noisy_png(side):
+    """A PNG that doesn't compress, about 3 * side * side bytes"""
+    buffer = io.BytesIO()
+    Image.frombytes('RGB', (side, side), os.urandom(3 * side * side)).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def csrf_app(app):
+    app.config.update(WTF_CSRF_ENABLED=True, MAX_CONTENT_LENGTH=256 * 1024)
+    return app
+
+
+def csrf_token(client, url):
+    return re.search(r'name="csrf_token" type="hidden" value="([^"]+)"', client.get(url).get_data(as_text=True)).group(1)
+
+
+def test_bulk_upload_can_exceed_max_content_length(csrf_app, admin_client):
+    # Each file is within the limit (save_images() enforces that per file), all of them together are not
+    images = [noisy_png(200) for _ in range(3)]
+    assert max(map(len, images)) < csrf_app.config['MAX_CONTENT_LENGTH'] < sum(map(len, images))
+
+    response = admin_client.post('/admin/gallery/bulk', data={
+        'csrf_token': csrf_token(admin_client, '/admin/gallery/bulk'),
+        'images': [(io.BytesIO(image), f'terrace-{n}.png') for n, image in enumerate(images)],
+        'is_active': 'y',
+    }, content_type='multipart/form-data')
+
+    assert response.status_code == 200
+    assert db.session.query(GalleryImage).count() == 3
+
+
+def test_other_uploads_keep_max_content_length(csrf_app, admin_client):
+    response = admin_client.post('/admin/gallery/add', data={
+        'csrf_token': csrf_token(admin_client, '/admin/gallery/add'),
+        'title': 'Terrace',
+        'image': (io.BytesIO(noisy_png(400)), 'terrace.png'),
+    }, content_type='multipart/form-data')
+
+    assert response.status_code == 413
+
+
+def test_anonymous_bulk_upload_keeps_max_content_length(csrf_app, client):
+    response = client.post('/admin/gallery/bulk', data={
+        'images': [(io.BytesIO(noisy_png(400)), 'terrace.png')],
+    }, content_type='multipart/form-data')
+
+    assert response.status_code == 413
+
+
+def test_bulk_upload_chunk_reports_each_file(app, admin_client):
+    app.config['BULK_UPLOAD_CHUNK'] = 1
+    response = admin_client.post('/admin/gallery/bulk', data={
+        'images': [(io.BytesIO(noisy_png(50)), 'b-terrace.png'), (io.BytesIO(b'not an image'), 'a-broken.png'),
+                   (io.BytesIO(noisy_png(50)), 'c-garden.png')],
+        'is_active': 'y',
+    }, content_type='multipart/form-data', headers={'Accept': 'application/json'})
+
+    assert response.json['added'] == 2
+    assert [(result['filename'], result['added']) for result in response.json['results']] == \
+        [('a-broken.png', False), ('b-terrace.png', True), ('c-garden.png', True)]
+    assert [image.title for image in GalleryImage.query.order_by(GalleryImage.display_order)] == \
+        ['b terrace', 'c garden']
+
+
+def test_archive_is_added_a_chunk_per_request(app, admin_client):
+    app.config['BULK_UPLOAD_CHUNK'] = 2
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, 'w') as zf:
+        for name in ['shoot/3.png', 'shoot/1.png', '__MACOSX/shoot/._1.png', 'shoot/2.png', 'notes.txt']:
+            zf.writestr(name, noisy_png(40))
+    archive.seek(0)
+
+    staged = admin_client.post('/admin/gallery/bulk/archive', data={'archive': (archive, 'shoot.zip')},
+                               content_type='multipart/form-data').json
+    assert staged['files'] == ['1.png', '2.png', '3.png']
+
+    url = f"/admin/gallery/bulk/archive/{staged['token']}"
+    first = admin_client.post(url, data={'start': 0, 'is_active': 'y'}).json
+    assert ([result['filename'] for result in first['results']], first['next']) == (['1.png', '2.png'], 2)
+    assert GalleryImage.query.count() == 2
+
+    last = admin_client.post(url, data={'start': 2, 'is_active': 'y'}).json
+    assert ([result['filename'] for result in last['results']], last['next']) == (['3.png'], None)
+    assert [image.title for image in GalleryImage.query.order_by(GalleryImage.display_order)] == ['1', '2', '3']
+
+    # The staged archive is gone once every image was added
+    assert admin_client.post(url, data={'start': 0}).status_code == 404